@@ -0,0 +1,36 @@
+#!/bin/bash
+set -e
+
+source ${HOME}/sites/vhs/.env
+SQL_FILE="${ROOT_DIR}/backend/db/sql/210_add_player_cards_differential.sql"
+
+
+# Copy SQL file to container
+docker cp ${ROOT_DIR}/backend/db/sql/210_add_player_cards_differential.sql $DB_CONTAINER:/tmp/210_add_player_cards_differential.sql
+echo "210_add_player_cards_differential created successfully"
+
+# Check if SQL file exists
+if [ ! -f "$SQL_FILE" ]; then
+    echo "Error: SQL file not found at $SQL_FILE"
+    exit 1
+fi
+
+
+# Check if container is running
+if ! docker ps | grep -q $DB_CONTAINER; then
+    echo "Error: Database container '$DB_CONTAINER' is not running"
+    exit 1
+fi
+
+
+echo "┌───────────────────────────────────────────────────────┐"
+echo "│ ${ROOT_DIR}/backend/db/210_add_player_cards_differential.sh..."
+echo "└───────────────────────────────────────────────────────┘"
+
+if docker exec -i $DB_CONTAINER psql -U admin -d vhsdb < "$SQL_FILE"; then
+
+    echo "player_cards differential column created successfully"
+else
+    echo "Error: Failed to add player_cards differential column"
+    exit 1
+fi
\ No newline at end of file
@@ -0,0 +1,36 @@
+#!/bin/bash
+set -e
+
+source ${HOME}/sites/vhs/.env
+SQL_FILE="${ROOT_DIR}/backend/db/sql/220_add_player_cards_hole_scores.sql"
+
+
+# Copy SQL file to container
+docker cp ${ROOT_DIR}/backend/db/sql/220_add_player_cards_hole_scores.sql $DB_CONTAINER:/tmp/220_add_player_cards_hole_scores.sql
+echo "220_add_player_cards_hole_scores created successfully"
+
+# Check if SQL file exists
+if [ ! -f "$SQL_FILE" ]; then
+    echo "Error: SQL file not found at $SQL_FILE"
+    exit 1
+fi
+
+
+# Check if container is running
+if ! docker ps | grep -q $DB_CONTAINER; then
+    echo "Error: Database container '$DB_CONTAINER' is not running"
+    exit 1
+fi
+
+
+echo "┌───────────────────────────────────────────────────────┐"
+echo "│ ${ROOT_DIR}/backend/db/220_add_player_cards_hole_scores.sh..."
+echo "└───────────────────────────────────────────────────────┘"
+
+if docker exec -i $DB_CONTAINER psql -U admin -d vhsdb < "$SQL_FILE"; then
+
+    echo "player_cards packed hole scores created successfully"
+else
+    echo "Error: Failed to add player_cards packed hole scores"
+    exit 1
+fi
\ No newline at end of file
@@ -0,0 +1,36 @@
+#!/bin/bash
+set -e
+
+source ${HOME}/sites/vhs/.env
+SQL_FILE="${ROOT_DIR}/backend/db/sql/230_add_handicap_notify.sql"
+
+
+# Copy SQL file to container
+docker cp ${ROOT_DIR}/backend/db/sql/230_add_handicap_notify.sql $DB_CONTAINER:/tmp/230_add_handicap_notify.sql
+echo "230_add_handicap_notify created successfully"
+
+# Check if SQL file exists
+if [ ! -f "$SQL_FILE" ]; then
+    echo "Error: SQL file not found at $SQL_FILE"
+    exit 1
+fi
+
+
+# Check if container is running
+if ! docker ps | grep -q $DB_CONTAINER; then
+    echo "Error: Database container '$DB_CONTAINER' is not running"
+    exit 1
+fi
+
+
+echo "┌───────────────────────────────────────────────────────┐"
+echo "│ ${ROOT_DIR}/backend/db/230_add_handicap_notify.sh..."
+echo "└───────────────────────────────────────────────────────┘"
+
+if docker exec -i $DB_CONTAINER psql -U admin -d vhsdb < "$SQL_FILE"; then
+
+    echo "handicap notify triggers created successfully"
+else
+    echo "Error: Failed to create handicap notify triggers"
+    exit 1
+fi
\ No newline at end of file
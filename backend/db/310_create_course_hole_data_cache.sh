@@ -0,0 +1,36 @@
+#!/bin/bash
+set -e
+
+source ${HOME}/sites/vhs/.env
+SQL_FILE="${ROOT_DIR}/backend/db/sql/310_create_course_hole_data_cache.sql"
+
+
+# Copy SQL file to container
+docker cp ${ROOT_DIR}/backend/db/sql/310_create_course_hole_data_cache.sql $DB_CONTAINER:/tmp/310_create_course_hole_data_cache.sql
+echo "310_create_course_hole_data_cache created successfully"
+
+# Check if SQL file exists
+if [ ! -f "$SQL_FILE" ]; then
+    echo "Error: SQL file not found at $SQL_FILE"
+    exit 1
+fi
+
+
+# Check if container is running
+if ! docker ps | grep -q $DB_CONTAINER; then
+    echo "Error: Database container '$DB_CONTAINER' is not running"
+    exit 1
+fi
+
+
+echo "┌───────────────────────────────────────────────────────┐"
+echo "│ ${ROOT_DIR}/backend/db/310_create_course_hole_data_cache.sh..."
+echo "└───────────────────────────────────────────────────────┘"
+
+if docker exec -i $DB_CONTAINER psql -U admin -d vhsdb < "$SQL_FILE"; then
+
+    echo "Course hole data cache created successfully"
+else
+    echo "Error: Failed to create course hole data cache"
+    exit 1
+fi
\ No newline at end of file
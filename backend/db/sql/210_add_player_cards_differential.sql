@@ -0,0 +1,78 @@
+-- Suppress notices
+SET client_min_messages = 'warning';
+
+-- ┌───────────────────────────────────────────────────────┐
+-- │ player_cards.score_differential (stored at write time)
+--└───────────────────────────────────────────────────────┘
+-- The single authoritative score differential of a card:
+--     (gross - course_rating) * 113 / slope_rating, rounded to 0.1
+-- using the rating of the card's own course and tee. It is set by a trigger
+-- whenever a card is inserted or its gross/course/tee change, and updated
+-- for every affected card when a tee rating changes or is deleted. Rows
+-- loaded before this script are filled at the end; large tables can instead
+-- be backfilled in batches with bin/differentials.py --backfill.
+-- Must run after 200_create_player_cards_table.sql and the course tables.
+
+ALTER TABLE player_cards ADD COLUMN IF NOT EXISTS score_differential NUMERIC(5,1);
+
+CREATE OR REPLACE FUNCTION player_cards_set_differential()
+RETURNS TRIGGER AS $$
+BEGIN
+    SELECT ROUND((NEW.gross - cdt.course_rating) * 113 / NULLIF(cdt.slope_rating, 0), 1)
+    INTO NEW.score_differential
+    FROM x_course_data_by_tee cdt
+    WHERE cdt.course_id = NEW.course_id AND cdt.tee_id = NEW.tee_id
+    LIMIT 1;
+    IF NOT FOUND THEN
+        NEW.score_differential := NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS player_cards_differential ON player_cards;
+CREATE TRIGGER player_cards_differential
+    BEFORE INSERT OR UPDATE OF gross, course_id, tee_id ON player_cards
+    FOR EACH ROW EXECUTE FUNCTION player_cards_set_differential();
+
+CREATE OR REPLACE FUNCTION x_course_data_by_tee_update_differentials()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE player_cards pc
+        SET score_differential =
+            ROUND((pc.gross - NEW.course_rating) * 113 / NULLIF(NEW.slope_rating, 0), 1)
+        WHERE pc.course_id = NEW.course_id AND pc.tee_id = NEW.tee_id;
+    END IF;
+    -- Cards of a deleted or re-keyed rating get what the BEFORE trigger would
+    -- give them now: NULL unless another row still rates that tee
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND
+            (OLD.course_id, OLD.tee_id) IS DISTINCT FROM (NEW.course_id, NEW.tee_id)) THEN
+        UPDATE player_cards pc
+        SET score_differential = (
+            SELECT ROUND((pc.gross - cdt.course_rating) * 113 / NULLIF(cdt.slope_rating, 0), 1)
+            FROM x_course_data_by_tee cdt
+            WHERE cdt.course_id = OLD.course_id AND cdt.tee_id = OLD.tee_id
+            LIMIT 1)
+        WHERE pc.course_id = OLD.course_id AND pc.tee_id = OLD.tee_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS x_course_data_by_tee_differentials ON x_course_data_by_tee;
+CREATE TRIGGER x_course_data_by_tee_differentials
+    AFTER INSERT OR DELETE OR UPDATE OF course_id, tee_id, course_rating, slope_rating
+    ON x_course_data_by_tee
+    FOR EACH ROW EXECUTE FUNCTION x_course_data_by_tee_update_differentials();
+
+-- Index the cards of a tee so rating changes find them quickly
+CREATE INDEX IF NOT EXISTS idx_player_cards_course_tee ON player_cards(course_id, tee_id);
+
+-- Fill the cards that already exist
+UPDATE player_cards pc
+SET score_differential =
+    ROUND((pc.gross - cdt.course_rating) * 113 / NULLIF(cdt.slope_rating, 0), 1)
+FROM x_course_data_by_tee cdt
+WHERE cdt.course_id = pc.course_id AND cdt.tee_id = pc.tee_id
+  AND pc.score_differential IS NULL;
@@ -0,0 +1,54 @@
+-- Suppress notices
+SET client_min_messages = 'warning';
+
+-- ┌───────────────────────────────────────────────────────┐
+-- │ player_cards.hole_scores (18 packed bytes)
+--└───────────────────────────────────────────────────────┘
+-- The 18 hole scores as one BYTEA of exactly 18 bytes, byte n = hole n+1,
+-- 0 = no score, values above 255 clamped. bin/card_data.py reads the column
+-- with binary COPY and decodes a whole result set into an (n x 18) uint8
+-- NumPy array (read_hole_scores) instead of 18 object columns.
+--
+-- Migration path: h01..h18 stay the columns every writer uses; a trigger
+-- keeps hole_scores in sync with them, and existing rows are packed at the
+-- end of this script (or in batches with bin/hole_scores.py --backfill).
+-- Once all readers use hole_scores the h columns can be dropped.
+-- Must run after 200_create_player_cards_table.sql.
+
+CREATE OR REPLACE FUNCTION pack_hole_scores(scores INTEGER[])
+RETURNS BYTEA AS $$
+    SELECT decode(string_agg(lpad(to_hex(LEAST(GREATEST(COALESCE(s, 0), 0), 255)), 2, '0'),
+                             '' ORDER BY i), 'hex')
+    FROM unnest(scores) WITH ORDINALITY AS t(s, i)
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION unpack_hole_scores(packed BYTEA)
+RETURNS SMALLINT[] AS $$
+    SELECT array_agg(NULLIF(get_byte(packed, i), 0)::SMALLINT ORDER BY i)
+    FROM generate_series(0, length(packed) - 1) AS i
+$$ LANGUAGE sql IMMUTABLE;
+
+ALTER TABLE player_cards ADD COLUMN IF NOT EXISTS hole_scores BYTEA
+    CHECK (hole_scores IS NULL OR length(hole_scores) = 18);
+
+CREATE OR REPLACE FUNCTION player_cards_pack_hole_scores()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.hole_scores := pack_hole_scores(ARRAY[NEW.h01, NEW.h02, NEW.h03, NEW.h04, NEW.h05, NEW.h06,
+                                              NEW.h07, NEW.h08, NEW.h09, NEW.h10, NEW.h11, NEW.h12,
+                                              NEW.h13, NEW.h14, NEW.h15, NEW.h16, NEW.h17, NEW.h18]);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS player_cards_hole_scores ON player_cards;
+CREATE TRIGGER player_cards_hole_scores
+    BEFORE INSERT OR UPDATE OF h01, h02, h03, h04, h05, h06, h07, h08, h09,
+                               h10, h11, h12, h13, h14, h15, h16, h17, h18 ON player_cards
+    FOR EACH ROW EXECUTE FUNCTION player_cards_pack_hole_scores();
+
+-- Pack the cards that already exist
+UPDATE player_cards
+SET hole_scores = pack_hole_scores(ARRAY[h01, h02, h03, h04, h05, h06, h07, h08, h09,
+                                         h10, h11, h12, h13, h14, h15, h16, h17, h18])
+WHERE hole_scores IS NULL;
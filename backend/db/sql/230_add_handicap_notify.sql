@@ -0,0 +1,70 @@
+-- Suppress notices
+SET client_min_messages = 'warning';
+
+-- ┌───────────────────────────────────────────────────────┐
+-- │ NOTIFY on changes that affect a handicap index
+--└───────────────────────────────────────────────────────┘
+-- Lets caches of computed handicaps (bin/handicap_service.py --listen) drop
+-- exactly the entries that went stale:
+--     handicap_player   payload: player_id
+--         a card was inserted, deleted, or changed in a column the index
+--         depends on (one notification per player and transaction)
+--     handicap_tee      payload: course_id:tee_id
+--         a tee rating was added, changed or removed; listeners expand it to
+--         the players with cards on that tee through idx_player_cards_course_tee
+-- Differentials rewritten by the rating trigger of
+-- 210_add_player_cards_differential.sql are covered by the handicap_tee
+-- notification and do not notify per card.
+-- Must run after 210_add_player_cards_differential.sql.
+
+CREATE OR REPLACE FUNCTION player_cards_notify_handicap()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        IF (OLD.player_id, OLD.play_date, OLD.gross, OLD.verified, OLD.tarj,
+            OLD.course_id, OLD.tee_id)
+           IS NOT DISTINCT FROM
+           (NEW.player_id, NEW.play_date, NEW.gross, NEW.verified, NEW.tarj,
+            NEW.course_id, NEW.tee_id)
+           AND (OLD.score_differential IS NOT DISTINCT FROM NEW.score_differential
+                OR pg_trigger_depth() > 1) THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify('handicap_player', OLD.player_id::text);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_notify('handicap_player', NEW.player_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS player_cards_notify ON player_cards;
+CREATE TRIGGER player_cards_notify
+    AFTER INSERT OR UPDATE OR DELETE ON player_cards
+    FOR EACH ROW EXECUTE FUNCTION player_cards_notify_handicap();
+
+CREATE OR REPLACE FUNCTION x_course_data_by_tee_notify_handicap()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify('handicap_tee', OLD.course_id || ':' || OLD.tee_id);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_notify('handicap_tee', NEW.course_id || ':' || NEW.tee_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS x_course_data_by_tee_notify ON x_course_data_by_tee;
+CREATE TRIGGER x_course_data_by_tee_notify
+    AFTER INSERT OR DELETE OR UPDATE OF course_id, tee_id, course_rating, slope_rating
+    ON x_course_data_by_tee
+    FOR EACH ROW EXECUTE FUNCTION x_course_data_by_tee_notify_handicap();
+
+-- Include player_id so expanding a tee to its players is an index-only scan
+DROP INDEX IF EXISTS idx_player_cards_course_tee;
+CREATE INDEX idx_player_cards_course_tee ON player_cards(course_id, tee_id, player_id);
@@ -0,0 +1,84 @@
+-- Suppress notices
+SET client_min_messages = 'warning';
+
+-- ┌───────────────────────────────────────────────────────┐
+-- │ x_course_hole_data (per-course hole_data cache)
+--└───────────────────────────────────────────────────────┘
+-- One row per course holding the hole_data JSON the handicap_calculator view
+-- used to rebuild with a correlated json_object_agg for every scorecard.
+-- Kept current by statement-level triggers on x_course_holes; run
+-- bin/course_hole_cache.py --refresh after bulk loads that bypass them.
+-- Must run after 300_create_course_holes.sql (which drops the triggers).
+
+DROP TABLE IF EXISTS x_course_hole_data CASCADE;
+CREATE TABLE x_course_hole_data (
+    course_id INTEGER PRIMARY KEY REFERENCES x_course_names(course_id) ON DELETE CASCADE,
+    hole_data JSON NOT NULL,
+    refreshed_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Rebuild the cached rows for the given courses (NULL = every course)
+CREATE OR REPLACE FUNCTION refresh_course_hole_data(p_course_ids INTEGER[] DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    refreshed INTEGER;
+BEGIN
+    DELETE FROM x_course_hole_data
+    WHERE p_course_ids IS NULL OR course_id = ANY(p_course_ids);
+
+    INSERT INTO x_course_hole_data (course_id, hole_data)
+    SELECT course_id,
+           json_object_agg(
+               'hole_' || hole_number,
+               json_build_object(
+                   'par', par,
+                   'men_si', men_stroke_index,
+                   'women_si', women_stroke_index
+               )
+               ORDER BY hole_number
+           )
+    FROM x_course_holes
+    WHERE p_course_ids IS NULL OR course_id = ANY(p_course_ids)
+    GROUP BY course_id;
+
+    GET DIAGNOSTICS refreshed = ROW_COUNT;
+    RETURN refreshed;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION x_course_holes_refresh_cache()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_course_hole_data(ARRAY(SELECT DISTINCT course_id FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_course_hole_data(ARRAY(SELECT DISTINCT course_id FROM old_rows));
+    ELSE
+        PERFORM refresh_course_hole_data(ARRAY(
+            SELECT course_id FROM new_rows UNION SELECT course_id FROM old_rows));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables need one trigger per event
+DROP TRIGGER IF EXISTS x_course_holes_cache_ins ON x_course_holes;
+CREATE TRIGGER x_course_holes_cache_ins
+    AFTER INSERT ON x_course_holes
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION x_course_holes_refresh_cache();
+
+DROP TRIGGER IF EXISTS x_course_holes_cache_upd ON x_course_holes;
+CREATE TRIGGER x_course_holes_cache_upd
+    AFTER UPDATE ON x_course_holes
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION x_course_holes_refresh_cache();
+
+DROP TRIGGER IF EXISTS x_course_holes_cache_del ON x_course_holes;
+CREATE TRIGGER x_course_holes_cache_del
+    AFTER DELETE ON x_course_holes
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION x_course_holes_refresh_cache();
+
+-- Initial fill
+SELECT refresh_course_hole_data();
@@ -49,22 +49,11 @@ SELECT
     pc.h01, pc.h02, pc.h03, pc.h04, pc.h05, pc.h06, pc.h07, pc.h08, pc.h09,
     pc.h10, pc.h11, pc.h12, pc.h13, pc.h14, pc.h15, pc.h16, pc.h17, pc.h18,
     
-    -- Hole data (stroke indexes)
-    (SELECT json_object_agg(
-        'hole_' || hole_number, 
-        json_build_object(
-            'par', par,
-            'men_si', men_stroke_index,
-            'women_si', women_stroke_index
-        )
-    ) FROM x_course_holes ch WHERE ch.course_id = pc.course_id) AS hole_data,
+    -- Hole data (stroke indexes), cached once per course in x_course_hole_data
+    chd.hole_data,
     
-    -- Calculate differential if not already present
-    CASE
-        WHEN pc.g_differential IS NULL THEN 
-            (pc.gross - cdt.course_rating) * 113 / NULLIF(cdt.slope_rating, 0)
-        ELSE pc.g_differential
-    END AS calculated_differential,
+    -- Differential stored at write time (210_add_player_cards_differential.sql)
+    pc.score_differential AS calculated_differential,
     
     -- Flag recent rounds for handicap calculation (last 20 rounds)
     ROW_NUMBER() OVER (PARTITION BY pc.player_id ORDER BY pc.play_date DESC) AS recency_rank
@@ -77,7 +66,9 @@ JOIN
 JOIN 
     x_course_tee_types tt ON pc.tee_id = tt.tee_id
 JOIN 
-    x_course_data_by_tee cdt ON pc.tee_id = cdt.tee_id
+    x_course_data_by_tee cdt ON pc.course_id = cdt.course_id AND pc.tee_id = cdt.tee_id
+LEFT JOIN 
+    x_course_hole_data chd ON chd.course_id = pc.course_id
 WHERE 
     pc.verified = true
     AND pc.tarj = 'OK'
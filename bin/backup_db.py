@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Parallel, incremental database backups.
+
+utils/IMPEX --export writes four full dumps one after another on every run
+and --import always restores everything.  This tool keeps one dated
+directory per backup under backup/:
+
+  schema.dump      pg_dump -Fc --schema-only (always, it is small)
+  data/            pg_dump -Fd -j N --data-only of the tables that changed
+  manifest.json    per table: change marker and the backup holding its data
+
+A table's change marker is its MAX(id) and MAX(updated_at) where those
+columns exist, plus the insert/update/delete counters of
+pg_stat_user_tables.  Tables whose marker (and the schema) is unchanged since
+the previous backup are not dumped again; the manifest points at the
+earlier backup that holds them.  Reference tables (x_course_*,
+country_codes, ...) are dumped once, and a year-partitioned player_cards
+only re-dumps the partitions that changed.  --full dumps everything.
+
+Restore runs in sections: pre-data schema, the data of every table from the
+backup that holds it (pg_restore -j N --disable-triggers), then post-data
+(indexes, constraints, triggers).  It needs an empty database; --clean
+drops the public schema first.
+
+--table restores the data of one table into the existing schema: the table
+is truncated first, a partitioned table as all its partitions.  Tables
+that reference it (foreign keys, or the card cascade triggers of a
+partitioned player_cards) would be left dangling, so they are only
+truncated and restored with it when --cascade is given.
+
+pg_dump / pg_restore run inside the database container (docker exec, as
+IMPEX does) when DB_CONTAINER is set or a container named *db* is running,
+otherwise locally.
+
+Usage:
+    python3 backup_db.py --export [--jobs 4] [--full]
+    python3 backup_db.py --import [--backup 20250101.120000] [--jobs 4] [--clean]
+    python3 backup_db.py --import --table player_cards --cascade
+    python3 backup_db.py --list
+
+Requires:  psycopg2, pg_dump / pg_restore (in the container or locally)
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import psycopg2
+
+from handicap_calculator import DB_PARAMS, connect_to_db
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.environ.get("ROOT_DIR", os.path.dirname(SCRIPT_DIR))
+BACKUP_ROOT = os.path.join(ROOT_DIR, "backup")
+CONTAINER_TMP = "/tmp/vhs_backup"
+MANIFEST = "manifest.json"
+
+TABLES_QUERY = """
+SELECT c.relname,
+       EXISTS (SELECT 1 FROM pg_attribute a WHERE a.attrelid = c.oid AND a.attname = 'id'
+               AND NOT a.attisdropped) AS has_id,
+       EXISTS (SELECT 1 FROM pg_attribute a WHERE a.attrelid = c.oid AND a.attname = 'updated_at'
+               AND NOT a.attisdropped) AS has_updated_at,
+       COALESCE(s.n_tup_ins, 0) + COALESCE(s.n_tup_upd, 0) + COALESCE(s.n_tup_del, 0) AS writes
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+WHERE n.nspname = 'public' AND c.relkind = 'r'
+ORDER BY c.relname
+"""
+
+PARTITIONS_QUERY = """
+SELECT p.relname, c.relname
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+JOIN pg_class p ON p.oid = i.inhparent
+JOIN pg_namespace n ON n.oid = p.relnamespace
+WHERE n.nspname = 'public' AND p.relkind = 'p' AND c.relkind = 'r'
+ORDER BY p.relname, c.relname
+"""
+
+# Tables whose rows point at the given tables: foreign keys, and the card_id
+# cascade triggers that replace them on a partitioned player_cards (card_data.py)
+REFERENCING_QUERY = """
+SELECT DISTINCT con.conrelid::regclass::text, NULL::bytea
+FROM pg_constraint con
+WHERE con.contype = 'f' AND con.confrelid = ANY(%(tables)s::regclass[])
+  AND con.conrelid <> con.confrelid
+UNION ALL
+SELECT NULL, t.tgargs
+FROM pg_trigger t
+WHERE t.tgrelid = ANY(%(tables)s::regclass[])
+  AND t.tgfoid = to_regproc('player_cards_cascade_delete')
+"""
+
+SEQUENCES_QUERY = """
+SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = 'public' AND c.relkind = 'S'
+"""
+
+
+class Postgres:
+    """Runs the PostgreSQL client tools in the container or locally."""
+
+    def __init__(self) -> None:
+        self.container = os.environ.get("DB_CONTAINER") or self._find_container()
+        self.auth = ["-U", DB_PARAMS["user"], "-d", DB_PARAMS["dbname"]]
+        if not self.container:
+            self.auth += ["-h", DB_PARAMS["host"], "-p", str(DB_PARAMS["port"])]
+
+    @staticmethod
+    def _find_container() -> Optional[str]:
+        try:
+            names = subprocess.run(["docker", "ps", "--format", "{{.Names}}"],
+                                   capture_output=True, text=True, check=True).stdout.split()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        return next((n for n in names if "db" in n), None)
+
+    def run(self, args: List[str], stdout=None) -> None:
+        command = (["docker", "exec", "-i", self.container] if self.container else []) + args
+        env = dict(os.environ, PGPASSWORD=DB_PARAMS["password"])
+        subprocess.run(command, check=True, stdout=stdout, env=env)
+
+    def workdir(self, name: str, local: str) -> str:
+        """Path the tools use for  local  (a container path when dockerised)."""
+        return f"{CONTAINER_TMP}/{name}" if self.container else local
+
+    def pull(self, remote: str, local: str) -> None:
+        """Copy the contents of the container directory  remote  into  local ."""
+        if self.container:
+            subprocess.run(["docker", "cp", f"{self.container}:{remote}/.", local], check=True)
+            self.run(["rm", "-rf", remote])
+
+    def push(self, local: str, remote: str) -> None:
+        if self.container:
+            self.run(["mkdir", "-p", os.path.dirname(remote)])
+            subprocess.run(["docker", "cp", local, f"{self.container}:{remote}"], check=True)
+
+    def cleanup(self, remote: str) -> None:
+        if self.container:
+            self.run(["rm", "-rf", remote])
+
+
+def table_markers() -> Dict[str, dict]:
+    """Change marker of every table in the public schema."""
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(TABLES_QUERY)
+        markers = {}
+        for table, has_id, has_updated_at, writes in cursor.fetchall():
+            marker = {"writes": int(writes)}
+            columns = (["MAX(id)"] if has_id else []) + (["MAX(updated_at)"] if has_updated_at else [])
+            if columns:
+                cursor.execute(f'SELECT {", ".join(columns)} FROM "{table}"')
+                values = cursor.fetchone()
+                if has_id:
+                    marker["max_id"] = values[0]
+                if has_updated_at:
+                    marker["max_updated_at"] = str(values[-1])
+            markers[table] = marker
+        cursor.execute(SEQUENCES_QUERY)
+        sequences = [row[0] for row in cursor.fetchall()]
+        cursor.execute(PARTITIONS_QUERY)
+        partitions: Dict[str, List[str]] = {}
+        for parent, child in cursor.fetchall():
+            partitions.setdefault(parent, []).append(child)
+        cursor.close()
+        return {"tables": markers, "sequences": sequences, "partitions": partitions}
+    finally:
+        conn.close()
+
+
+def backups() -> List[str]:
+    """Backup directory names with a manifest, oldest first."""
+    if not os.path.isdir(BACKUP_ROOT):
+        return []
+    return sorted(d for d in os.listdir(BACKUP_ROOT)
+                  if os.path.exists(os.path.join(BACKUP_ROOT, d, MANIFEST)))
+
+
+def read_manifest(name: str) -> dict:
+    with open(os.path.join(BACKUP_ROOT, name, MANIFEST), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _schema_hash(path: str) -> str:
+    """Hash of a plain schema dump, ignoring the per-run \\restrict key."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.startswith((b"\\restrict", b"\\unrestrict")):
+                digest.update(line)
+    return digest.hexdigest()
+
+
+def export(pg: Postgres, jobs: int, full: bool) -> str:
+    earlier = backups()
+    previous = read_manifest(earlier[-1]) if earlier else None
+    name = time.strftime("%Y%m%d.%H%M%S")
+    local = os.path.join(BACKUP_ROOT, name)
+    os.makedirs(local)
+    remote = pg.workdir(name, local)
+    start = time.perf_counter()
+
+    if pg.container:
+        pg.run(["mkdir", "-p", remote])
+    pg.run(["pg_dump", *pg.auth, "--schema-only", "-Fc", "-f", f"{remote}/schema.dump"])
+    schema_sql = os.path.join(local, "schema.sql")
+    with open(schema_sql, "wb") as out:
+        pg.run(["pg_dump", *pg.auth, "--schema-only"], stdout=out)
+    schema_hash = _schema_hash(schema_sql)
+    os.remove(schema_sql)
+
+    current = table_markers()
+    reuse = not full and previous is not None and previous["schema_hash"] == schema_hash
+    tables = {}
+    changed = []
+    for table, marker in current["tables"].items():
+        before = previous["tables"].get(table) if reuse else None
+        if before and before["marker"] == marker:
+            tables[table] = {"marker": marker, "backup": before["backup"]}
+        else:
+            tables[table] = {"marker": marker, "backup": name}
+            changed.append(table)
+
+    # Sequences are tiny and always dumped, so every backup has a data directory
+    selection = [arg for t in changed + current["sequences"] for arg in ("-t", f'"{t}"')]
+    pg.run(["pg_dump", *pg.auth, "--data-only", "-Fd", "-j", str(jobs),
+            "-f", f"{remote}/data", *selection])
+    pg.pull(remote, local)
+
+    manifest = {"created": name, "schema_hash": schema_hash, "full": not reuse,
+                "sequences": current["sequences"], "partitions": current["partitions"],
+                "tables": tables}
+    with open(os.path.join(local, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, default=str)
+    print(f"[OK] Backup {name}: {len(changed)} of {len(tables)} tables dumped "
+          f"({len(tables) - len(changed)} unchanged) in {time.perf_counter() - start:.1f}s")
+    return name
+
+
+def _restore_data(pg: Postgres, name: str, tables: List[str], jobs: int) -> None:
+    local = os.path.join(BACKUP_ROOT, name, "data")
+    remote = pg.workdir(f"restore_{name}", local)
+    pg.push(local, remote)
+    selection = [arg for t in tables for arg in ("-t", t)]
+    try:
+        pg.run(["pg_restore", *pg.auth, "--data-only", "--disable-triggers", "-j", str(jobs),
+                *selection, remote])
+    finally:
+        pg.cleanup(remote)
+
+
+def _expand(cursor, manifest: dict, table: str) -> List[str]:
+    """The tables holding the rows of  table : its partitions when partitioned."""
+    partitions = manifest.get("partitions", {}).get(table)
+    if partitions is None:  # backups made before partitions were recorded
+        cursor.execute(PARTITIONS_QUERY)
+        partitions = [child for parent, child in cursor.fetchall() if parent == table]
+    return partitions or [table]
+
+
+def _referencing(cursor, tables: List[str]) -> List[str]:
+    """Tables with rows that point at  tables , directly or through each other."""
+    found: List[str] = []
+    pending = list(tables)
+    while pending:
+        cursor.execute(REFERENCING_QUERY, {"tables": pending})
+        pending = []
+        for table, args in cursor.fetchall():
+            if args is not None:
+                table = bytes(args).split(b"\x00")[0].decode()
+            table = table.strip('"')
+            if table not in found and table not in tables:
+                found.append(table)
+                pending.append(table)
+    return found
+
+
+def restore_table(pg: Postgres, manifest: dict, name: str, jobs: int, table: str,
+                  cascade: bool) -> None:
+    start = time.perf_counter()
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        tables = _expand(cursor, manifest, table)
+        dependents = _referencing(cursor, list(dict.fromkeys([table] + tables)))
+        if dependents and not cascade:
+            print(f"[ERROR] {', '.join(dependents)} refer to {table}; restore them with it "
+                  f"(--cascade) or restore the whole backup", file=sys.stderr)
+            sys.exit(1)
+        for dependent in dependents:
+            tables += [t for t in _expand(cursor, manifest, dependent) if t not in tables]
+        missing = [t for t in tables if t not in manifest["tables"]]
+        if missing:
+            print(f"[ERROR] {', '.join(missing)} not in backup {name}", file=sys.stderr)
+            sys.exit(1)
+        cursor.execute("TRUNCATE " + ", ".join(f'"{t}"' for t in tables))
+        conn.commit()
+    except psycopg2.Error as e:
+        print(f"[ERROR] cannot empty {table}: {e}".rstrip(), file=sys.stderr)
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    by_backup: Dict[str, List[str]] = {}
+    for t in tables:
+        by_backup.setdefault(manifest["tables"][t]["backup"], []).append(t)
+    for source, selection in sorted(by_backup.items()):
+        _restore_data(pg, source, selection, jobs)
+    print(f"[OK] Restored {len(tables)} tables ({', '.join(tables)}) from "
+          f"{', '.join(sorted(by_backup))} in {time.perf_counter() - start:.1f}s")
+
+
+def _prepare_database(clean: bool) -> None:
+    """Make sure the pre-data section restores into an empty public schema."""
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+                       "WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v', 'm')")
+        if cursor.fetchone()[0]:
+            if not clean:
+                print("[ERROR] the database is not empty; use --clean to drop the public "
+                      "schema first, or --table to restore single tables", file=sys.stderr)
+                sys.exit(1)
+            cursor.execute("DROP SCHEMA public CASCADE")
+            cursor.execute("CREATE SCHEMA public")
+            conn.commit()
+    finally:
+        conn.close()
+
+
+def restore(pg: Postgres, name: str, jobs: int, clean: bool) -> None:
+    manifest = read_manifest(name)
+    start = time.perf_counter()
+    _prepare_database(clean)
+    schema_local = os.path.join(BACKUP_ROOT, name, "schema.dump")
+    schema_remote = pg.workdir(f"schema_{name}.dump", schema_local)
+    pg.push(schema_local, schema_remote)
+    try:
+        pg.run(["pg_restore", *pg.auth, "--section=pre-data", schema_remote])
+        by_backup: Dict[str, List[str]] = {}
+        for t, entry in manifest["tables"].items():
+            by_backup.setdefault(entry["backup"], []).append(t)
+        for source, tables in sorted(by_backup.items()):
+            _restore_data(pg, source, tables, jobs)
+        _restore_data(pg, name, manifest["sequences"], jobs)
+        pg.run(["pg_restore", *pg.auth, "--section=post-data", "-j", str(jobs), schema_remote])
+    finally:
+        pg.cleanup(schema_remote)
+    print(f"[OK] Restored backup {name} ({len(manifest['tables'])} tables from "
+          f"{len(by_backup)} backups) in {time.perf_counter() - start:.1f}s")
+
+
+def list_backups() -> None:
+    for name in backups():
+        manifest = read_manifest(name)
+        own = sum(1 for e in manifest["tables"].values() if e["backup"] == name)
+        print(f"{name}  {'full' if manifest['full'] else 'incremental':<11} "
+              f"{own:>3} of {len(manifest['tables'])} tables dumped")
+
+
+def prune(keep: int) -> None:
+    """Delete old backups that no kept backup still refers to."""
+    names = backups()
+    kept = names[-keep:]
+    needed = {e["backup"] for n in kept for e in read_manifest(n)["tables"].values()}
+    for name in names[:-keep]:
+        if name not in needed:
+            shutil.rmtree(os.path.join(BACKUP_ROOT, name))
+            print(f"Removed {name}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Parallel, incremental database backups")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--export", action="store_true", help="Create a backup")
+    action.add_argument("--import", dest="restore", action="store_true", help="Restore a backup")
+    action.add_argument("--list", action="store_true", help="List backups")
+    action.add_argument("--prune", type=int, metavar="KEEP",
+                        help="Delete backups older than the last KEEP that nothing refers to")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="Parallel jobs (default: 4)")
+    parser.add_argument("--full", action="store_true", help="Dump every table")
+    parser.add_argument("--backup", type=str, help="Backup to restore (default: latest)")
+    parser.add_argument("-t", "--table", type=str, help="Restore only this table's data")
+    parser.add_argument("--cascade", action="store_true",
+                        help="With --table, also restore the tables that refer to it")
+    parser.add_argument("--clean", action="store_true",
+                        help="Drop the public schema before a full restore")
+    args = parser.parse_args()
+
+    if args.list:
+        list_backups()
+        return
+    if args.prune:
+        prune(args.prune)
+        return
+    pg = Postgres()
+    if args.export:
+        export(pg, args.jobs, args.full)
+        return
+    available = backups()
+    name = args.backup or (available[-1] if available else None)
+    if name not in available:
+        print(f"[ERROR] no backup {name or ''} in {BACKUP_ROOT}", file=sys.stderr)
+        sys.exit(1)
+    if args.table:
+        restore_table(pg, read_manifest(name), name, args.jobs, args.table, args.cascade)
+    else:
+        restore(pg, name, args.jobs, args.clean)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Benchmark the three handicap index implementations against each other.
+
+Paths:
+  sql_view      SELECT ... FROM current_handicap_indexes
+  pandas        handicap_calculator.calculate_handicap() per player (a sample,
+                it issues one query per player)
+  vectorized    last-20 differentials from handicap_calculator in one query,
+                best-N per player with calccap.handicap_indexes()
+
+For every dataset size the harness replaces the synthetic rows (ids from
+--id-base up) with a fresh  gen_dataset.py  set, ANALYZEs, then runs each
+path in its own spawned process and records wall time, time spent in the
+database driver (execute + fetch) and the process' peak RSS.  The indexes of
+all paths are compared player by player.
+
+Results are appended as JSON lines tagged with the git commit, so
+--compare can show the change against the previous commit that ran the
+same size / path.
+
+Usage:
+    python3 bench_handicap.py --sizes 1000,10000,100000 [--sample 50] [--compare]
+    python3 bench_handicap.py --sizes 10000 --skip-load    # reuse loaded data
+
+Requires:  psycopg2, pandas, numpy and a local Postgres with the vhsdb schema
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, List, Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.environ.get("ROOT_DIR", os.path.dirname(SCRIPT_DIR))
+RESULTS_FILE = os.path.join(ROOT_DIR, "bench_results", "handicap.jsonl")
+PATHS = ["sql_view", "pandas", "vectorized"]
+# Indexes are rounded to one decimal; allow one rounding step of difference
+TOLERANCE = 0.1
+REGRESSION = 1.10
+
+_db_seconds = 0.0
+
+
+def _timing_connect():
+    """Connect with a cursor class that accumulates time spent in the driver."""
+    import psycopg2
+    import psycopg2.extensions
+
+    from handicap_calculator import DB_PARAMS
+
+    class TimingCursor(psycopg2.extensions.cursor):
+        def _timed(self, method, *args, **kwargs):
+            global _db_seconds
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                _db_seconds += time.perf_counter() - start
+
+        def execute(self, *args, **kwargs):
+            return self._timed(super().execute, *args, **kwargs)
+
+        def fetchone(self):
+            return self._timed(super().fetchone)
+
+        def fetchmany(self, *args, **kwargs):
+            return self._timed(super().fetchmany, *args, **kwargs)
+
+        def fetchall(self):
+            return self._timed(super().fetchall)
+
+        def copy_expert(self, *args, **kwargs):
+            return self._timed(super().copy_expert, *args, **kwargs)
+
+    return psycopg2.connect(cursor_factory=TimingCursor, **DB_PARAMS)
+
+
+def _sql_view(players: Optional[List[int]]) -> Dict[int, Optional[float]]:
+    conn = _timing_connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT player_id, handicap_index FROM current_handicap_indexes")
+        return {pid: None if idx is None else float(idx) for pid, idx in cursor.fetchall()}
+    finally:
+        conn.close()
+
+
+def _pandas(players: Optional[List[int]]) -> Dict[int, Optional[float]]:
+    import handicap_calculator
+
+    handicap_calculator.connect_to_db = _timing_connect
+    results = {}
+    for pid in players or []:
+        details = handicap_calculator.calculate_handicap(pid)
+        results[pid] = None if not details or details["handicap_index"] is None \
+            else float(details["handicap_index"])
+    return results
+
+
+def _vectorized(players: Optional[List[int]]) -> Dict[int, Optional[float]]:
+    from calccap import handicap_indexes
+    from card_data import read_frame
+
+    conn = _timing_connect()
+    try:
+        rounds = read_frame(conn, """
+            SELECT player_id, calculated_differential AS differential
+            FROM handicap_calculator WHERE recency_rank <= 20
+        """)
+    finally:
+        conn.close()
+    rounds["differential"] = rounds["differential"].astype(float)
+    indexes = handicap_indexes(rounds)
+    result: Dict[int, Optional[float]] = {int(p): None for p in rounds["player_id"].unique()}
+    result.update({int(p): float(v) for p, v in indexes.items()})
+    return result
+
+
+RUNNERS = {"sql_view": _sql_view, "pandas": _pandas, "vectorized": _vectorized}
+
+
+def _run_path(path: str, players: Optional[List[int]]) -> dict:
+    """Child-process entry point; returns timings and the computed indexes."""
+    start = time.perf_counter()
+    indexes = RUNNERS[path](players)
+    wall = time.perf_counter() - start
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        rss_kb //= 1024
+    return {"wall_s": wall, "db_s": _db_seconds, "peak_rss_mb": rss_kb / 1024,
+            "indexes": {str(k): v for k, v in indexes.items()}}
+
+
+def run_isolated(path: str, players: Optional[List[int]]) -> dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(_run_path, path, players).result()
+
+
+def load_dataset(cards: int, id_base: int, seed: int) -> None:
+    """Replace the synthetic rows with a freshly generated set."""
+    import gen_dataset
+    from handicap_calculator import connect_to_db
+
+    conn = connect_to_db()
+    cursor = conn.cursor()
+    for table in reversed(gen_dataset.TABLE_ORDER):
+        key = "course_id" if table.startswith("x_course") else "id"
+        cursor.execute(f"DELETE FROM {table} WHERE {key} >= %s", (id_base,))
+    conn.commit()
+    gen_dataset.write_postgres(gen_dataset.Scale(cards, id_base), seed)
+    conn.autocommit = True
+    for table in gen_dataset.TABLE_ORDER:
+        cursor.execute(f"ANALYZE {table}")
+    cursor.close()
+    conn.close()
+
+
+def sample_players(count: int, id_base: int) -> List[int]:
+    """A fixed sample of the synthetic players, spread over their id range."""
+    from handicap_calculator import connect_to_db
+
+    conn = connect_to_db()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT player_id FROM player_cards WHERE player_id >= %s
+        GROUP BY player_id ORDER BY md5(player_id::text) LIMIT %s
+    """, (id_base, count))
+    players = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    return players
+
+
+def compare_indexes(results: Dict[str, dict], tolerance: float) -> Dict[str, int]:
+    """Count players whose index differs from the SQL view, per path."""
+    reference = results["sql_view"]["indexes"]
+    mismatches = {}
+    for path, result in results.items():
+        if path == "sql_view":
+            continue
+        bad = 0
+        for pid, value in result["indexes"].items():
+            ref = reference.get(pid)
+            if (ref is None) != (value is None) or \
+                    (ref is not None and abs(ref - value) > tolerance + 1e-9):
+                bad += 1
+        mismatches[path] = bad
+    return mismatches
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def previous_results(path: str, commit: str) -> Dict[tuple, dict]:
+    """Latest stored result per (size, path) from a different commit."""
+    latest: Dict[tuple, dict] = {}
+    if not os.path.exists(path):
+        return latest
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["commit"] != commit:
+                latest[(record["cards"], record["path"])] = record
+    return latest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the handicap index implementations")
+    parser.add_argument("--sizes", type=str, default="1000,10000,100000",
+                        help="Comma-separated card counts (default: 1000,10000,100000)")
+    parser.add_argument("--paths", type=str, default=",".join(PATHS),
+                        help=f"Comma-separated paths to run (default: {','.join(PATHS)})")
+    parser.add_argument("--sample", type=int, default=50,
+                        help="Players for the per-player pandas path (default: 50)")
+    parser.add_argument("--seed", type=int, default=42, help="Dataset seed (default: 42)")
+    parser.add_argument("--id-base", type=int, default=100_000, help="First synthetic id")
+    parser.add_argument("--skip-load", action="store_true", help="Use the data already loaded")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help=f"Allowed index difference (default: {TOLERANCE})")
+    parser.add_argument("--results", type=str, default=RESULTS_FILE, help="Results JSONL file")
+    parser.add_argument("--compare", action="store_true",
+                        help="Compare with the previous commit's results")
+    args = parser.parse_args()
+
+    paths = [p for p in args.paths.split(",") if p]
+    unknown = set(paths) - set(PATHS)
+    if unknown:
+        parser.error(f"unknown paths: {', '.join(sorted(unknown))}")
+    if "sql_view" not in paths:
+        paths.insert(0, "sql_view")  # reference for the correctness check
+
+    commit = git_commit()
+    baseline = previous_results(args.results, commit) if args.compare else {}
+    os.makedirs(os.path.dirname(args.results), exist_ok=True)
+    failed = False
+
+    for cards in [int(s) for s in args.sizes.split(",") if s]:
+        if not args.skip_load:
+            print(f"Loading {cards} synthetic cards...")
+            load_dataset(cards, args.id_base, args.seed)
+        players = sample_players(args.sample, args.id_base)
+
+        results = {path: run_isolated(path, players) for path in paths}
+        mismatches = compare_indexes(results, args.tolerance)
+
+        print(f"\n=== {cards} cards ===")
+        print(f"{'path':<12} {'wall s':>9} {'db s':>9} {'rss MB':>9} {'players':>8} "
+              f"{'mismatch':>8} {'vs prev':>8}")
+        with open(args.results, "a", encoding="utf-8") as out:
+            for path in paths:
+                r = results[path]
+                record = {
+                    "commit": commit, "host": platform.node(), "cards": cards, "path": path,
+                    "seed": args.seed, "wall_s": round(r["wall_s"], 4), "db_s": round(r["db_s"], 4),
+                    "peak_rss_mb": round(r["peak_rss_mb"], 1), "players": len(r["indexes"]),
+                    "mismatches": mismatches.get(path, 0),
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                }
+                out.write(json.dumps(record) + "\n")
+
+                change = ""
+                prev = baseline.get((cards, path))
+                if prev and prev["wall_s"] > 0:
+                    ratio = record["wall_s"] / prev["wall_s"]
+                    change = f"{ratio:.2f}x" + (" !" if ratio > REGRESSION else "")
+                print(f"{path:<12} {record['wall_s']:>9.3f} {record['db_s']:>9.3f} "
+                      f"{record['peak_rss_mb']:>9.1f} {record['players']:>8} "
+                      f"{record['mismatches']:>8} {change:>8}")
+                failed |= record["mismatches"] > 0
+
+    print(f"\nResults appended to {args.results}")
+    if failed:
+        print("[WARN] Some paths disagree with current_handicap_indexes", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
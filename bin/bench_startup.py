@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Guard the startup time of handicap_calculator.py.
+
+Imports the module in fresh interpreters under  python -X importtime  and
+reports the median cumulative import time and the slowest modules.  Fails
+(exit 1) if a heavy module is imported at startup (pandas, numpy, tabulate by
+default) or the median exceeds --budget milliseconds.
+
+--cli also times whole runs of the command line, e.g. the --index fast path
+(needs the database):
+
+Usage:
+    python3 bench_startup.py [--repeat 5] [--budget 150] [--top 10]
+    python3 bench_startup.py --cli "--id 1 --index"
+
+Requires:  nothing beyond the standard library (and psycopg2 for the import)
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+
+BIN_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE = "handicap_calculator"
+HEAVY = ["pandas", "numpy", "tabulate"]
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+    """{module: (self_us, cumulative_us)} for one cold import of module."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=BIN_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"[ERROR] import {module} failed:\n{result.stderr}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def cli_time(args: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(BIN_DIR, f"{MODULE}.py"), *shlex.split(args)],
+                   cwd=BIN_DIR, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check handicap_calculator.py startup time")
+    parser.add_argument("--repeat", type=int, default=5, help="Cold imports to run (default: 5)")
+    parser.add_argument("--budget", type=float, default=150,
+                        help="Maximum median import time in ms (default: 150)")
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list")
+    parser.add_argument("--heavy", default=",".join(HEAVY),
+                        help="Modules that must not be imported at startup")
+    parser.add_argument("--cli", help="Also time the command line with these arguments")
+    args = parser.parse_args()
+
+    runs = [import_times(MODULE) for _ in range(args.repeat)]
+    median_ms = statistics.median(run[MODULE][1] for run in runs) / 1000
+    last = runs[-1]
+
+    print(f"import {MODULE}: {median_ms:.1f} ms median of {args.repeat} "
+          f"({len(last)} modules)")
+    slowest = sorted(last.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"  {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms total  {name}")
+
+    failed = False
+    heavy = [name for name in last
+             if name.split(".")[0] in args.heavy.split(",") and "." not in name]
+    if heavy:
+        print(f"[FAIL] imported at startup: {', '.join(sorted(heavy))}")
+        failed = True
+    if median_ms > args.budget:
+        print(f"[FAIL] {median_ms:.1f} ms is over the {args.budget:.0f} ms budget")
+        failed = True
+
+    if args.cli:
+        times = [cli_time(args.cli) for _ in range(args.repeat)]
+        print(f"{MODULE}.py {args.cli}: {statistics.median(times) * 1000:.1f} ms median")
+
+    if failed:
+        sys.exit(1)
+    print("[OK] startup within budget")
+
+
+if __name__ == "__main__":
+    main()
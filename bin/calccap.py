@@ -1,47 +1,262 @@
 #!/bin/env python
-import pandas as pd
-import numpy as np
+"""
+Handicap index simulator.
+
+With --demo this is the original example: it fakes one course and eight
+rounds, writes courses.csv / scores.csv and prints the resulting index.
+
+Otherwise it projects every player's future handicap index.  For each player
+it draws  --paths  future-round paths at once as a (paths × rounds) array of
+differentials, seeded from the mean and spread of that player's real
+differentials in the handicap_calculator view, rolls the 20-round window
+forward over each path and reports percentile bands of the index after every
+simulated round.  Players are spread over a process pool.
+
+Usage:
+    python3 calccap.py --demo
+    python3 calccap.py [-i PLAYER_ID] [--rounds 20] [--paths 5000] [--workers N]
+    python3 calccap.py --synthetic 500      # no database, timing check only
+    python3 calccap.py --snapshot DIR       # histories from a snapshot.py export
+"""
+import argparse
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
-# 1. Simulate course variables CSV
-courses = pd.DataFrame([{
-    "course_name": "Augusta National Golf Club",
-    "par": 72,
-    "yardage": 7485,
-    "course_rating": 76.2,
-    "slope_rating": 148
-}])
-courses.to_csv("courses.csv", index=False)
-
-# 2. Simulate eight scorecards CSV
-np.random.seed(42)
-start_date = datetime.today() - timedelta(days=90)
-scores = []
-for i in range(1, 9):
-    scores.append({
-        "round_id": i,
-        "date": (start_date + timedelta(days=i*7)).strftime("%Y-%m-%d"),
+import numpy as np
+import pandas as pd
+
+WINDOW = 20
+# Differentials counted for 0..20 rounds in the window (same table as the
+# current_handicap_indexes view).
+DIFFERENTIALS_TO_USE = np.array([0, 0, 0, 0, 0, 1, 2, 3, 3, 4, 4, 4, 5, 5, 6, 6, 8, 8, 8, 8, 8])
+PERCENTILES = (5, 25, 50, 75, 95)
+# Spread used when a player has too few rounds to estimate their own.
+DEFAULT_STD = 3.0
+
+
+def run_demo():
+    """Simulate eight rounds on one course and compute the handicap index."""
+    # 1. Simulate course variables CSV
+    courses = pd.DataFrame([{
         "course_name": "Augusta National Golf Club",
-        # Simulate gross scores around 85 (±5 strokes)
-        "gross_score": int(np.random.normal(loc=85, scale=5))
-    })
-scores_df = pd.DataFrame(scores)
-scores_df.to_csv("scores.csv", index=False)
-
-# 3. Read CSVs and merge
-courses_df = pd.read_csv("courses.csv")
-scores_df = pd.read_csv("scores.csv")
-df = scores_df.merge(courses_df, on="course_name")
-
-# 4. Calculate score differentials: (Gross – Rating) × 113 / Slope
-df["differential"] = (df["gross_score"] - df["course_rating"]) * 113 / df["slope_rating"]
-
-# 5. Handicap Index calculation: average of best 8 diffs × 0.96
-best_eight = df["differential"].nsmallest(8)
-handicap_index = best_eight.mean() * 0.96
-
-# 6. Output results
-print("Augusta National Golf Club variables:\n", courses_df.to_string(index=False))
-print("\nSimulated scores:\n", scores_df.to_string(index=False))
-print("\nScore Differentials:\n", df[["round_id", "gross_score", "differential"]].to_string(index=False))
-print(f"\nHandicap Index (best 8 of 8 × 0.96): {handicap_index:.1f}")
+        "par": 72,
+        "yardage": 7485,
+        "course_rating": 76.2,
+        "slope_rating": 148
+    }])
+    courses.to_csv("courses.csv", index=False)
+
+    # 2. Simulate eight scorecards CSV
+    np.random.seed(42)
+    start_date = datetime.today() - timedelta(days=90)
+    scores = []
+    for i in range(1, 9):
+        scores.append({
+            "round_id": i,
+            "date": (start_date + timedelta(days=i*7)).strftime("%Y-%m-%d"),
+            "course_name": "Augusta National Golf Club",
+            # Simulate gross scores around 85 (±5 strokes)
+            "gross_score": int(np.random.normal(loc=85, scale=5))
+        })
+    scores_df = pd.DataFrame(scores)
+    scores_df.to_csv("scores.csv", index=False)
+
+    # 3. Read CSVs and merge
+    courses_df = pd.read_csv("courses.csv")
+    scores_df = pd.read_csv("scores.csv")
+    df = scores_df.merge(courses_df, on="course_name")
+
+    # 4. Calculate score differentials: (Gross – Rating) × 113 / Slope
+    df["differential"] = (df["gross_score"] - df["course_rating"]) * 113 / df["slope_rating"]
+
+    # 5. Handicap Index calculation: average of best 8 diffs × 0.96
+    best_eight = df["differential"].nsmallest(8)
+    handicap_index = best_eight.mean() * 0.96
+
+    # 6. Output results
+    print("Augusta National Golf Club variables:\n", courses_df.to_string(index=False))
+    print("\nSimulated scores:\n", scores_df.to_string(index=False))
+    print("\nScore Differentials:\n", df[["round_id", "gross_score", "differential"]].to_string(index=False))
+    print(f"\nHandicap Index (best 8 of 8 × 0.96): {handicap_index:.1f}")
+
+
+def rolling_indexes(history, future):
+    """Handicap index after each future round, for every path at once.
+
+    history  1-D array of the player's real differentials, oldest first
+    future   (paths × rounds) array of simulated differentials
+    Returns a (paths × rounds) array; NaN where fewer than 5 rounds exist.
+    """
+    paths, rounds = future.shape
+    played = len(history)
+    # the 19 most recent real rounds, left-padded with +inf (sorts last)
+    recent = np.asarray(history, dtype=float)[-(WINDOW - 1):]
+    prefix = np.concatenate([np.full(WINDOW - 1 - len(recent), np.inf), recent])
+    full = np.concatenate([np.broadcast_to(prefix, (paths, WINDOW - 1)), future], axis=1)
+
+    # (paths × rounds × 20) view of the window ending at each future round
+    windows = np.lib.stride_tricks.sliding_window_view(full, WINDOW, axis=1)
+    best = np.cumsum(np.sort(windows, axis=2)[..., :DIFFERENTIALS_TO_USE.max()], axis=2)
+
+    counts = np.minimum(played + np.arange(1, rounds + 1), WINDOW)
+    used = DIFFERENTIALS_TO_USE[counts]
+    take = np.maximum(used - 1, 0)[None, :, None]
+    totals = np.take_along_axis(best, np.broadcast_to(take, (paths, rounds, 1)), axis=2)[..., 0]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        indexes = np.round(totals / used * 0.96, 1)
+    indexes[:, used == 0] = np.nan
+    return indexes
+
+
+def handicap_indexes(rounds):
+    """Current index per player from a frame of (player_id, differential).
+
+    rounds  holds each player's last 20 rounds; players with fewer than five
+    rounds get no index.  Vectorized counterpart of the demo's nsmallest().
+    """
+    ordered = rounds.sort_values(["player_id", "differential"], kind="stable")
+    grouped = ordered.groupby("player_id", sort=False)["differential"]
+    counts = grouped.transform("size").clip(upper=WINDOW).to_numpy()
+    best = ordered[grouped.cumcount().to_numpy() < DIFFERENTIALS_TO_USE[counts]]
+    return (best.groupby("player_id")["differential"].mean() * 0.96).round(1)
+
+
+def project_player(args):
+    """Worker: simulate one player and return percentile bands per round."""
+    player_id, history, rounds, paths, seed = args
+    history = np.asarray(history, dtype=float)
+    mean = history.mean()
+    std = history.std(ddof=1) if len(history) > 2 else DEFAULT_STD
+
+    rng = np.random.default_rng([seed, player_id])
+    future = rng.normal(mean, std, size=(paths, rounds))
+    indexes = rolling_indexes(history, future)
+    with warnings.catch_warnings():
+        # rounds where the window is still too short are all NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        bands = np.nanpercentile(indexes, PERCENTILES, axis=0)
+    return player_id, mean, std, bands
+
+
+def fetch_histories(player_id=None):
+    """Return {player_id: (player_name, differentials oldest first)}."""
+    from handicap_calculator import connect_to_db
+
+    query = """
+    SELECT player_id, player_name, calculated_differential
+    FROM handicap_calculator
+    WHERE calculated_differential IS NOT NULL
+    """
+    params = []
+    if player_id:
+        query += " AND player_id = %s"
+        params.append(player_id)
+    query += " ORDER BY player_id, play_date"
+
+    conn = connect_to_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        players = {}
+        for pid, name, diff in cursor:
+            players.setdefault(pid, (name, []))[1].append(float(diff))
+        return players
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def snapshot_histories(snapshot, player_id=None):
+    """fetch_histories() from a snapshot.py export instead of the database."""
+    import pyarrow.compute as pc
+    from snapshot import load_table
+
+    cards = load_table(snapshot, "player_cards",
+                       ["player_id", "play_date", "score_differential", "verified", "tarj"])
+    keep = pc.and_(pc.and_(pc.equal(cards["verified"], True), pc.equal(cards["tarj"], "OK")),
+                   pc.is_valid(cards["score_differential"]))
+    if player_id:
+        keep = pc.and_(keep, pc.equal(cards["player_id"], player_id))
+    rounds = cards.filter(keep).select(["player_id", "play_date", "score_differential"]).to_pandas()
+    names = load_table(snapshot, "players").to_pandas().set_index("id")["username"]
+
+    players = {}
+    for pid, group in rounds.sort_values(["player_id", "play_date"]).groupby("player_id"):
+        players[int(pid)] = (names.get(pid), group["score_differential"].tolist())
+    return players
+
+
+def synthetic_histories(count, seed):
+    rng = np.random.default_rng(seed)
+    players = {}
+    for pid in range(1, count + 1):
+        n = int(rng.integers(3, 60))
+        players[pid] = (f"player{pid}", list(rng.normal(rng.uniform(5, 35), rng.uniform(1, 5), n)))
+    return players
+
+
+def project(players, rounds, paths, workers, seed):
+    """Run the simulation for every player over a process pool."""
+    jobs = [(pid, diffs, rounds, paths, seed) for pid, (_, diffs) in players.items()]
+    chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(project_player, jobs, chunksize=chunksize))
+
+
+def print_projection(players, results, rounds, show_rounds):
+    checkpoints = sorted({r for r in show_rounds if 1 <= r <= rounds} | {rounds})
+    rows = []
+    for pid, mean, std, bands in results:
+        name, diffs = players[pid]
+        for r in checkpoints:
+            row = {"Player ID": pid, "Player Name": name, "Rounds": len(diffs),
+                   "Diff Mean": round(mean, 1), "Diff Std": round(std, 1), "After": r}
+            for p, value in zip(PERCENTILES, bands[:, r - 1]):
+                row[f"P{p}"] = None if np.isnan(value) else round(float(value), 1)
+            rows.append(row)
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Project future handicap index distributions")
+    parser.add_argument("--demo", action="store_true", help="Run the original eight-round example")
+    parser.add_argument("-i", "--id", type=int, help="Only project this player")
+    parser.add_argument("--rounds", type=int, default=20, help="Future rounds per path (default: 20)")
+    parser.add_argument("--paths", type=int, default=5000, help="Paths per player (default: 5000)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument("--show", type=str, default="5,10",
+                        help="Comma-separated rounds to report besides the last (default: 5,10)")
+    parser.add_argument("--synthetic", type=int, metavar="PLAYERS",
+                        help="Use this many synthetic players instead of the database")
+    parser.add_argument("--snapshot", metavar="DIR",
+                        help="Read differentials from a snapshot.py export instead of the database")
+    args = parser.parse_args()
+
+    if args.demo:
+        run_demo()
+        return
+
+    start = time.perf_counter()
+    if args.synthetic:
+        players = synthetic_histories(args.synthetic, args.seed)
+    elif args.snapshot:
+        players = snapshot_histories(args.snapshot, args.id)
+    else:
+        players = fetch_histories(args.id)
+    if not players:
+        print("No differentials found.")
+        return
+    results = project(players, args.rounds, args.paths, args.workers, args.seed)
+    elapsed = time.perf_counter() - start
+
+    print_projection(players, results, args.rounds, [int(r) for r in args.show.split(",") if r])
+    print(f"\nProjected {len(players)} players × {args.paths} paths × {args.rounds} rounds "
+          f"in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Screen scorecards for outlier rounds before they reach the handicap window.
+
+For every card added since the previous run it computes:
+  • a robust z-score of the card's differential (player_cards.score_differential,
+    not the hand-entered g_differential) against the player's own
+    history (median / MAD, so one bad round cannot hide another)
+        diff_high   z >  threshold   (possible sandbagging)
+        diff_low    z < −threshold   (exceptional round or entry error)
+  • hole-level checks on h01..h18 against the course pars
+        gross_mismatch   the holes do not add up to  gross
+        missing_holes    gross is set but some holes are empty
+        hole_extreme     a hole below 1 or more than MAX_OVER_PAR over par
+
+All checks are vectorized pandas / NumPy operations over the whole batch.
+Flags go to the  card_review_flags  table; the id of the last scanned card is
+kept in  card_scan_state  so the next run only looks at new cards.  --dry-run
+creates and changes nothing.
+
+Usage:
+    python3 card_anomalies.py [--full] [--threshold 3.5] [--dry-run]
+    python3 card_anomalies.py --benchmark 1000000
+
+Requires:  psycopg2, pandas, numpy
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from card_data import (HOLE_COLUMNS, card_reference, course_pars, get_watermark, hole_matrix,
+                       par_matrix, read_frame, set_watermark)
+
+SCANNER = "card_anomalies"
+Z_THRESHOLD = 3.5
+MAX_OVER_PAR = 7
+# MAD of a normal distribution is 0.6745 σ
+MAD_SCALE = 0.6745
+MIN_HISTORY = 5
+
+CREATE_TABLES = """
+CREATE TABLE IF NOT EXISTS card_review_flags (
+    id SERIAL PRIMARY KEY,
+    card_id INTEGER NOT NULL {card_reference},
+    player_id INTEGER NOT NULL,
+    flag VARCHAR(30) NOT NULL,
+    score NUMERIC,
+    detail TEXT,
+    reviewed BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (card_id, flag)
+);
+CREATE INDEX IF NOT EXISTS idx_card_review_flags_open ON card_review_flags(card_id) WHERE NOT reviewed;
+"""
+
+CARD_COLUMNS = """
+    pc.id AS card_id, pc.player_id, pc.course_id, pc.gross,
+    pc.score_differential AS differential,
+    {holes}
+""".format(holes=", ".join(f"pc.{h}" for h in HOLE_COLUMNS))
+
+NEW_CARDS_QUERY = f"""
+SELECT {CARD_COLUMNS}
+FROM player_cards pc
+WHERE pc.id > %s
+"""
+
+HISTORY_QUERY = """
+SELECT pc.id AS card_id, pc.player_id, pc.score_differential AS differential
+FROM player_cards pc
+WHERE pc.id <= %s AND pc.player_id = ANY(%s)
+"""
+
+
+def differential_flags(cards: pd.DataFrame, history: pd.DataFrame,
+                       threshold: float = Z_THRESHOLD) -> pd.DataFrame:
+    """Robust per-player z-scores of the new cards' differentials.
+
+    history  holds earlier cards of the same players (card_id, player_id,
+    differential); statistics are taken over history plus the new cards.
+    """
+    pool = pd.concat([history[["player_id", "differential"]],
+                      cards[["player_id", "differential"]]], ignore_index=True)
+    pool = pool.dropna(subset=["differential"])
+    grouped = pool.groupby("player_id")["differential"]
+    median = grouped.median()
+    mad = (pool["differential"] - pool["player_id"].map(median)).abs() \
+        .groupby(pool["player_id"]).median()
+    count = grouped.size()
+
+    stats = pd.DataFrame({"median": median, "mad": mad, "count": count})
+    joined = cards[["card_id", "player_id", "differential"]].join(stats, on="player_id")
+    joined = joined[(joined["count"] >= MIN_HISTORY) & (joined["mad"] > 0)]
+    z = MAD_SCALE * (joined["differential"] - joined["median"]) / joined["mad"]
+
+    out = joined.assign(score=z.round(2))
+    out = out[out["score"].abs() > threshold]
+    out["flag"] = np.where(out["score"] > 0, "diff_high", "diff_low")
+    out["detail"] = "differential " + out["differential"].round(1).astype(str) + \
+        " vs median " + out["median"].round(1).astype(str)
+    return out[["card_id", "player_id", "flag", "score", "detail"]]
+
+
+def hole_flags(cards: pd.DataFrame, pars: np.ndarray) -> pd.DataFrame:
+    """Hole-level checks; pars is the (n × 18) par matrix aligned with cards."""
+    holes = hole_matrix(cards)
+    missing = np.isnan(holes)
+    n_missing = missing.sum(axis=1)
+    totals = np.nansum(holes, axis=1)
+    gross = cards["gross"].to_numpy(dtype=float, na_value=np.nan)
+
+    over = holes - pars
+    extreme = (holes < 1) | (over > MAX_OVER_PAR)
+    worst = np.where(extreme, over, -np.inf).max(axis=1)
+
+    checks = [
+        ("gross_mismatch", (n_missing == 0) & ~np.isnan(gross) & (totals != gross),
+         totals - gross, "holes sum to " + pd.Series(totals).astype(int).astype(str)),
+        ("missing_holes", (n_missing > 0) & ~np.isnan(gross),
+         n_missing, pd.Series(n_missing).astype(str) + " holes missing"),
+        ("hole_extreme", extreme.any(axis=1),
+         worst, pd.Series(worst).map("worst hole {:+.0f} vs par".format)),
+    ]
+    frames = []
+    for flag, mask, score, detail in checks:
+        if mask.any():
+            frames.append(pd.DataFrame({
+                "card_id": cards["card_id"].to_numpy()[mask],
+                "player_id": cards["player_id"].to_numpy()[mask],
+                "flag": flag,
+                "score": np.asarray(score, dtype=float)[mask],
+                "detail": np.asarray(detail)[mask],
+            }))
+    if not frames:
+        return pd.DataFrame(columns=["card_id", "player_id", "flag", "score", "detail"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def scan(cards: pd.DataFrame, history: pd.DataFrame, pars: np.ndarray,
+         threshold: float = Z_THRESHOLD) -> pd.DataFrame:
+    """Return all flags for a batch of new cards."""
+    return pd.concat([differential_flags(cards, history, threshold), hole_flags(cards, pars)],
+                     ignore_index=True).sort_values(["card_id", "flag"])
+
+
+def write_flags(conn, flags: pd.DataFrame, last_card_id: int) -> None:
+    from psycopg2.extras import execute_values
+
+    cursor = conn.cursor()
+    try:
+        execute_values(cursor, """
+            INSERT INTO card_review_flags (card_id, player_id, flag, score, detail)
+            VALUES %s ON CONFLICT (card_id, flag) DO NOTHING
+        """, list(flags[["card_id", "player_id", "flag", "score", "detail"]]
+                  .astype(object).itertuples(index=False, name=None)), page_size=5000)
+        set_watermark(cursor, SCANNER, last_card_id)
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def run(full: bool, threshold: float, dry_run: bool) -> None:
+    from handicap_calculator import connect_to_db
+
+    conn = connect_to_db()
+    try:
+        if not dry_run:
+            cursor = conn.cursor()
+            cursor.execute(CREATE_TABLES.format(
+                card_reference=card_reference(cursor, "card_review_flags")))
+            cursor.close()
+        watermark = get_watermark(conn, SCANNER)
+        since = 0 if full else watermark
+        if not dry_run:
+            conn.commit()
+
+        start = time.perf_counter()
+        cards = read_frame(conn, NEW_CARDS_QUERY, (since,))
+        if cards.empty:
+            print(f"[OK] No cards after id {since}")
+            return
+        history = read_frame(conn, HISTORY_QUERY,
+                             (since, [int(p) for p in cards["player_id"].unique()]))
+        pars = par_matrix(cards["course_id"], course_pars(conn, cards["course_id"].unique().tolist()))
+        flags = scan(cards, history, pars, threshold)
+        elapsed = time.perf_counter() - start
+
+        print(f"[OK] Scanned {len(cards)} cards (after id {since}) in {elapsed:.2f}s, "
+              f"{len(flags)} flags")
+        if len(flags):
+            print(flags.to_string(index=False))
+        if not dry_run:
+            write_flags(conn, flags, int(cards["card_id"].max()))
+    finally:
+        if dry_run:
+            conn.rollback()
+        conn.close()
+
+
+def run_benchmark(n_cards: int, seed: int = 42) -> None:
+    """Time a scan of synthetic cards (no database)."""
+    rng = np.random.default_rng(seed)
+    n_players = max(1, n_cards // 50)
+    base_pars = np.array([4, 5, 3, 4, 4, 3, 4, 5, 4, 4, 3, 5, 4, 4, 3, 4, 5, 4], dtype=float)
+    skill = rng.uniform(0, 2, n_players)
+    player_id = rng.integers(0, n_players, n_cards)
+    holes = base_pars + np.rint(rng.normal(skill[player_id, None], 1.0, (n_cards, 18))).clip(-2, 9)
+    holes[rng.random(holes.shape) < 1e-4] = np.nan
+    gross = np.nansum(holes, axis=1)
+    gross[rng.random(n_cards) < 1e-3] += 1
+    cards = pd.DataFrame(holes, columns=HOLE_COLUMNS)
+    cards.insert(0, "card_id", np.arange(1, n_cards + 1))
+    cards.insert(1, "player_id", player_id)
+    cards.insert(2, "course_id", 1)
+    cards.insert(3, "gross", gross)
+    cards.insert(4, "differential", (gross - 72.0) * 113 / 125)
+    pars = np.broadcast_to(base_pars, (n_cards, 18))
+
+    start = time.perf_counter()
+    flags = scan(cards, cards.iloc[:0], pars)
+    elapsed = time.perf_counter() - start
+    print(f"Scanned {n_cards} cards for {n_players} players in {elapsed:.2f}s "
+          f"({n_cards / elapsed:,.0f} cards/s), {len(flags)} flags")
+    print(flags["flag"].value_counts().to_string())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Flag suspicious scorecards for review")
+    parser.add_argument("--full", action="store_true", help="Rescan every card, not only new ones")
+    parser.add_argument("--threshold", type=float, default=Z_THRESHOLD,
+                        help=f"Robust z-score threshold (default: {Z_THRESHOLD})")
+    parser.add_argument("--dry-run", action="store_true", help="Print flags without writing them")
+    parser.add_argument("--benchmark", type=int, metavar="CARDS",
+                        help="Scan this many synthetic cards instead of the database")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        run_benchmark(args.benchmark)
+        return
+    if args.threshold <= 0:
+        print("Threshold must be positive", file=sys.stderr)
+        sys.exit(1)
+    run(args.full, args.threshold, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Shared bulk readers and writers for the scorecard batch jobs.
+
+Batch tools (anomaly scanner, round statistics, hole difficulty, ...) read
+whole tables at once.  Row-by-row  fetchall()  builds a Python tuple per row,
+so these helpers stream query results through  COPY ... TO STDOUT  straight
+into pandas (and frames back through  COPY ... FROM STDIN), and turn hole
+scores and course pars into NumPy matrices.
+
+Hole scores are also stored packed in  player_cards.hole_scores  (18 bytes,
+0 = no score; see backend/db/sql/220_add_player_cards_hole_scores.sql).
+read_hole_scores()  fetches them with binary COPY, whose rows all have the
+same width, and decodes the whole buffer with one  np.frombuffer  call.
+
+Requires:  psycopg2, pandas, numpy
+"""
+from __future__ import annotations
+
+import io
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+HOLES = 18
+HOLE_COLUMNS = [f"h{n:02d}" for n in range(1, HOLES + 1)]
+
+# Score types by strokes to par: (column, lowest, highest) — bounds are inclusive
+BUCKETS = [
+    ("eagles", -np.inf, -2),
+    ("birdies", -1, -1),
+    ("pars", 0, 0),
+    ("bogeys", 1, 1),
+    ("double_bogeys", 2, 2),
+    ("triple_bogeys", 3, 3),
+    ("worse", 4, np.inf),
+]
+
+
+def read_frame(conn, query: str, params: Optional[Sequence] = None) -> pd.DataFrame:
+    """Run  query  through COPY and return the result as a DataFrame."""
+    cursor = conn.cursor()
+    try:
+        sql = cursor.mogrify(query, params).decode() if params else query
+        buf = io.StringIO()
+        cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)", buf)
+    finally:
+        cursor.close()
+    buf.seek(0)
+    return pd.read_csv(buf)
+
+
+def copy_frame(conn, df: pd.DataFrame, table: str) -> None:
+    """Load a DataFrame into  table  (columns named like the frame) via COPY."""
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False)
+    buf.seek(0)
+    cursor = conn.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    finally:
+        cursor.close()
+
+
+def hole_matrix(df: pd.DataFrame) -> np.ndarray:
+    """Return the h01..h18 columns as an (n × 18) float array (NaN = missing)."""
+    return df[HOLE_COLUMNS].to_numpy(dtype=float, na_value=np.nan)
+
+
+def course_pars(conn, course_ids: Optional[Iterable[int]] = None) -> Dict[int, np.ndarray]:
+    """Return {course_id: 18 hole pars} from x_course_holes (NaN for gaps)."""
+    query = "SELECT course_id, hole_number, par FROM x_course_holes"
+    params = None
+    if course_ids is not None:
+        query += " WHERE course_id = ANY(%s)"
+        params = (list(course_ids),)
+    holes = read_frame(conn, query, params)
+    pars: Dict[int, np.ndarray] = {}
+    for course_id, group in holes.groupby("course_id"):
+        row = np.full(HOLES, np.nan)
+        row[group["hole_number"].to_numpy() - 1] = group["par"].to_numpy(dtype=float)
+        pars[int(course_id)] = row
+    return pars
+
+
+def par_matrix(course_ids: Sequence[int], pars: Dict[int, np.ndarray]) -> np.ndarray:
+    """Line up per-course pars with a column of card course_ids (n × 18)."""
+    known = np.array(sorted(pars), dtype=np.int64)
+    table = np.vstack([pars[c] for c in known] + [np.full(HOLES, np.nan)])
+    ids = np.asarray(course_ids, dtype=np.int64)
+    pos = np.searchsorted(known, ids)
+    pos = np.where((pos < len(known)) & (known[np.minimum(pos, len(known) - 1)] == ids)
+                   if len(known) else False, pos, len(known))
+    return table[pos]
+
+
+# Binary COPY row of (card_id INTEGER, hole_scores BYTEA(18)): field count,
+# then length + value per field, all big-endian
+PACKED_ROW = np.dtype([("fields", ">i2"), ("id_len", ">i4"), ("card_id", ">i4"),
+                       ("holes_len", ">i4"), ("holes", "u1", (HOLES,))])
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+
+
+def pack_hole_scores(holes: np.ndarray) -> list:
+    """Pack an (n × 18) score matrix (NaN = missing) into 18-byte values."""
+    packed = np.nan_to_num(np.asarray(holes, dtype=float), nan=0.0)
+    packed = np.clip(packed, 0, 255).astype(np.uint8)
+    return [row.tobytes() for row in packed]
+
+
+def decode_packed_copy(data: bytes) -> tuple:
+    """Decode a binary COPY of (card_id, hole_scores) into (ids, n × 18 uint8)."""
+    if not data.startswith(COPY_SIGNATURE):
+        raise ValueError("not a binary COPY stream")
+    extension = int.from_bytes(data[15:19], "big")
+    body = memoryview(data)[19 + extension:len(data) - 2]  # drop header and -1 trailer
+    if len(body) % PACKED_ROW.itemsize:
+        raise ValueError("rows are not (card_id, 18-byte hole_scores); NULL values?")
+    rows = np.frombuffer(body, dtype=PACKED_ROW)
+    if len(rows) and not ((rows["fields"] == 2).all() and (rows["id_len"] == 4).all()
+                          and (rows["holes_len"] == HOLES).all()):
+        raise ValueError("unexpected field layout in binary COPY")
+    return rows["card_id"].astype(np.int64), rows["holes"]
+
+
+def read_hole_scores(conn, where: str = "", params: Optional[Sequence] = None) -> tuple:
+    """Return (card ids, n × 18 uint8 scores) for the cards matching  where , by id."""
+    cursor = conn.cursor()
+    try:
+        sql = "SELECT id, COALESCE(hole_scores, decode(repeat('00', 18), 'hex')) FROM player_cards"
+        if where:
+            sql += " WHERE " + (cursor.mogrify(where, params).decode() if params else where)
+        sql += " ORDER BY id"
+        buf = io.BytesIO()
+        cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT binary)", buf)
+    finally:
+        cursor.close()
+    return decode_packed_copy(buf.getvalue())
+
+
+def unpacked_matrix(scores: np.ndarray) -> np.ndarray:
+    """uint8 packed scores as the float matrix hole_matrix() returns (0 -> NaN)."""
+    holes = scores.astype(float)
+    holes[scores == 0] = np.nan
+    return holes
+
+
+SCAN_STATE_DDL = """
+CREATE TABLE IF NOT EXISTS card_scan_state (
+    scanner VARCHAR(50) PRIMARY KEY,
+    last_card_id INTEGER NOT NULL,
+    scanned_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+def get_watermark(conn, scanner: str) -> int:
+    """Return the last card id processed by  scanner  (0 if never run)."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SCAN_STATE_DDL)
+        cursor.execute("SELECT last_card_id FROM card_scan_state WHERE scanner = %s", (scanner,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    finally:
+        cursor.close()
+
+
+def set_watermark(cursor, scanner: str, last_card_id: int) -> None:
+    """Record progress; runs inside the caller's transaction."""
+    cursor.execute("""
+        INSERT INTO card_scan_state (scanner, last_card_id) VALUES (%s, %s)
+        ON CONFLICT (scanner) DO UPDATE
+        SET last_card_id = EXCLUDED.last_card_id, scanned_at = CURRENT_TIMESTAMP
+    """, (scanner, last_card_id))
+
+
+# A partitioned player_cards (bin/partition_cards.py) is only unique on
+# (id, play_date), so no foreign key can point at player_cards(id); the
+# ON DELETE CASCADE of tables keyed by card id is then done by this trigger.
+CARD_CASCADE_FUNCTION = """
+CREATE OR REPLACE FUNCTION player_cards_cascade_delete()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- a card moved to another partition is deleted and re-inserted; keep its rows
+    IF NOT EXISTS (SELECT 1 FROM player_cards WHERE id = OLD.id) THEN
+        EXECUTE format('DELETE FROM %I WHERE %I = $1', TG_ARGV[0], TG_ARGV[1]) USING OLD.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def cards_partitioned(cursor) -> bool:
+    cursor.execute("""
+        SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p
+                       JOIN pg_class c ON c.oid = p.partrelid
+                       WHERE c.relname = 'player_cards' AND pg_table_is_visible(c.oid))
+    """)
+    return cursor.fetchone()[0]
+
+
+def cascade_card_deletes(cursor, table: str, column: str = "card_id") -> None:
+    """Delete the rows of  table  whose  column  names a deleted card."""
+    trigger = f"{table}_card_cascade"
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_trigger "
+                   "WHERE tgname = %s AND tgrelid = 'player_cards'::regclass)", (trigger,))
+    if cursor.fetchone()[0]:
+        return
+    cursor.execute(CARD_CASCADE_FUNCTION)
+    cursor.execute(f"CREATE TRIGGER {trigger} AFTER DELETE ON player_cards "
+                   f"FOR EACH ROW EXECUTE FUNCTION player_cards_cascade_delete('{table}', '{column}')")
+
+
+def card_reference(cursor, table: str, column: str = "card_id") -> str:
+    """The REFERENCES clause for a column of  table  holding card ids.
+
+    Empty when player_cards is partitioned; the cascade trigger is installed
+    instead (in the caller's transaction).
+    """
+    if not cards_partitioned(cursor):
+        return "REFERENCES player_cards(id) ON DELETE CASCADE"
+    cascade_card_deletes(cursor, table, column)
+    return ""
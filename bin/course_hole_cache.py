@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Maintain the per-course hole_data cache (x_course_hole_data).
+
+The handicap_calculator view joins x_course_hole_data instead of rebuilding
+the hole JSON from x_course_holes for every scorecard.  Triggers on
+x_course_holes refresh the affected courses automatically
+(backend/db/sql/310_create_course_hole_data_cache.sql); this tool covers the
+cases the triggers do not see, e.g. the table being recreated by
+300_create_course_holes.sql or loaded with triggers disabled.
+
+Usage:
+    python3 course_hole_cache.py --refresh [--course 11 --course 12]
+    python3 course_hole_cache.py --check
+
+Requires:  psycopg2
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import List, Optional
+
+from handicap_calculator import connect_to_db
+
+STALE_QUERY = """
+WITH live AS (
+    SELECT course_id,
+           json_object_agg('hole_' || hole_number,
+                           json_build_object('par', par,
+                                             'men_si', men_stroke_index,
+                                             'women_si', women_stroke_index)
+                           ORDER BY hole_number) AS hole_data
+    FROM x_course_holes
+    GROUP BY course_id
+)
+SELECT COALESCE(live.course_id, cache.course_id) AS course_id,
+       CASE WHEN cache.course_id IS NULL THEN 'missing'
+            WHEN live.course_id IS NULL THEN 'orphaned'
+            ELSE 'stale' END AS problem
+FROM live
+FULL JOIN x_course_hole_data cache ON cache.course_id = live.course_id
+WHERE live.hole_data::jsonb IS DISTINCT FROM cache.hole_data::jsonb
+ORDER BY 1
+"""
+
+
+def refresh(course_ids: Optional[List[int]]) -> int:
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT refresh_course_hole_data(%s)", (course_ids,))
+        refreshed = cursor.fetchone()[0]
+        conn.commit()
+        cursor.close()
+        return refreshed
+    finally:
+        conn.close()
+
+
+def check() -> list:
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(STALE_QUERY)
+        problems = cursor.fetchall()
+        cursor.close()
+        return problems
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Refresh or verify the course hole_data cache")
+    parser.add_argument("--refresh", action="store_true", help="Rebuild cached rows")
+    parser.add_argument("-c", "--course", type=int, action="append",
+                        help="Only refresh this course (repeatable)")
+    parser.add_argument("--check", action="store_true", help="List stale or missing courses")
+    args = parser.parse_args()
+    if not (args.refresh or args.check):
+        parser.error("give --refresh and/or --check")
+
+    if args.refresh:
+        refreshed = refresh(args.course)
+        print(f"[OK] Refreshed hole data for {refreshed} courses")
+    if args.check:
+        problems = check()
+        for course_id, problem in problems:
+            print(f"[WARN] course {course_id}: {problem}")
+        if problems:
+            sys.exit(1)
+        print("[OK] Cache matches x_course_holes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Backfill and verify the stored score differential of player_cards.
+
+player_cards.score_differential is written by a trigger whenever a card is
+inserted or its gross / course / tee change, and rewritten for all cards of
+a tee when its rating changes (backend/db/sql/210_add_player_cards_differential.sql).
+Cards loaded before the trigger existed, or with triggers disabled, are
+filled here in id-range batches, one transaction per batch, so a large
+table is never locked in a single long UPDATE.
+
+--verify recomputes every differential from the tee ratings and reports the
+cards whose stored value differs (or is missing); the exit status is 1 when
+any are found.
+
+Usage:
+    python3 differentials.py --backfill [--batch 50000] [--all]
+    python3 differentials.py --verify [--show 20]
+
+Requires:  psycopg2
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+
+from handicap_calculator import connect_to_db
+
+BATCH_SIZE = 50_000
+
+# Same expression as the trigger
+DIFFERENTIAL_SQL = "ROUND((pc.gross - cdt.course_rating) * 113 / NULLIF(cdt.slope_rating, 0), 1)"
+
+BACKFILL_QUERY = f"""
+UPDATE player_cards pc
+SET score_differential = {DIFFERENTIAL_SQL}
+FROM x_course_data_by_tee cdt
+WHERE cdt.course_id = pc.course_id AND cdt.tee_id = pc.tee_id
+  AND pc.id >= %s AND pc.id < %s
+"""
+
+VERIFY_QUERY = f"""
+SELECT pc.id, pc.player_id, pc.course_id, pc.tee_id, pc.gross,
+       pc.score_differential AS stored, {DIFFERENTIAL_SQL} AS expected
+FROM player_cards pc
+LEFT JOIN x_course_data_by_tee cdt
+       ON cdt.course_id = pc.course_id AND cdt.tee_id = pc.tee_id
+WHERE pc.score_differential IS DISTINCT FROM {DIFFERENTIAL_SQL}
+ORDER BY pc.id
+"""
+
+
+def backfill(batch: int, everything: bool) -> int:
+    """Fill (or with  everything  rewrite) the stored differentials."""
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MIN(id), MAX(id) FROM player_cards")
+        low, high = cursor.fetchone()
+        if low is None:
+            return 0
+        query = BACKFILL_QUERY if everything else BACKFILL_QUERY + " AND pc.score_differential IS NULL"
+        updated = 0
+        start = time.perf_counter()
+        for first in range(low, high + 1, batch):
+            cursor.execute(query, (first, first + batch))
+            updated += cursor.rowcount
+            conn.commit()
+            print(f"  ids {first}..{min(first + batch, high + 1) - 1}: {updated} updated", end="\r")
+        print()
+        print(f"[OK] Backfilled {updated} cards in {time.perf_counter() - start:.1f}s")
+        cursor.close()
+        return updated
+    finally:
+        conn.close()
+
+
+def verify(show: int) -> int:
+    """Print up to  show  mismatching cards and return the mismatch count."""
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(VERIFY_QUERY)
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+
+    for card_id, player_id, course_id, tee_id, gross, stored, expected in rows[:show]:
+        print(f"[WARN] card {card_id} (player {player_id}, course {course_id}, tee {tee_id}, "
+              f"gross {gross}): stored {stored}, expected {expected}")
+    if len(rows) > show:
+        print(f"... and {len(rows) - show} more")
+    return len(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backfill or verify player_cards.score_differential")
+    parser.add_argument("--backfill", action="store_true", help="Fill missing differentials")
+    parser.add_argument("--all", action="store_true", help="With --backfill, rewrite every card")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE,
+                        help=f"Card ids per transaction (default: {BATCH_SIZE})")
+    parser.add_argument("--verify", action="store_true", help="Compare stored with recomputed values")
+    parser.add_argument("--show", type=int, default=20, help="Mismatches printed (default: 20)")
+    args = parser.parse_args()
+    if not (args.backfill or args.verify):
+        parser.error("give --backfill and/or --verify")
+
+    if args.backfill:
+        backfill(args.batch, args.all)
+    if args.verify:
+        mismatches = verify(args.show)
+        if mismatches:
+            print(f"[WARN] {mismatches} cards have a wrong or missing differential")
+            sys.exit(1)
+        print("[OK] Every stored differential matches the tee ratings")
+
+
+if __name__ == "__main__":
+    main()
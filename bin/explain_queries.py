@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN-based query benchmark and index advisor for the handicap views.
+
+Collects the queries the application actually runs:
+  • the handicap_calculator / current_handicap_indexes views
+  • the queries of handicap_calculator.py
+  • every parameterised SELECT in the backend routes (handicapCalc.ts,
+    playerCards.ts, coursesData.ts), extracted from their template strings;
+    $1 is bound to a sample player, course or card id chosen from the route
+
+Each query runs under  EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)  --repeat
+times; the report lists the median execution time and the hottest plan
+nodes by exclusive time.  With --advise every candidate index in
+CANDIDATE_INDEXES is created inside a transaction, the queries are measured
+again and the transaction is rolled back, so the database is left untouched.
+
+Point it at a seeded database (see gen_dataset.py) for meaningful numbers.
+
+Usage:
+    python3 explain_queries.py [--advise] [--repeat 3] [--top 3] [--json report.json]
+
+Requires:  psycopg2
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from handicap_calculator import (PLAYER_HANDICAP_QUERY, PLAYER_ROUNDS_QUERY, connect_to_db,
+                                 recent_rounds_cutoff)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.environ.get("ROOT_DIR", os.path.dirname(SCRIPT_DIR))
+ROUTE_FILES = ["handicapCalc.ts", "playerCards.ts", "coursesData.ts"]
+
+CANDIDATE_INDEXES = [
+    ("player_cards_ok_player_date",
+     "CREATE INDEX advisor_pc_ok_player_date ON player_cards (player_id, play_date DESC) "
+     "WHERE verified AND tarj = 'OK'"),
+    ("player_cards_ok_player_date_covering",
+     "CREATE INDEX advisor_pc_ok_player_date_cov ON player_cards (player_id, play_date DESC) "
+     "INCLUDE (course_id, tee_id, gross, score_differential) WHERE tarj = 'OK'"),
+    ("course_data_by_tee_course_tee",
+     "CREATE INDEX advisor_cdt_course_tee ON x_course_data_by_tee (course_id, tee_id)"),
+    ("player_cards_course_date",
+     "CREATE INDEX advisor_pc_course_date ON player_cards (course_id, play_date)"),
+]
+
+ROUTE_RE = re.compile(r"router\.(?:get|post|put|delete)\(\s*'([^']*)'")
+SELECT_RE = re.compile(r"`(\s*SELECT\b[^`]*)`", re.IGNORECASE)
+
+
+def route_queries(sample: Dict[str, int]) -> List[Tuple[str, str]]:
+    """Extract SELECTs from the backend routes with $n bound to sample ids."""
+    queries = []
+    routes_dir = os.path.join(ROOT_DIR, "backend", "src", "routes")
+    for name in ROUTE_FILES:
+        with open(os.path.join(routes_dir, name), "r", encoding="utf-8") as f:
+            source = f.read()
+        routes = [(m.start(), m.group(1)) for m in ROUTE_RE.finditer(source)]
+        for m in SELECT_RE.finditer(source):
+            sql = m.group(1).strip().rstrip(";")
+            if "${" in sql:
+                continue  # built dynamically
+            route = next((r for pos, r in reversed(routes) if pos < m.start()), "?")
+            param = (re.findall(r":(\w+)", route) or [""])[-1].lower()
+            if "course" in param or name == "coursesData.ts":
+                value = sample["course"]
+            elif param == "id":
+                value = sample["card"]
+            else:
+                value = sample["player"]  # :player_id, :playerId, the logged-in user
+            sql = re.sub(r"\$\d+", str(value), sql)
+            line = source.count("\n", 0, m.start()) + 1
+            queries.append((f"{name}:{line} {route}", sql))
+    return queries
+
+
+def collect_queries(cursor) -> List[Tuple[str, str]]:
+    cursor.execute("""
+        SELECT player_id, course_id, MAX(id) FROM player_cards
+        GROUP BY player_id, course_id ORDER BY COUNT(*) DESC LIMIT 1
+    """)
+    row = cursor.fetchone()
+    if row is None:
+        print("player_cards is empty; load a dataset first", file=sys.stderr)
+        sys.exit(1)
+    sample = {"player": row[0], "course": row[1], "card": row[2]}
+    print(f"Sample ids: player {sample['player']}, course {sample['course']}, card {sample['card']}")
+
+    queries = [
+        ("view handicap_calculator", "SELECT * FROM handicap_calculator"),
+        ("view current_handicap_indexes", "SELECT * FROM current_handicap_indexes"),
+        ("handicap_calculator.py player handicap",
+         cursor.mogrify(PLAYER_HANDICAP_QUERY + " WHERE player_id = %s", (sample["player"],)).decode()),
+        ("handicap_calculator.py player rounds",
+         cursor.mogrify(PLAYER_ROUNDS_QUERY, (sample["player"],
+                                              recent_rounds_cutoff(cursor, sample["player"]),
+                                              20)).decode()),
+    ]
+    return queries + route_queries(sample)
+
+
+def _walk(node: dict, hot: List[dict]) -> None:
+    loops = node.get("Actual Loops", 1) or 1
+    total = node.get("Actual Total Time", 0.0) * loops
+    children = node.get("Plans", [])
+    child_total = sum(c.get("Actual Total Time", 0.0) * (c.get("Actual Loops", 1) or 1)
+                      for c in children)
+    hot.append({
+        "node": node["Node Type"] + (f" on {node['Relation Name']}" if "Relation Name" in node else "")
+                + (f" using {node['Index Name']}" if "Index Name" in node else ""),
+        "exclusive_ms": round(max(total - child_total, 0.0), 3),
+        "rows": node.get("Actual Rows", 0) * loops,
+        "loops": loops,
+        "shared_hit": node.get("Shared Hit Blocks", 0),
+        "shared_read": node.get("Shared Read Blocks", 0),
+    })
+    for child in children:
+        _walk(child, hot)
+
+
+def explain(cursor, sql: str, repeat: int) -> dict:
+    """Median execution time over  repeat  runs plus the last run's plan."""
+    times, plan = [], None
+    for _ in range(repeat):
+        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+        plan = cursor.fetchone()[0][0]
+        times.append(plan["Execution Time"])
+    hot: List[dict] = []
+    _walk(plan["Plan"], hot)
+    hot.sort(key=lambda n: n["exclusive_ms"], reverse=True)
+    return {
+        "execution_ms": round(statistics.median(times), 3),
+        "planning_ms": round(plan["Planning Time"], 3),
+        "hot_nodes": hot,
+        "plan_text": json.dumps(plan["Plan"]),
+    }
+
+
+def measure_all(conn, queries: List[Tuple[str, str]], repeat: int) -> Dict[str, dict]:
+    """Explain every query; a failing query is reported and skipped."""
+    results: Dict[str, dict] = {}
+    cursor = conn.cursor()
+    for name, sql in queries:
+        cursor.execute("SAVEPOINT explain_query")
+        try:
+            results[name] = explain(cursor, sql, repeat)
+        except Exception as exc:  # psycopg2.Error, but keep going on anything
+            cursor.execute("ROLLBACK TO SAVEPOINT explain_query")
+            results[name] = {"error": str(exc).strip().splitlines()[0]}
+        else:
+            cursor.execute("RELEASE SAVEPOINT explain_query")
+    cursor.close()
+    return results
+
+
+def advise(conn, queries: List[Tuple[str, str]], baseline: Dict[str, dict],
+           repeat: int) -> List[dict]:
+    """Try each candidate index in a rolled-back transaction."""
+    report = []
+    for label, ddl in CANDIDATE_INDEXES:
+        index_name = ddl.split()[2]
+        cursor = conn.cursor()
+        try:
+            cursor.execute(ddl)
+            cursor.execute(f"ANALYZE {ddl.split(' ON ')[1].split()[0]}")
+            cursor.close()
+            with_index = measure_all(conn, queries, repeat)
+        finally:
+            conn.rollback()
+        for name, result in with_index.items():
+            before = baseline.get(name, {})
+            if "error" in result or "error" in before:
+                continue
+            used = index_name in result["plan_text"]
+            speedup = before["execution_ms"] / result["execution_ms"] if result["execution_ms"] else 0
+            if used or speedup >= 1.2:
+                report.append({"index": label, "ddl": ddl, "query": name, "used": used,
+                               "before_ms": before["execution_ms"],
+                               "after_ms": result["execution_ms"], "speedup": round(speedup, 2)})
+    return report
+
+
+def print_report(results: Dict[str, dict], advice: Optional[List[dict]], top: int) -> None:
+    print("\n=== Query timings (EXPLAIN ANALYZE, median) ===")
+    ranked = sorted(results.items(), key=lambda kv: kv[1].get("execution_ms", -1), reverse=True)
+    for name, result in ranked:
+        if "error" in result:
+            print(f"\n{name}\n    FAILED: {result['error']}")
+            continue
+        print(f"\n{name}\n    execution {result['execution_ms']:.3f} ms, "
+              f"planning {result['planning_ms']:.3f} ms")
+        for node in result["hot_nodes"][:top]:
+            print(f"    {node['exclusive_ms']:>10.3f} ms  {node['node']}  rows={node['rows']} "
+                  f"loops={node['loops']} hit={node['shared_hit']} read={node['shared_read']}")
+
+    if advice is None:
+        return
+    print("\n=== Candidate indexes ===")
+    if not advice:
+        print("No candidate index was used or gave a speedup.")
+    for item in sorted(advice, key=lambda a: a["speedup"], reverse=True):
+        print(f"{item['speedup']:>6.2f}x  {item['before_ms']:>10.3f} -> {item['after_ms']:>10.3f} ms  "
+              f"{'used ' if item['used'] else 'unused'}  {item['index']}  [{item['query']}]")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE the handicap queries")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per query (default: 3)")
+    parser.add_argument("--top", type=int, default=3, help="Hot nodes shown per query (default: 3)")
+    parser.add_argument("--advise", action="store_true", help="Try the candidate indexes")
+    parser.add_argument("--json", type=str, help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        queries = collect_queries(cursor)
+        cursor.close()
+        results = measure_all(conn, queries, args.repeat)
+        conn.rollback()
+        advice = advise(conn, queries, results, args.repeat) if args.advise else None
+    finally:
+        conn.close()
+
+    print_report(results, advice, args.top)
+    if args.json:
+        for result in results.values():
+            result.pop("plan_text", None)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"queries": results, "advice": advice}, f, indent=2, default=str)
+        print(f"\n[OK] Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,11 @@ For each link it:
   3. Extracts all HTML elements with class  tableBorderDisplay  (the ratings
      tables) and writes them to  <CourseID>.html  next to this script.
 
+Downloads that fail with a connection error, a timeout or a 5xx response
+are retried (ATTEMPTS in all); other HTTP errors are not.  Pages, bytes, retries and
+fetch / parse latencies are written as Prometheus textfile metrics (see
+metrics.py).
+
 Requires:  requests, beautifulsoup4
 """
 from __future__ import annotations
@@ -25,8 +30,12 @@ import time
 import requests
 from bs4 import BeautifulSoup
 
+from metrics import job_metrics
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 LINKS_FILE = os.path.join(SCRIPT_DIR, "course_links.txt")
+ATTEMPTS = 3
+RETRY_DELAY = 30  # seconds, times the attempt number
 
 
 def extract_course_id(url: str) -> str | None:
@@ -40,21 +49,47 @@ def extract_course_id(url: str) -> str | None:
     return None
 
 
-def fetch_and_save(url: str, course_id: str) -> None:
+def retryable(exc: requests.RequestException) -> bool:
+    """Connection errors, timeouts and server errors may pass on another try."""
+    if isinstance(exc, requests.HTTPError):
+        return exc.response is not None and exc.response.status_code >= 500
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+def fetch(url: str, metrics) -> requests.Response:
+    for attempt in range(1, ATTEMPTS + 1):
+        try:
+            with metrics.stage("fetch"):
+                resp = requests.get(url, timeout=20)
+                resp.raise_for_status()
+            metrics.bytes_fetched.inc(len(resp.content))
+            return resp
+        except requests.RequestException as exc:
+            if attempt == ATTEMPTS or not retryable(exc):
+                raise
+            print(f"[RETRY] {url}: {exc}", file=sys.stderr)
+            metrics.retries.inc()
+            time.sleep(RETRY_DELAY * attempt)
+
+
+def fetch_and_save(url: str, course_id: str, metrics) -> None:
     try:
-        resp = requests.get(url, timeout=20)
-        resp.raise_for_status()
+        resp = fetch(url, metrics)
     except Exception as exc:
         print(f"[ERROR] Failed to fetch {url}: {exc}", file=sys.stderr)
+        metrics.items.inc(status="error")
         return
 
-    soup = BeautifulSoup(resp.text, "html.parser")
-    tables = soup.find_all(class_="tableBorderDisplay")
+    with metrics.stage("parse"):
+        soup = BeautifulSoup(resp.text, "html.parser")
+        tables = soup.find_all(class_="tableBorderDisplay")
     if not tables:
         print(f"[WARN] No tableBorderDisplay elements found for CourseID={course_id}")
         content = resp.text  # fall back to full body just in case
+        metrics.items.inc(status="no_tables")
     else:
         content = "\n".join(str(t) for t in tables)
+        metrics.items.inc(status="ok")
 
     out_path = os.path.join(SCRIPT_DIR, f"{course_id}.html")
     with open(out_path, "w", encoding="utf-8") as f:
@@ -67,7 +102,7 @@ def main() -> None:
         print(f"Links file not found: {LINKS_FILE}", file=sys.stderr)
         sys.exit(1)
 
-    with open(LINKS_FILE, "r", encoding="utf-8") as f:
+    with open(LINKS_FILE, "r", encoding="utf-8") as f, job_metrics("g_course_get") as metrics:
         for line in f:
             url = line.strip()
             if not url:
@@ -78,8 +113,9 @@ def main() -> None:
             course_id = extract_course_id(url)
             if not course_id:
                 print(f"[SKIP] Cannot find CourseID in: {url}", file=sys.stderr)
+                metrics.items.inc(status="skipped")
                 continue
-            fetch_and_save(url, course_id)
+            fetch_and_save(url, course_id, metrics)
             # Pause between 5 and 20 seconds to be polite to the server
             pause = random.uniform(50, 150)
             print(f"[PAUSE] Sleeping {pause:.1f}s...")
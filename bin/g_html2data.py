@@ -10,6 +10,9 @@ file it:
   • writes their contents to <courseID>.csv   (one large table; multiple source
     tables are concatenated one after another with a blank row in between).
 
+Files, bytes read and parse / write latencies are written as Prometheus
+textfile metrics (see metrics.py).
+
 Dependencies:  beautifulsoup4
 """
 from __future__ import annotations
@@ -22,6 +25,8 @@ from typing import List
 
 from bs4 import BeautifulSoup
 
+from metrics import job_metrics
+
 SCRIPT_DIR = Path(__file__).resolve().parent
 LIST_FILE = SCRIPT_DIR / "html.list"
 
@@ -47,28 +52,34 @@ def write_csv(course_id: str, rows: List[List[str]]) -> None:
     print(f"[OK] {out_path.relative_to(SCRIPT_DIR)} written ({len(rows)} rows)")
 
 
-def process_file(html_path: Path) -> None:
+def process_file(html_path: Path, metrics) -> None:
     course_id = html_path.stem  # "26860.html" -> "26860"
     try:
         html_text = html_path.read_text(encoding="utf-8", errors="ignore")
     except Exception as exc:
         print(f"[ERROR] Cannot read {html_path}: {exc}", file=sys.stderr)
+        metrics.items.inc(status="error")
         return
+    metrics.bytes_fetched.inc(len(html_text.encode("utf-8")))
 
-    soup = BeautifulSoup(html_text, "html.parser")
-    tables = soup.find_all(class_="tableBorderDisplay")
-    if not tables:
-        print(f"[WARN] No tables found in {html_path.name}")
-        return
+    with metrics.stage("parse"):
+        soup = BeautifulSoup(html_text, "html.parser")
+        tables = soup.find_all(class_="tableBorderDisplay")
+        if not tables:
+            print(f"[WARN] No tables found in {html_path.name}")
+            metrics.items.inc(status="no_tables")
+            return
 
-    all_rows: List[List[str]] = []
-    for idx, t in enumerate(tables):
-        rows = extract_rows(t)
-        if idx and rows:
-            all_rows.append([])  # blank line to separate tables
-        all_rows.extend(rows)
+        all_rows: List[List[str]] = []
+        for idx, t in enumerate(tables):
+            rows = extract_rows(t)
+            if idx and rows:
+                all_rows.append([])  # blank line to separate tables
+            all_rows.extend(rows)
 
-    write_csv(course_id, all_rows)
+    with metrics.stage("write"):
+        write_csv(course_id, all_rows)
+    metrics.items.inc(status="ok")
 
 
 def main() -> None:
@@ -76,7 +87,7 @@ def main() -> None:
         print(f"List file not found: {LIST_FILE}", file=sys.stderr)
         sys.exit(1)
 
-    with LIST_FILE.open("r", encoding="utf-8") as f:
+    with LIST_FILE.open("r", encoding="utf-8") as f, job_metrics("g_html2data") as metrics:
         for line in f:
             line = line.strip()
             if not line:
@@ -84,8 +95,9 @@ def main() -> None:
             html_path = (SCRIPT_DIR / line).resolve()
             if not html_path.is_file():
                 print(f"[SKIP] Not found: {html_path}", file=sys.stderr)
+                metrics.items.inc(status="skipped")
                 continue
-            process_file(html_path)
+            process_file(html_path, metrics)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic, seeded dataset for benchmarking the handicap stack.
+
+The seed data in backend/db/csv has a few dozen cards; this produces
+realistic  users, x_course_names, x_course_holes, x_course_data_by_tee  and
+player_cards  at any scale (1k to 10M cards):
+
+  • every course gets 18 holes with pars summing to 70-72 and shuffled men /
+    women stroke indexes, plus a rating row for each tee in TEES
+  • every player has a skill level; hole scores are drawn around par plus
+    that skill and the hole's difficulty, so  gross = sum(h01..h18),
+    ida / vta are the nines and  g_differential  matches the tee rating
+  • the tee ids must already exist in x_course_tee_types (seed data)
+
+Output is generated in fixed-size chunks and streamed either straight into
+Postgres through  COPY FROM STDIN  or into Parquet files (one directory per
+table).  Every chunk draws from its own seeded generator, so the same
+--cards / --seed always produce byte-identical data.
+
+Usage:
+    python3 gen_dataset.py --cards 100000 --target postgres [--id-base 100000]
+    python3 gen_dataset.py --cards 10000000 --target parquet --out /tmp/vhs_sf
+
+Requires:  numpy, pandas, psycopg2 (postgres) or pyarrow (parquet)
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import sys
+import time
+from datetime import date
+from typing import Dict, Iterator
+
+import numpy as np
+import pandas as pd
+
+from card_data import HOLE_COLUMNS, HOLES
+
+CHUNK_CARDS = 250_000
+CARDS_PER_PLAYER = 40
+CARDS_PER_COURSE = 20_000
+MIN_COURSES = 10
+TEES = ["professional", "skilled", "senior", "regular", "beginner", "ladies"]
+# Course rating offset and slope per tee, hardest first
+TEE_RATING = {"professional": (3.5, 140), "skilled": (1.5, 130), "senior": (-1.0, 120),
+              "regular": (0.0, 125), "beginner": (-2.5, 113), "ladies": (0.5, 122)}
+FIRST_DATE = date(2015, 1, 1)
+DAYS = 365 * 10
+FIRST_NAMES = ["Juan", "Maria", "Carlos", "Ana", "Jorge", "Lucia", "Pedro", "Sofia", "Diego", "Laura"]
+FAMILY_NAMES = ["Garcia", "Rodriguez", "Gonzalez", "Fernandez", "Lopez", "Martinez", "Perez", "Gomez"]
+# Placeholder password hash: synthetic users cannot log in
+NO_LOGIN = "!synthetic"
+
+TABLE_ORDER = ["users", "x_course_names", "x_course_holes", "x_course_data_by_tee", "player_cards"]
+
+
+class Scale:
+    """Row counts and id ranges derived from the number of cards."""
+
+    def __init__(self, cards: int, id_base: int) -> None:
+        self.cards = cards
+        self.players = max(1, cards // CARDS_PER_PLAYER)
+        self.courses = max(MIN_COURSES, cards // CARDS_PER_COURSE)
+        self.id_base = id_base
+
+
+def _rng(seed: int, table: str, chunk: int = 0) -> np.random.Generator:
+    return np.random.default_rng([seed, TABLE_ORDER.index(table), chunk])
+
+
+def users(scale: Scale, seed: int) -> pd.DataFrame:
+    rng = _rng(seed, "users")
+    n = scale.players
+    ids = scale.id_base + np.arange(n)
+    gender = np.where(rng.random(n) < 0.3, "F", "M")
+    birthday = pd.to_datetime(FIRST_DATE) - pd.to_timedelta(rng.integers(18 * 365, 80 * 365, n), unit="D")
+    return pd.DataFrame({
+        "id": ids,
+        "username": [f"synth{i}" for i in ids],
+        "email": [f"synth{i}@example.com" for i in ids],
+        "password": NO_LOGIN,
+        "first_name": np.array(FIRST_NAMES)[rng.integers(0, len(FIRST_NAMES), n)],
+        "family_name": np.array(FAMILY_NAMES)[rng.integers(0, len(FAMILY_NAMES), n)],
+        "gender": gender,
+        "birthday": birthday.date,
+        "category": "Unica",
+        "handicap": np.round(rng.gamma(4.0, 4.5, n).clip(0, 54), 1),
+    })
+
+
+def courses(scale: Scale, seed: int) -> Dict[str, pd.DataFrame]:
+    """Course names, holes and per-tee ratings."""
+    rng = _rng(seed, "x_course_names")
+    n = scale.courses
+    course_ids = scale.id_base + np.arange(n)
+    names = pd.DataFrame({
+        "id": course_ids,
+        "course_id": course_ids,
+        "course_name": [f"SYNTHETIC GOLF CLUB {i}" for i in course_ids],
+        "city": "BUENOS AIRES",
+        "province": "AR-B",
+        "country_code": "AR",
+    })
+
+    # 4 par-3s, 4 par-5s, the rest par-4 (par 72), one or two par-5s demoted
+    pars = np.tile(np.array([3] * 4 + [5] * 4 + [4] * 10), (n, 1))
+    pars = rng.permuted(pars, axis=1)
+    for row, demote in enumerate(rng.integers(0, 3, n)):
+        fives = np.flatnonzero(pars[row] == 5)[:demote]
+        pars[row, fives] = 4
+    men_si = np.argsort(rng.random((n, HOLES)), axis=1) + 1
+    women_si = np.argsort(rng.random((n, HOLES)), axis=1) + 1
+    holes = pd.DataFrame({
+        "id": scale.id_base * HOLES + np.arange(n * HOLES),
+        "course_id": np.repeat(course_ids, HOLES),
+        "hole_number": np.tile(np.arange(1, HOLES + 1), n),
+        "par": pars.ravel(),
+        "men_stroke_index": men_si.ravel(),
+        "women_stroke_index": women_si.ravel(),
+    })
+
+    course_par = pars.sum(axis=1)
+    base = rng.normal(0, 1.5, n)
+    rows = []
+    for t, tee in enumerate(TEES):
+        offset, slope = TEE_RATING[tee]
+        rating = np.round(course_par + offset + base, 1)
+        slopes = np.clip(np.rint(slope + base * 4 + rng.normal(0, 3, n)), 55, 155).astype(int)
+        rows.append(pd.DataFrame({
+            "id": scale.id_base * len(TEES) + np.arange(n) * len(TEES) + t,
+            "course_id": course_ids,
+            "tee_id": tee,
+            "par": course_par,
+            "length": (6000 + (offset * 250) + rng.normal(0, 200, n)).astype(int),
+            "slope_rating": slopes,
+            "slope_back": slopes,
+            "slope_front": slopes,
+            "bogey_rating": np.round(rating + slopes / 5.381, 1),
+            "bogey_rating_back": np.round((rating + slopes / 5.381) / 2, 1),
+            "bogey_rating_front": np.round((rating + slopes / 5.381) / 2, 1),
+            "course_rating": rating,
+            "course_rating_back": np.round(rating / 2, 1),
+            "course_rating_front": np.round(rating / 2, 1),
+        }))
+    by_tee = pd.concat(rows, ignore_index=True).sort_values("id", ignore_index=True)
+    return {"x_course_names": names, "x_course_holes": holes, "x_course_data_by_tee": by_tee}
+
+
+def player_cards(scale: Scale, seed: int, players: pd.DataFrame,
+                 course_tables: Dict[str, pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    """Yield the cards in chunks of CHUNK_CARDS rows."""
+    skill = players["handicap"].to_numpy() / HOLES
+    is_female = (players["gender"] == "F").to_numpy()
+    pars = course_tables["x_course_holes"]["par"].to_numpy().reshape(-1, HOLES)
+    si = course_tables["x_course_holes"]["men_stroke_index"].to_numpy().reshape(-1, HOLES)
+    # harder holes (low stroke index) play up to half a stroke tougher
+    difficulty = (HOLES - si) / (HOLES - 1) * 0.5 - 0.25
+    by_tee = course_tables["x_course_data_by_tee"]
+    rating = by_tee["course_rating"].to_numpy(dtype=float).reshape(-1, len(TEES))
+    slope = by_tee["slope_rating"].to_numpy(dtype=float).reshape(-1, len(TEES))
+
+    for chunk, start in enumerate(range(0, scale.cards, CHUNK_CARDS)):
+        n = min(CHUNK_CARDS, scale.cards - start)
+        rng = _rng(seed, "player_cards", chunk)
+        player = rng.integers(0, scale.players, n)
+        course = rng.integers(0, scale.courses, n)
+        tee = np.where(is_female[player], TEES.index("ladies"),
+                       rng.choice([1, 2, 3], n, p=[0.3, 0.2, 0.5]))
+
+        mean = skill[player, None] + difficulty[course]
+        holes = pars[course] + np.rint(rng.normal(mean, 1.0)).astype(int)
+        holes = np.clip(holes, 1, pars[course] + 6)
+        gross = holes.sum(axis=1)
+        cr, sr = rating[course, tee], slope[course, tee]
+        hcp = np.rint(players["handicap"].to_numpy()[player] * sr / 113 + (cr - pars[course].sum(axis=1)))
+        play_date = pd.to_datetime(FIRST_DATE) + pd.to_timedelta(rng.integers(0, DAYS, n), unit="D")
+
+        cards = pd.DataFrame({
+            "id": scale.id_base + start + np.arange(n),
+            "player_id": players["id"].to_numpy()[player],
+            "play_date": play_date.date,
+            "course_id": course_tables["x_course_names"]["course_id"].to_numpy()[course],
+            "week_day": play_date.dayofweek + 1,
+            "category": "Unica",
+            "g_differential": np.round((gross - cr) * 113 / sr, 1),
+            "hcpi": players["handicap"].to_numpy()[player],
+            "hcp": hcp.astype(int),
+            "ida": holes[:, :9].sum(axis=1),
+            "vta": holes[:, 9:].sum(axis=1),
+            "gross": gross,
+            "adj_gross": gross,
+            "net": gross - hcp.astype(int),
+            "tarj": "OK",
+            "tee_id": np.array(TEES)[tee],
+        })
+        for h, column in enumerate(HOLE_COLUMNS):
+            cards[column] = holes[:, h]
+        cards["verified"] = rng.random(n) < 0.95
+        cards["created_at"] = play_date
+        yield cards
+
+
+def generate(scale: Scale, seed: int) -> Iterator[tuple]:
+    """Yield (table, DataFrame) pairs in foreign-key order."""
+    players = users(scale, seed)
+    yield "users", players
+    course_tables = courses(scale, seed)
+    for table in TABLE_ORDER[1:4]:
+        yield table, course_tables[table]
+    for chunk in player_cards(scale, seed, players, course_tables):
+        yield "player_cards", chunk
+
+
+def write_postgres(scale: Scale, seed: int) -> None:
+    from handicap_calculator import connect_to_db
+
+    conn = connect_to_db()
+    cursor = conn.cursor()
+    counts: Dict[str, int] = {}
+    try:
+        for table, df in generate(scale, seed):
+            buf = io.StringIO()
+            df.to_csv(buf, index=False, header=False)
+            buf.seek(0)
+            cursor.copy_expert(
+                f"COPY {table} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+            counts[table] = counts.get(table, 0) + len(df)
+            print(f"[OK] {table}: {counts[table]} rows")
+        for table in TABLE_ORDER:
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                           f"(SELECT MAX(id) FROM {table}))")
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def write_parquet(scale: Scale, seed: int, out_dir: str) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parts: Dict[str, int] = {}
+    for table, df in generate(scale, seed):
+        table_dir = os.path.join(out_dir, table)
+        os.makedirs(table_dir, exist_ok=True)
+        part = parts.get(table, 0)
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False),
+                       os.path.join(table_dir, f"part-{part:05d}.parquet"))
+        parts[table] = part + 1
+        print(f"[OK] {table}/part-{part:05d}.parquet ({len(df)} rows)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a seeded synthetic dataset")
+    parser.add_argument("--cards", type=int, required=True, help="Number of player cards (1k-10M)")
+    parser.add_argument("--target", choices=["postgres", "parquet"], default="postgres")
+    parser.add_argument("--out", type=str, help="Output directory for --target parquet")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument("--id-base", type=int, default=100_000,
+                        help="First id of generated rows, above the seed data (default: 100000)")
+    args = parser.parse_args()
+
+    if args.cards < 1:
+        parser.error("--cards must be positive")
+    if args.target == "parquet" and not args.out:
+        parser.error("--out is required for --target parquet")
+
+    scale = Scale(args.cards, args.id_base)
+    print(f"Generating {scale.cards} cards, {scale.players} players, {scale.courses} courses "
+          f"(seed {args.seed})")
+    start = time.perf_counter()
+    if args.target == "postgres":
+        write_postgres(scale, args.seed)
+    else:
+        write_parquet(scale, args.seed, args.out)
+    print(f"Done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,31 @@
 Handicap Calculator
 This script calculates golf handicaps using the World Handicap System
 based on data from the handicap_calculator view in PostgreSQL.
+
+pandas and tabulate are only imported by the functions that build or print
+tables, so  --index  (one player's index, standard library and psycopg2
+only) starts quickly; bench_startup.py checks that it stays that way.
+
+--format csv|jsonl|arrow writes the index list (or with --history every
+rated round) to stdout as it is read from a server-side cursor, so whole-club
+exports start at once, run in constant memory and can be piped.
+
+--profile [text|json] (with --cprofile FILE / --tracemalloc) breaks the run
+down into connect, query, fetch, dataframe, calculate and render phases; see
+profiling.py.  With --metrics, or when $VHS_METRICS_DIR is set, the same
+phases are also recorded as Prometheus textfile metrics (metrics.py).
 """
 
 import os
 import sys
+import csv
+import json
 import psycopg2
-import pandas as pd
-from tabulate import tabulate
-from datetime import datetime
+from contextlib import nullcontext
+from decimal import Decimal
+from datetime import date, datetime
+from metrics import job_metrics
+from profiling import add_profile_arguments, instrument, phase, profile_run, profiler
 
 # Database connection parameters
 DB_PARAMS = {
@@ -21,30 +38,96 @@ DB_PARAMS = {
     'port': '5432'
 }
 
+PLAYER_HANDICAP_QUERY = "SELECT player_id, player_name, handicap_index, total_rounds, last_play_date FROM current_handicap_indexes"
+
+# Same columns as the handicap_calculator view, but reading player_cards
+# directly with a constant lower play_date bound (see recent_rounds_cutoff) so
+# a year-partitioned player_cards only scans the partitions that hold the
+# player's recent rounds; the view's window function would scan them all.
+PLAYER_ROUNDS_QUERY = """
+    SELECT pc.id AS card_id, pc.play_date, cn.course_name, tt.tee_name, pc.gross, cdt.par,
+           cdt.course_rating, cdt.slope_rating, pc.score_differential AS calculated_differential,
+           ROW_NUMBER() OVER (ORDER BY pc.play_date DESC) AS recency_rank
+    FROM player_cards pc
+    JOIN x_course_names cn ON pc.course_id = cn.course_id
+    JOIN x_course_tee_types tt ON pc.tee_id = tt.tee_id
+    JOIN x_course_data_by_tee cdt ON pc.course_id = cdt.course_id AND pc.tee_id = cdt.tee_id
+    WHERE pc.player_id = %s AND pc.verified = true AND pc.tarj = 'OK'
+      AND pc.play_date >= %s
+    ORDER BY pc.play_date DESC
+    LIMIT %s
+    """
+
+# Date of the player's n-th most recent rated round on or after a date
+RECENT_CUTOFF_QUERY = """
+    SELECT play_date FROM player_cards
+    WHERE player_id = %s AND verified = true AND tarj = 'OK'
+      AND score_differential IS NOT NULL AND play_date >= %s
+    ORDER BY play_date DESC
+    OFFSET %s LIMIT 1
+    """
+
+# Every rated round, for --history exports
+HISTORY_QUERY = """
+    SELECT pc.player_id, u.username AS player_name, pc.id AS card_id, pc.play_date,
+           cn.course_name, tt.tee_name, pc.gross, pc.score_differential AS differential
+    FROM player_cards pc
+    JOIN users u ON pc.player_id = u.id
+    JOIN x_course_names cn ON pc.course_id = cn.course_id
+    JOIN x_course_tee_types tt ON pc.tee_id = tt.tee_id
+    WHERE pc.verified = true AND pc.tarj = 'OK'
+    """
+
+# Rows fetched from the server-side cursor per round trip when streaming
+STREAM_BATCH = 5000
+
+# Postgres type OIDs -> pyarrow type names for --format arrow (others are strings)
+ARROW_TYPES = {16: 'bool_', 20: 'int64', 21: 'int16', 23: 'int32', 700: 'float32',
+               701: 'float64', 1700: 'float64', 1082: 'date32', 1114: 'timestamp'}
+
+def import_pandas():
+    """pandas, imported on first use (it dominates the CLI's start-up time)."""
+    with phase('import pandas'):
+        import pandas as pd
+    return pd
+
+def import_tabulate():
+    with phase('import tabulate'):
+        from tabulate import tabulate
+    return tabulate
+
 def connect_to_db():
     """Connect to the PostgreSQL database."""
     try:
-        conn = psycopg2.connect(**DB_PARAMS)
+        with phase('connect'):
+            conn = psycopg2.connect(**DB_PARAMS)
+        if profiler.active:
+            instrument(conn)
         return conn
     except psycopg2.Error as e:
         print(f"Error connecting to the database: {e}")
         sys.exit(1)
 
+def player_condition(player_id=None, player_name=None,
+                     id_column='player_id', name_column='player_name'):
+    """SQL condition and params selecting a player by id or (partial) name."""
+    if player_id:
+        return f"{id_column} = %s", [player_id]
+    if player_name:
+        return f"LOWER({name_column}) LIKE LOWER(%s)", [f"%{player_name}%"]
+    return None, []
+
 def get_player_handicap(player_id=None, player_name=None):
     """Get the pre-calculated handicap for a specific player or all players."""
+    pd = import_pandas()
+    
     conn = connect_to_db()
     cursor = conn.cursor()
     
-    query = "SELECT player_id, player_name, handicap_index, total_rounds, last_play_date FROM current_handicap_indexes"
-    params = []
-    
-    if player_id:
-        query += " WHERE player_id = %s"
-        params.append(player_id)
-    elif player_name:
-        query += " WHERE LOWER(player_name) LIKE LOWER(%s)"
-        params.append(f"%{player_name}%")
-    
+    query = PLAYER_HANDICAP_QUERY
+    condition, params = player_condition(player_id, player_name)
+    if condition:
+        query += f" WHERE {condition}"
     query += " ORDER BY handicap_index"
     
     try:
@@ -56,7 +139,8 @@ def get_player_handicap(player_id=None, player_name=None):
             return None
         
         # Convert to pandas DataFrame for easier manipulation
-        df = pd.DataFrame(results, columns=['Player ID', 'Player Name', 'Handicap Index', 'Rounds Used', 'Last Play Date'])
+        with phase('dataframe'):
+            df = pd.DataFrame(results, columns=['Player ID', 'Player Name', 'Handicap Index', 'Rounds Used', 'Last Play Date'])
         return df
     
     except psycopg2.Error as e:
@@ -66,21 +150,37 @@ def get_player_handicap(player_id=None, player_name=None):
         cursor.close()
         conn.close()
 
+def recent_rounds_cutoff(cursor, player_id, limit=20):
+    """Earliest play_date needed for the player's last  limit  rounds.
+    
+    Widens the search one calendar year at a time from the latest round, so
+    each query only touches the year partitions it needs.
+    """
+    cursor.execute("SELECT MIN(play_date), MAX(play_date) FROM player_cards WHERE player_id = %s",
+                   (player_id,))
+    first, last = cursor.fetchone()
+    if last is None:
+        return None
+    for year in range(last.year, first.year - 1, -1):
+        cursor.execute(RECENT_CUTOFF_QUERY, (player_id, date(year, 1, 1), limit - 1))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+    return first
+
 def get_player_rounds(player_id, limit=20):
     """Get the most recent rounds for a player."""
+    pd = import_pandas()
+    
     conn = connect_to_db()
     cursor = conn.cursor()
     
-    query = """
-    SELECT card_id, play_date, course_name, tee_name, gross, par, 
-           course_rating, slope_rating, calculated_differential, recency_rank
-    FROM handicap_calculator
-    WHERE player_id = %s AND recency_rank <= %s
-    ORDER BY play_date DESC
-    """
-    
     try:
-        cursor.execute(query, (player_id, limit))
+        cutoff = recent_rounds_cutoff(cursor, player_id, limit)
+        if cutoff is None:
+            print(f"No round data found for player ID {player_id}")
+            return None
+        cursor.execute(PLAYER_ROUNDS_QUERY, (player_id, cutoff, limit))
         results = cursor.fetchall()
         
         if not results:
@@ -88,10 +188,11 @@ def get_player_rounds(player_id, limit=20):
             return None
         
         # Convert to pandas DataFrame
-        df = pd.DataFrame(results, columns=[
-            'Card ID', 'Date', 'Course', 'Tee', 'Gross Score', 'Par', 
-            'Course Rating', 'Slope Rating', 'Differential', 'Recency'
-        ])
+        with phase('dataframe'):
+            df = pd.DataFrame(results, columns=[
+                'Card ID', 'Date', 'Course', 'Tee', 'Gross Score', 'Par', 
+                'Course Rating', 'Slope Rating', 'Differential', 'Recency'
+            ])
         return df
     
     except psycopg2.Error as e:
@@ -101,65 +202,95 @@ def get_player_rounds(player_id, limit=20):
         cursor.close()
         conn.close()
 
+def differentials_to_use(total_rounds):
+    """Number of best differentials that count for  total_rounds  recent rounds."""
+    if total_rounds >= 16:
+        return 8
+    elif total_rounds >= 14:
+        return 6
+    elif total_rounds >= 12:
+        return 5
+    elif total_rounds >= 9:
+        return 4
+    elif total_rounds >= 7:
+        return 3
+    elif total_rounds >= 6:
+        return 2
+    elif total_rounds >= 5:
+        return 1
+    return 0
+
+def index_from_differentials(differentials):
+    """Handicap index from a player's recent differentials (None if too few)."""
+    to_use = differentials_to_use(len(differentials))
+    if to_use == 0:
+        return None
+    best = sorted(float(d) for d in differentials)[:to_use]
+    return round(sum(best) / to_use * 0.96, 1)
+
+def get_handicap_index(player_id, limit=20):
+    """Handicap index of one player without pandas (None if too few rounds).
+    
+    Same rounds and rules as calculate_handicap, for callers that only need
+    the number.
+    """
+    conn = connect_to_db()
+    cursor = conn.cursor()
+    
+    try:
+        cutoff = recent_rounds_cutoff(cursor, player_id, limit)
+        if cutoff is None:
+            return None
+        cursor.execute(PLAYER_ROUNDS_QUERY, (player_id, cutoff, limit))
+        differentials = [row[8] for row in cursor.fetchall() if row[8] is not None]
+        return index_from_differentials(differentials)
+    finally:
+        cursor.close()
+        conn.close()
+
 def calculate_handicap(player_id):
     """Calculate handicap manually and show the calculation process."""
     rounds_df = get_player_rounds(player_id)
     if rounds_df is None or len(rounds_df) == 0:
         return None
     
-    # Use the correctly calculated differential, not the stored one
-    # Re-calculate it to be sure
-    rounds_df['Recalculated_Diff'] = (rounds_df['Gross Score'] - rounds_df['Course Rating']) * 113 / rounds_df['Slope Rating']
+    with phase('calculate'):
+        # The differential is stored on the card when it is written
+        # (player_cards.score_differential); rounds without tee ratings have none
+        rounds_df['Differential'] = rounds_df['Differential'].astype(float)
+        rounds_df = rounds_df.dropna(subset=['Differential'])
     
-    # Sort by recalculated differential
-    rounds_df = rounds_df.sort_values('Recalculated_Diff')
+        # Sort by differential
+        rounds_df = rounds_df.sort_values('Differential')
     
-    # Determine how many differentials to use based on available rounds
-    total_rounds = len(rounds_df)
-    differentials_to_use = 0
+        # Determine how many differentials to use based on available rounds
+        total_rounds = len(rounds_df)
+        to_use = differentials_to_use(total_rounds)
     
-    if total_rounds >= 20:
-        differentials_to_use = 8
-    elif total_rounds >= 16:
-        differentials_to_use = 8
-    elif total_rounds >= 14:
-        differentials_to_use = 6
-    elif total_rounds >= 12:
-        differentials_to_use = 5
-    elif total_rounds >= 9:
-        differentials_to_use = 4
-    elif total_rounds >= 7:
-        differentials_to_use = 3
-    elif total_rounds >= 6:
-        differentials_to_use = 2
-    elif total_rounds >= 5:
-        differentials_to_use = 1
+        # Get best differentials
+        best_rounds = rounds_df.iloc[:to_use]
     
-    # Get best differentials
-    best_rounds = rounds_df.iloc[:differentials_to_use]
+        # Calculate handicap from the best differentials
+        handicap_index = index_from_differentials(rounds_df['Differential'].tolist())
     
-    # Calculate handicap with corrected values
-    if differentials_to_use > 0:
-        avg_differential = best_rounds['Recalculated_Diff'].mean()
-        handicap_index = round(avg_differential * 0.96, 1)
-    else:
-        handicap_index = None
+        # Add a 'Used for Handicap' column to show which rounds were used
+        rounds_df['Used for Handicap'] = False
+        if len(best_rounds) > 0:
+            rounds_df.loc[best_rounds.index, 'Used for Handicap'] = True
     
-    # Add a 'Used for Handicap' column to show which rounds were used
-    rounds_df['Used for Handicap'] = False
-    if len(best_rounds) > 0:
-        rounds_df.loc[best_rounds.index, 'Used for Handicap'] = True
     
     return {
         'rounds': rounds_df,
         'best_rounds': best_rounds,
         'total_rounds': total_rounds,
-        'differentials_to_use': differentials_to_use,
+        'differentials_to_use': to_use,
         'handicap_index': handicap_index
     }
 
 def get_manual_handicap(player_id):
     """Calculate handicap directly without relying on the database view's calculations."""
+    pd = import_pandas()
+    
     handicap_details = calculate_handicap(player_id)
     if not handicap_details or handicap_details['handicap_index'] is None:
         return None
@@ -171,18 +302,113 @@ def get_manual_handicap(player_id):
         return None
     
     # Create a new dataframe with correct handicap
-    corrected_data = pd.DataFrame({
-        'Player ID': [player_id],
-        'Player Name': [basic_data['Player Name'].iloc[0]],
-        'Handicap Index': [handicap_details['handicap_index']],
-        'Rounds Used': [handicap_details['total_rounds']],
-        'Last Play Date': [basic_data['Last Play Date'].iloc[0]]
-    })
+    with phase('dataframe'):
+        corrected_data = pd.DataFrame({
+            'Player ID': [player_id],
+            'Player Name': [basic_data['Player Name'].iloc[0]],
+            'Handicap Index': [handicap_details['handicap_index']],
+            'Rounds Used': [handicap_details['total_rounds']],
+            'Last Play Date': [basic_data['Last Play Date'].iloc[0]]
+        })
     
     return corrected_data
 
+def stream_rows(query, params=(), batch=STREAM_BATCH):
+    """Run a query on a server-side cursor.
+    
+    Yields the cursor description first, then lists of at most  batch  rows,
+    so only one batch is held in memory at a time.
+    """
+    conn = connect_to_db()
+    cursor = conn.cursor(name='handicap_export')
+    cursor.itersize = batch
+    
+    try:
+        cursor.execute(query, params)
+        rows = cursor.fetchmany(batch)
+        yield cursor.description
+        while rows:
+            yield rows
+            rows = cursor.fetchmany(batch)
+    finally:
+        cursor.close()
+        conn.close()
+
+def json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def write_rows(batches, fmt, out=sys.stdout):
+    """Write the output of stream_rows as csv, jsonl or an Arrow IPC stream."""
+    description = next(batches)
+    names = [column.name for column in description]
+    
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(names)
+        for rows in batches:
+            with phase('render'):
+                writer.writerows(rows)
+                out.flush()
+    elif fmt == 'jsonl':
+        for rows in batches:
+            with phase('render'):
+                out.write(''.join(json.dumps(dict(zip(names, row)), default=json_value) + '\n'
+                                  for row in rows))
+                out.flush()
+    elif fmt == 'arrow':
+        import pyarrow as pa
+        
+        types = [ARROW_TYPES.get(column.type_code, 'string') for column in description]
+        schema = pa.schema([(name, pa.timestamp('us') if kind == 'timestamp' else getattr(pa, kind)())
+                            for name, kind in zip(names, types)])
+        with pa.ipc.new_stream(out.buffer, schema) as writer:
+            for rows in batches:
+                with phase('render'):
+                    columns = []
+                    for i, field in enumerate(schema):
+                        values = [row[i] for row in rows]
+                        if pa.types.is_floating(field.type):
+                            values = [None if v is None else float(v) for v in values]
+                        elif pa.types.is_string(field.type):
+                            values = [None if v is None else str(v) for v in values]
+                        columns.append(pa.array(values, type=field.type))
+                    writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+                    out.buffer.flush()
+    else:
+        raise ValueError(f"unknown format: {fmt}")
+
+def export(player_id=None, player_name=None, history=False, fmt='csv'):
+    """Stream the handicap list, or every rated round with history, to stdout."""
+    if history:
+        condition, params = player_condition(player_id, player_name, 'pc.player_id', 'u.username')
+        query = HISTORY_QUERY + (f" AND {condition}" if condition else "")
+        query += " ORDER BY pc.player_id, pc.play_date DESC"
+    else:
+        condition, params = player_condition(player_id, player_name)
+        query = PLAYER_HANDICAP_QUERY + (f" WHERE {condition}" if condition else "")
+        query += " ORDER BY handicap_index"
+    
+    batches = stream_rows(query, params)
+    if fmt != 'psql':
+        write_rows(batches, fmt)
+        return
+    
+    # For people: formatted as one table, so the rows are collected first
+    tabulate = import_tabulate()
+    
+    names = [column.name for column in next(batches)]
+    rows = [row for rows in batches for row in rows]
+    with phase('render'):
+        print(tabulate(rows, headers=names, tablefmt='psql'))
+
 def display_player_handicap(player_id=None, player_name=None, verbose=False):
     """Display handicap information for a player."""
+    tabulate = import_tabulate()
+    
     if player_id:
         # Use manual calculation for specific player
         handicap_df = get_manual_handicap(player_id)
@@ -194,7 +420,8 @@ def display_player_handicap(player_id=None, player_name=None, verbose=False):
         return
     
     print("\n=== Player Handicap Summary ===")
-    print(tabulate(handicap_df, headers='keys', tablefmt='psql'))
+    with phase('render'):
+        print(tabulate(handicap_df, headers='keys', tablefmt='psql'))
     
     # If verbose mode and specific player, show calculation details
     if verbose and player_id:
@@ -207,12 +434,14 @@ def display_player_handicap(player_id=None, player_name=None, verbose=False):
             print(f"Calculated Handicap Index: {handicap_details['handicap_index']}")
             
             print("\n=== Rounds Used for Handicap Calculation ===")
-            best_rounds = handicap_details['best_rounds'][['Date', 'Course', 'Gross Score', 'Course Rating', 'Slope Rating', 'Recalculated_Diff']]
-            print(tabulate(best_rounds, headers='keys', tablefmt='psql'))
+            best_rounds = handicap_details['best_rounds'][['Date', 'Course', 'Gross Score', 'Course Rating', 'Slope Rating', 'Differential']]
+            with phase('render'):
+                print(tabulate(best_rounds, headers='keys', tablefmt='psql'))
             
             print("\n=== All Recent Rounds ===")
-            all_rounds = handicap_details['rounds'][['Date', 'Course', 'Gross Score', 'Recalculated_Diff', 'Used for Handicap']]
-            print(tabulate(all_rounds, headers='keys', tablefmt='psql'))
+            all_rounds = handicap_details['rounds'][['Date', 'Course', 'Gross Score', 'Differential', 'Used for Handicap']]
+            with phase('render'):
+                print(tabulate(all_rounds, headers='keys', tablefmt='psql'))
 
 def main():
     """Main function to parse arguments and display handicap information."""
@@ -225,20 +454,59 @@ def main():
     player_group.add_argument('-n', '--name', type=str, help='Player name (partial match)')
     
     parser.add_argument('-v', '--verbose', action='store_true', help='Show detailed calculation')
+    parser.add_argument('--index', action='store_true',
+                        help='With --id, only print the handicap index (fast, no tables)')
+    parser.add_argument('-f', '--format', choices=['psql', 'csv', 'jsonl', 'arrow'], default='psql',
+                        help='Output format; csv, jsonl and arrow stream the index list (default: psql)')
+    parser.add_argument('--history', action='store_true',
+                        help='List every rated round instead of the index (all players unless -i/-n)')
+    parser.add_argument('--metrics', action='store_true',
+                        help='Write Prometheus textfile metrics (also when $VHS_METRICS_DIR is set)')
+    add_profile_arguments(parser)
     
     args = parser.parse_args()
     
-    # OVERRIDE DATABASE CALCULATION
-    if args.id:
-        # Calculate manually and show corrected result
-        handicap_details = calculate_handicap(args.id)
-        if handicap_details:
-            print("\n=== CORRECTED Handicap Calculation ===")
-            print(f"Player ID: {args.id}")
-            print(f"Corrected Handicap Index: {handicap_details['handicap_index']}")
+    mode = 'export' if args.format != 'psql' or args.history else 'index' if args.index else 'report'
+    # off by default: the observer would time every phase and query of every run
+    collect = args.metrics or 'VHS_METRICS_DIR' in os.environ
+    with (job_metrics('handicap_calculator') if collect else nullcontext()) as metrics, \
+            profile_run(args):
+        if metrics:
+            # phases as stages, with the SQL of "query: ..." phases left out
+            profiler.observers.append(
+                lambda name, seconds: metrics.stage_seconds.observe(seconds, stage=name.split(':')[0]))
+            metrics.items.inc(status=mode)
+        
+        if args.format != 'psql' or args.history:
+            if args.index or args.verbose:
+                parser.error('--format/--history cannot be combined with --index or --verbose')
+            try:
+                export(args.id, args.name, args.history, args.format)
+            except BrokenPipeError:
+                # the reader (e.g. head) went away; don't complain while exiting
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+                sys.exit(1)
+            # machine-readable output ends here, without the debug dump below main()
+            sys.exit(0)
+    
+        if args.index:
+            if not args.id or args.verbose:
+                parser.error('--index needs --id and no --verbose')
+            handicap_index = get_handicap_index(args.id)
+            print('' if handicap_index is None else handicap_index)
+            sys.exit(0 if handicap_index is not None else 1)
+    
+        # OVERRIDE DATABASE CALCULATION
+        if args.id:
+            # Calculate manually and show corrected result
+            handicap_details = calculate_handicap(args.id)
+            if handicap_details:
+                print("\n=== CORRECTED Handicap Calculation ===")
+                print(f"Player ID: {args.id}")
+                print(f"Corrected Handicap Index: {handicap_details['handicap_index']}")
     
-    # Show original (incorrect) calculation for comparison
-    display_player_handicap(args.id, args.name, args.verbose)
+        # Show original (incorrect) calculation for comparison
+        display_player_handicap(args.id, args.name, args.verbose)
 
 def debug_handicap_calculation(player_id):
     conn = connect_to_db()
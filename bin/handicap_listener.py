@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Invalidate cached handicaps on database notifications.
+
+Listens on the channels raised by backend/db/sql/230_add_handicap_notify.sql:
+
+  handicap_player  <player_id>          evict that player
+  handicap_tee     <course_id>:<tee_id> evict every player with a card on
+                                        that tee (idx_player_cards_course_tee)
+
+With recompute=True, evicted players that were cached are computed again in
+the background so the next request is a hit.  If the listening connection is
+lost, notifications may have been missed, so the whole cache is cleared
+before listening again.
+
+Used by handicap_service.py --listen; run on its own it prints what it would
+evict:
+
+    python3 handicap_listener.py
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+
+import asyncpg
+
+PLAYER_CHANNEL = "handicap_player"
+TEE_CHANNEL = "handicap_tee"
+
+# Index-only scan of idx_player_cards_course_tee (course_id, tee_id, player_id)
+TEE_PLAYERS_QUERY = """
+    SELECT DISTINCT player_id FROM player_cards
+    WHERE course_id = $1 AND tee_id = $2
+    """
+
+RECONNECT_DELAY = 5.0
+MAX_RECOMPUTE = 4
+
+log = logging.getLogger("handicap_listener")
+
+
+class HandicapListener:
+    """Evict entries of a cache when their cards or tee ratings change.
+
+    cache needs evict/clear (and fetch for recompute), as in
+    handicap_service.HandicapCache; compute(player_id) is the coroutine
+    function used to refill it.
+    """
+
+    def __init__(self, pool, cache, compute=None, recompute: bool = False,
+                 connect_kwargs: dict | None = None):
+        self.pool = pool
+        self.cache = cache
+        self.compute = compute
+        self.recompute = recompute and compute is not None
+        self.connect_kwargs = connect_kwargs or {}
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.lost = asyncio.Event()
+        self.tasks: list[asyncio.Task] = []
+        self.refills: set[asyncio.Task] = set()
+        self.limit = asyncio.Semaphore(MAX_RECOMPUTE)
+        self.evicted = 0
+
+    async def start(self) -> None:
+        self.tasks = [asyncio.create_task(self.listen()),
+                      asyncio.create_task(self.process())]
+
+    async def stop(self) -> None:
+        for task in self.tasks + list(self.refills):
+            task.cancel()
+        await asyncio.gather(*self.tasks, *self.refills, return_exceptions=True)
+
+    def notified(self, conn, pid, channel: str, payload: str) -> None:
+        self.queue.put_nowait((channel, payload))
+
+    async def listen(self) -> None:
+        while True:
+            try:
+                conn = await asyncpg.connect(**self.connect_kwargs)
+            except (OSError, asyncpg.PostgresError) as e:
+                log.warning("cannot connect to listen (%s); retrying", e)
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            self.lost.clear()
+            conn.add_termination_listener(lambda _: self.lost.set())
+            await conn.add_listener(PLAYER_CHANNEL, self.notified)
+            await conn.add_listener(TEE_CHANNEL, self.notified)
+            # anything cached before this point may have missed a notification
+            self.cache.clear()
+            log.info("listening on %s, %s", PLAYER_CHANNEL, TEE_CHANNEL)
+            try:
+                await self.lost.wait()
+                log.warning("listening connection lost; reconnecting")
+            finally:
+                if not conn.is_closed():
+                    await conn.close(timeout=1)
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def process(self) -> None:
+        while True:
+            channel, payload = await self.queue.get()
+            try:
+                if channel == PLAYER_CHANNEL:
+                    player_ids = [int(payload)]
+                else:
+                    course_id, tee_id = payload.split(":", 1)  # tee ids are text
+                    course_id = int(course_id)
+                    async with self.pool.acquire() as conn:
+                        rows = await conn.fetch(TEE_PLAYERS_QUERY, course_id, tee_id)
+                    player_ids = [r["player_id"] for r in rows]
+            except (ValueError, asyncpg.PostgresError) as e:
+                # a tee change we cannot expand could leave anything stale
+                log.warning("bad %s notification %r (%s); clearing the cache",
+                            channel, payload, e)
+                self.cache.clear()
+                continue
+            self.evict(player_ids)
+
+    def evict(self, player_ids: list[int]) -> None:
+        cached = [pid for pid in player_ids if self.cache.evict(pid)]
+        self.evicted += len(cached)
+        if self.recompute:
+            for pid in cached:
+                task = asyncio.create_task(self.refill(pid))
+                self.refills.add(task)
+                task.add_done_callback(self.refills.discard)
+
+    async def refill(self, player_id: int) -> None:
+        async with self.limit:
+            try:
+                await self.cache.fetch(player_id, self.compute)
+            except Exception as e:
+                log.warning("recomputing player %s failed: %s", player_id, e)
+
+
+class PrintCache:
+    """Stand-in cache for running the listener on its own."""
+
+    def evict(self, player_id: int) -> bool:
+        print(f"evict player {player_id}")
+        return False
+
+    def clear(self) -> None:
+        print("clear")
+
+
+async def main() -> None:
+    from handicap_calculator import DB_PARAMS
+
+    connect_kwargs = dict(database=DB_PARAMS["dbname"], user=DB_PARAMS["user"],
+                          password=DB_PARAMS["password"], host=DB_PARAMS["host"],
+                          port=int(DB_PARAMS["port"]))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    pool = await asyncpg.create_pool(min_size=1, max_size=2, **connect_kwargs)
+    listener = HandicapListener(pool, PrintCache(), connect_kwargs=connect_kwargs)
+    await listener.start()
+    try:
+        await asyncio.gather(*listener.tasks)
+    finally:
+        await listener.stop()
+        await pool.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Handicap query service.
+
+Serves the handicap index of players over HTTP, computed by the same rules as
+handicap_calculator.py (index_from_differentials over the rounds selected by
+PLAYER_ROUNDS_QUERY), so the CLI and the web answers cannot drift apart.
+
+  GET  /handicap/{player_id}   index, rounds used and recent rounds of a player
+  POST /handicap/batch         {"player_ids": [1, 2, ...]} -> {"1": {...}, ...}
+  GET  /health                 pool and cache statistics
+
+Results are kept in a bounded LRU cache with a TTL; concurrent requests for
+a player that is being computed wait for that one computation instead of
+querying again.  With --listen, cached players are evicted as soon as their
+cards or tee ratings change (handicap_listener.py), so results are kept
+until evicted by default, and with --recompute they are computed again in
+the background.  Without --listen a result is only as fresh as the TTL
+(300 s unless --ttl is given).
+
+Usage:
+    python3 handicap_service.py [--host 127.0.0.1] [--port 8081]
+                                [--cache-size 10000] [--ttl 300] [--pool-size 10]
+                                [--listen [--recompute]]
+
+Requires:  aiohttp, asyncpg
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from datetime import date
+
+import asyncpg
+from aiohttp import web
+
+from handicap_listener import HandicapListener
+from handicap_calculator import (DB_PARAMS, PLAYER_ROUNDS_QUERY, RECENT_CUTOFF_QUERY,
+                                 differentials_to_use, index_from_differentials)
+
+ROUNDS_LIMIT = 20
+MAX_BATCH = 1000
+DEFAULT_TTL = 300.0
+
+PLAYER_QUERY = "SELECT username FROM users WHERE id = $1"
+CONNECT_KWARGS = dict(database=DB_PARAMS["dbname"], user=DB_PARAMS["user"],
+                      password=DB_PARAMS["password"], host=DB_PARAMS["host"],
+                      port=int(DB_PARAMS["port"]))
+
+DATE_RANGE_QUERY = "SELECT MIN(play_date), MAX(play_date) FROM player_cards WHERE player_id = $1"
+
+
+def asyncpg_query(query: str) -> str:
+    """Rewrite psycopg2 %s placeholders as asyncpg $1, $2, ..."""
+    count = iter(range(1, query.count("%s") + 1))
+    return re.sub(r"%s", lambda _: f"${next(count)}", query)
+
+
+ROUNDS_QUERY = asyncpg_query(PLAYER_ROUNDS_QUERY)
+CUTOFF_QUERY = asyncpg_query(RECENT_CUTOFF_QUERY)
+
+
+class HandicapCache:
+    """Bounded LRU of per-player results with in-flight request coalescing."""
+
+    def __init__(self, max_size: int = 10_000, ttl: float = DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict[int, tuple[float, dict]] = OrderedDict()
+        self.pending: dict[int, asyncio.Future] = {}
+        self.hits = self.misses = self.coalesced = 0
+
+    def get(self, player_id: int) -> dict | None:
+        entry = self.entries.get(player_id)
+        if entry is None:
+            return None
+        stored, result = entry
+        if self.ttl and time.monotonic() - stored > self.ttl:
+            del self.entries[player_id]
+            return None
+        self.entries.move_to_end(player_id)
+        return result
+
+    def put(self, player_id: int, result: dict) -> None:
+        self.entries[player_id] = (time.monotonic(), result)
+        self.entries.move_to_end(player_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def evict(self, *player_ids: int) -> int:
+        """Drop cached results, and keep in-flight computations for the same
+        players from being cached; returns how many results were cached."""
+        for pid in player_ids:
+            self.pending.pop(pid, None)
+        return sum(self.entries.pop(pid, None) is not None for pid in player_ids)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    async def fetch(self, player_id: int, compute) -> dict:
+        """Cached result for player_id, else await compute(player_id) once.
+
+        The computation runs in its own task and every caller waits on it
+        through shield(), so a cancelled request (client gone, timeout) does
+        not cancel it for the others.
+        """
+        result = self.get(player_id)
+        if result is not None:
+            self.hits += 1
+            return result
+        task = self.pending.get(player_id)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(compute(player_id))
+            self.pending[player_id] = task
+            task.add_done_callback(lambda done: self._settle(player_id, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _settle(self, player_id: int, task: asyncio.Future) -> None:
+        failed = task.cancelled() or task.exception() is not None
+        # evict() while computing means the result may already be stale
+        if self.pending.get(player_id) is task:
+            del self.pending[player_id]
+            if not failed:
+                self.put(player_id, task.result())
+
+    def stats(self) -> dict:
+        return {"size": len(self.entries), "max_size": self.max_size, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+                "pending": len(self.pending)}
+
+
+async def recent_rounds_cutoff(conn, player_id: int, limit: int = ROUNDS_LIMIT):
+    """Async version of handicap_calculator.recent_rounds_cutoff."""
+    first, last = await conn.fetchrow(DATE_RANGE_QUERY, player_id)
+    if last is None:
+        return None
+    for year in range(last.year, first.year - 1, -1):
+        cutoff = await conn.fetchval(CUTOFF_QUERY, player_id, date(year, 1, 1), limit - 1)
+        if cutoff is not None:
+            return cutoff
+    return first
+
+
+async def compute_handicap(pool, player_id: int) -> dict:
+    """The handicap of one player as a JSON-ready dict."""
+    async with pool.acquire() as conn:
+        name = await conn.fetchval(PLAYER_QUERY, player_id)
+        cutoff = await recent_rounds_cutoff(conn, player_id)
+        rows = [] if cutoff is None else await conn.fetch(ROUNDS_QUERY, player_id, cutoff,
+                                                          ROUNDS_LIMIT)
+
+    rounds = [{
+        "card_id": r["card_id"],
+        "play_date": r["play_date"].isoformat(),
+        "course_name": r["course_name"],
+        "tee_name": r["tee_name"],
+        "gross": r["gross"],
+        "differential": None if r["calculated_differential"] is None
+        else float(r["calculated_differential"]),
+        "used": False,
+    } for r in rows]
+    rated = sorted((r for r in rounds if r["differential"] is not None),
+                   key=lambda r: r["differential"])
+    differentials = [r["differential"] for r in rated]
+    for r in rated[:differentials_to_use(len(rated))]:
+        r["used"] = True
+    return {
+        "player_id": player_id,
+        "player_name": name,
+        "handicap_index": index_from_differentials(differentials),
+        "total_rounds": len(differentials),
+        "differentials_used": differentials_to_use(len(differentials)),
+        "rounds": rounds,
+    }
+
+
+def parse_player_id(value) -> int:
+    try:
+        player_id = int(value)
+    except (TypeError, ValueError):
+        raise web.HTTPBadRequest(reason=f"invalid player id: {value!r}")
+    if player_id <= 0:
+        raise web.HTTPBadRequest(reason=f"invalid player id: {value!r}")
+    return player_id
+
+
+async def player_handicap(pool, cache: HandicapCache, player_id: int) -> dict:
+    return await cache.fetch(player_id, lambda pid: compute_handicap(pool, pid))
+
+
+async def get_handicap(request: web.Request) -> web.Response:
+    player_id = parse_player_id(request.match_info["player_id"])
+    result = await player_handicap(request.app["pool"], request.app["cache"], player_id)
+    if result["player_name"] is None:
+        raise web.HTTPNotFound(reason=f"player {player_id} not found")
+    return web.json_response(result)
+
+
+async def post_batch(request: web.Request) -> web.Response:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(reason="body must be JSON")
+    ids = body.get("player_ids") if isinstance(body, dict) else None
+    if not isinstance(ids, list):
+        raise web.HTTPBadRequest(reason='expected {"player_ids": [...]}')
+    if len(ids) > MAX_BATCH:
+        raise web.HTTPBadRequest(reason=f"at most {MAX_BATCH} player ids per batch")
+    player_ids = list(dict.fromkeys(parse_player_id(v) for v in ids))
+
+    pool, cache = request.app["pool"], request.app["cache"]
+    results = await asyncio.gather(*(player_handicap(pool, cache, pid) for pid in player_ids))
+    return web.json_response({str(r["player_id"]): r if r["player_name"] is not None else None
+                              for r in results})
+
+
+async def get_health(request: web.Request) -> web.Response:
+    pool, listener = request.app["pool"], request.app["listener"]
+    return web.json_response({
+        "pool": {"size": pool.get_size(), "idle": pool.get_idle_size()},
+        "cache": request.app["cache"].stats(),
+        "listener": None if listener is None else {
+            "connected": not listener.lost.is_set(), "evicted": listener.evicted},
+    })
+
+
+def make_app(cache_size: int = 10_000, ttl: float = DEFAULT_TTL, pool_size: int = 10,
+             listen: bool = False, recompute: bool = False) -> web.Application:
+    app = web.Application()
+    app["cache"] = HandicapCache(cache_size, ttl)
+    app["listener"] = None
+
+    async def pool_context(app):
+        app["pool"] = pool = await asyncpg.create_pool(min_size=1, max_size=pool_size,
+                                                       **CONNECT_KWARGS)
+        if listen:
+            app["listener"] = HandicapListener(
+                pool, app["cache"], lambda pid: compute_handicap(pool, pid),
+                recompute=recompute, connect_kwargs=CONNECT_KWARGS)
+            await app["listener"].start()
+        yield
+        if app["listener"]:
+            await app["listener"].stop()
+        await pool.close()
+
+    app.cleanup_ctx.append(pool_context)
+    app.router.add_get("/handicap/{player_id}", get_handicap)
+    app.router.add_post("/handicap/batch", post_batch)
+    app.router.add_get("/health", get_health)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve handicap indexes over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--cache-size", type=int, default=10_000,
+                        help="Players kept in the result cache (default: 10000)")
+    parser.add_argument("--ttl", type=float,
+                        help=f"Seconds a cached result stays valid, 0 = until evicted "
+                             f"(default: 0 with --listen, else {DEFAULT_TTL:.0f})")
+    parser.add_argument("--pool-size", type=int, default=10,
+                        help="Maximum database connections (default: 10)")
+    parser.add_argument("--listen", action="store_true",
+                        help="Evict players on handicap_player/handicap_tee notifications")
+    parser.add_argument("--recompute", action="store_true",
+                        help="With --listen, recompute evicted players in the background")
+    args = parser.parse_args()
+    if args.recompute and not args.listen:
+        parser.error("--recompute needs --listen")
+    if args.ttl is None:
+        args.ttl = 0 if args.listen else DEFAULT_TTL
+    elif args.ttl == 0 and not args.listen:
+        parser.error("--ttl 0 needs --listen, or cached indexes never see new cards")
+    web.run_app(make_app(args.cache_size, args.ttl, args.pool_size, args.listen, args.recompute),
+                host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
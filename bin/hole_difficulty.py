@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Empirical hole difficulty from every scorecard.
+
+x_course_holes carries the official men / women stroke indexes.  This job
+measures how hard each hole actually plays, per (course, tee, hole), and
+ranks the holes of a course by average score to par.
+
+The aggregates live in  hole_difficulty_stats  as running sums: number of
+scores, sum and sum of squares of score-to-par, and a count per score type
+(eagles, birdies, pars, bogeys, doubles, triples, worse).  An update reads
+only cards added since the previous run (watermark in card_scan_state),
+groups them in one pass and adds the increments onto the stored sums, so a
+new card costs O(1) per hole instead of a rescan.  --full rebuilds from
+scratch.
+
+Only verified cards with tarj = 'OK' count, as for the handicap index; a card
+verified after the update that passed its id is picked up by the next --full.
+
+Usage:
+    python3 hole_difficulty.py --update [--full]
+    python3 hole_difficulty.py --course 11 [--tee skilled]
+
+Requires:  psycopg2, pandas, numpy
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from card_data import (BUCKETS, HOLE_COLUMNS, HOLES, copy_frame, course_pars, get_watermark,
+                       hole_matrix, par_matrix, read_frame, set_watermark)
+
+SCANNER = "hole_difficulty"
+BUCKET_COLUMNS = [name for name, _, _ in BUCKETS]
+SUM_COLUMNS = ["scores", "sum_to_par", "sum_sq_to_par"] + BUCKET_COLUMNS
+
+CREATE_TABLES = """
+CREATE TABLE IF NOT EXISTS hole_difficulty_stats (
+    course_id INTEGER NOT NULL,
+    tee_id VARCHAR(50) NOT NULL,
+    hole_number SMALLINT NOT NULL CHECK (hole_number BETWEEN 1 AND 18),
+    scores INTEGER NOT NULL,
+    sum_to_par INTEGER NOT NULL,
+    sum_sq_to_par BIGINT NOT NULL,
+    {buckets},
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (course_id, tee_id, hole_number)
+);
+""".format(buckets=",\n    ".join(f"{c} INTEGER NOT NULL" for c in BUCKET_COLUMNS))
+
+CARDS_QUERY = """
+SELECT pc.id AS card_id, pc.course_id, COALESCE(pc.tee_id, 'unknown') AS tee_id, {holes}
+FROM player_cards pc
+WHERE pc.verified = true AND pc.tarj = 'OK' AND pc.id > %s
+""".format(holes=", ".join(f"pc.{h}" for h in HOLE_COLUMNS))
+
+RANKING_QUERY = """
+SELECT s.tee_id, s.hole_number, h.par, s.scores,
+       ROUND(s.sum_to_par::numeric / s.scores, 2) AS avg_to_par,
+       ROUND(SQRT(GREATEST(s.sum_sq_to_par::numeric / s.scores
+                           - POWER(s.sum_to_par::numeric / s.scores, 2), 0)), 2) AS stddev,
+       ROUND(100.0 * (s.eagles + s.birdies + s.pars) / s.scores, 1) AS par_or_better_pct,
+       ROUND(100.0 * (s.double_bogeys + s.triple_bogeys + s.worse) / s.scores, 1) AS double_plus_pct,
+       RANK() OVER (PARTITION BY s.tee_id
+                    ORDER BY s.sum_to_par::numeric / s.scores DESC) AS empirical_rank,
+       h.men_stroke_index, h.women_stroke_index
+FROM hole_difficulty_stats s
+LEFT JOIN x_course_holes h ON h.course_id = s.course_id AND h.hole_number = s.hole_number
+WHERE s.course_id = %s
+"""
+
+
+def aggregate(cards: pd.DataFrame, pars: np.ndarray) -> pd.DataFrame:
+    """Group every (course, tee, hole) score of a batch into sum increments."""
+    to_par = hole_matrix(cards) - pars
+    valid = ~np.isnan(to_par)
+    rows, holes = np.nonzero(valid)
+    values = to_par[rows, holes].astype(np.int64)
+
+    long = pd.DataFrame({
+        "course_id": cards["course_id"].to_numpy()[rows],
+        "tee_id": cards["tee_id"].to_numpy()[rows],
+        "hole_number": holes + 1,
+        "scores": 1,
+        "sum_to_par": values,
+        "sum_sq_to_par": values * values,
+    })
+    for name, lo, hi in BUCKETS:
+        long[name] = ((values >= lo) & (values <= hi)).astype(np.int64)
+    return long.groupby(["course_id", "tee_id", "hole_number"], as_index=False)[SUM_COLUMNS].sum()
+
+
+def update(conn, full: bool) -> None:
+    cursor = conn.cursor()
+    cursor.execute(CREATE_TABLES)
+    watermark = get_watermark(conn, SCANNER)
+    since = 0 if full else watermark
+
+    start = time.perf_counter()
+    cards = read_frame(conn, CARDS_QUERY, (since,))
+    if full:
+        cursor.execute("TRUNCATE hole_difficulty_stats")
+    if cards.empty:
+        if full:
+            set_watermark(cursor, SCANNER, 0)
+        conn.commit()
+        print(f"[OK] No new cards after id {since}")
+        return
+    pars = par_matrix(cards["course_id"], course_pars(conn, cards["course_id"].unique().tolist()))
+    increments = aggregate(cards, pars)
+
+    keys = ["course_id", "tee_id", "hole_number"]
+    cursor.execute("CREATE TEMP TABLE hole_stage (LIKE hole_difficulty_stats) ON COMMIT DROP")
+    copy_frame(conn, increments[keys + SUM_COLUMNS], "hole_stage")
+    columns = ", ".join(keys + SUM_COLUMNS)
+    adds = ", ".join(f"{c} = t.{c} + EXCLUDED.{c}" for c in SUM_COLUMNS)
+    cursor.execute(f"""
+        INSERT INTO hole_difficulty_stats AS t ({columns})
+        SELECT {columns} FROM hole_stage
+        ON CONFLICT (course_id, tee_id, hole_number) DO UPDATE
+        SET {adds}, updated_at = CURRENT_TIMESTAMP
+    """)
+    set_watermark(cursor, SCANNER, int(cards["card_id"].max()))
+    conn.commit()
+    cursor.close()
+    print(f"[OK] Added {len(cards)} cards ({int(increments['scores'].sum())} hole scores) "
+          f"to {len(increments)} hole aggregates in {time.perf_counter() - start:.2f}s")
+
+
+def show_ranking(conn, course_id: int, tee_id: Optional[str]) -> None:
+    query = RANKING_QUERY
+    params = [course_id]
+    if tee_id:
+        query += " AND s.tee_id = %s"
+        params.append(tee_id)
+    ranking = read_frame(conn, query + " ORDER BY s.tee_id, empirical_rank", params)
+    if ranking.empty:
+        print(f"No hole statistics for course {course_id}")
+        return
+    for tee, group in ranking.groupby("tee_id", sort=False):
+        print(f"\n=== Course {course_id}, tee {tee}: holes by empirical difficulty ===")
+        print(group.drop(columns="tee_id").to_string(index=False))
+        official = group["men_stroke_index"].dropna()
+        if len(official) == HOLES:
+            rho = group["empirical_rank"].corr(group["men_stroke_index"], method="spearman")
+            print(f"Rank correlation with official men's stroke index: {rho:.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rank holes by empirical difficulty")
+    parser.add_argument("--update", action="store_true", help="Add new cards to the aggregates")
+    parser.add_argument("--full", action="store_true", help="Rebuild the aggregates from all cards")
+    parser.add_argument("-c", "--course", type=int, help="Show the ranking for this course")
+    parser.add_argument("-t", "--tee", type=str, help="Only show this tee")
+    args = parser.parse_args()
+    if not (args.update or args.full or args.course):
+        parser.error("nothing to do: give --update, --full and/or --course")
+
+    from handicap_calculator import connect_to_db
+
+    conn = connect_to_db()
+    try:
+        if args.update or args.full:
+            update(conn, args.full)
+        if args.course:
+            show_ranking(conn, args.course, args.tee)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Migrate and check the packed hole scores of player_cards.
+
+player_cards.hole_scores holds the 18 hole scores as 18 bytes and is kept in
+sync with h01..h18 by a trigger (backend/db/sql/220_add_player_cards_hole_scores.sql).
+
+  --backfill   pack cards that have no hole_scores yet, in id-range batches
+               with one transaction each (--all repacks every card)
+  --verify     decode every packed value and compare it with h01..h18
+  --benchmark  time reading the scores as 18 columns vs the packed column
+
+Usage:
+    python3 hole_scores.py --backfill [--batch 50000] [--all]
+    python3 hole_scores.py --verify --benchmark
+
+Requires:  psycopg2, pandas, numpy
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from card_data import HOLE_COLUMNS, hole_matrix, read_frame, read_hole_scores, unpacked_matrix
+from handicap_calculator import connect_to_db
+
+BATCH_SIZE = 50_000
+
+BACKFILL_QUERY = """
+UPDATE player_cards
+SET hole_scores = pack_hole_scores(ARRAY[{holes}])
+WHERE id >= %s AND id < %s
+""".format(holes=", ".join(HOLE_COLUMNS))
+
+COLUMNS_QUERY = "SELECT id AS card_id, {holes} FROM player_cards ORDER BY id".format(
+    holes=", ".join(HOLE_COLUMNS))
+
+
+def backfill(conn, batch: int, everything: bool) -> int:
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(id), MAX(id) FROM player_cards")
+    low, high = cursor.fetchone()
+    if low is None:
+        return 0
+    query = BACKFILL_QUERY if everything else BACKFILL_QUERY + " AND hole_scores IS NULL"
+    packed = 0
+    start = time.perf_counter()
+    for first in range(low, high + 1, batch):
+        cursor.execute(query, (first, first + batch))
+        packed += cursor.rowcount
+        conn.commit()
+    cursor.close()
+    print(f"[OK] Packed {packed} cards in {time.perf_counter() - start:.1f}s")
+    return packed
+
+
+def verify(conn) -> int:
+    """Return the number of cards whose packed scores differ from h01..h18."""
+    # Both reads see one snapshot, so cards written meanwhile cannot misalign them
+    conn.rollback()
+    cursor = conn.cursor()
+    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+    cursor.close()
+    try:
+        columns = read_frame(conn, COLUMNS_QUERY)
+        ids, scores = read_hole_scores(conn)
+    finally:
+        conn.rollback()
+    if len(ids) != len(columns):
+        print(f"[WARN] {len(ids)} packed rows but {len(columns)} cards")
+        return abs(len(ids) - len(columns))
+    expected = np.clip(hole_matrix(columns), 0, 255)
+    expected[expected == 0] = np.nan  # 0 is stored as "no score"
+    actual = unpacked_matrix(scores)
+    same = (actual == expected) | (np.isnan(actual) & np.isnan(expected))
+    bad = ~same.all(axis=1) | (ids != columns["card_id"].to_numpy())
+    for card_id in ids[bad][:20]:
+        print(f"[WARN] card {card_id}: packed hole_scores do not match h01..h18")
+    return int(bad.sum())
+
+
+def benchmark(conn) -> None:
+    start = time.perf_counter()
+    columns = read_frame(conn, COLUMNS_QUERY)
+    holes = hole_matrix(columns)
+    as_columns = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, scores = read_hole_scores(conn)
+    as_packed = time.perf_counter() - start
+
+    print(f"{len(columns)} cards")
+    print(f"  h01..h18 columns:  {as_columns:.3f}s  ({holes.nbytes / 1e6:.1f} MB as float)")
+    print(f"  packed bytea:      {as_packed:.3f}s  ({scores.nbytes / 1e6:.1f} MB as uint8)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Migrate and check packed hole scores")
+    parser.add_argument("--backfill", action="store_true", help="Pack cards missing hole_scores")
+    parser.add_argument("--all", action="store_true", help="With --backfill, repack every card")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE,
+                        help=f"Card ids per transaction (default: {BATCH_SIZE})")
+    parser.add_argument("--verify", action="store_true", help="Compare packed with h01..h18")
+    parser.add_argument("--benchmark", action="store_true", help="Time both read paths")
+    args = parser.parse_args()
+    if not (args.backfill or args.verify or args.benchmark):
+        parser.error("give --backfill, --verify and/or --benchmark")
+
+    conn = connect_to_db()
+    try:
+        if args.backfill:
+            backfill(conn, args.batch, args.all)
+        if args.benchmark:
+            benchmark(conn)
+        if args.verify:
+            bad = verify(conn)
+            if bad:
+                print(f"[WARN] {bad} cards differ")
+                sys.exit(1)
+            print("[OK] Packed hole scores match h01..h18")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Bulk scorecard importer.
+
+Loads player_cards from CSV or XLSX files laid out like
+backend/db/csv/200_player_cards.csv (DMY dates, "None" for null, numbers as
+text), without one bad row aborting the whole load:
+
+  • the file is read in chunks (--chunk rows) as text
+  • every chunk is validated and coerced column by column with vectorized
+    pandas operations, driven by the column types of player_cards: integers,
+    numerics, booleans, dates (dd/mm/yy, dd/mm/yyyy or ISO), required
+    columns, hole scores in range, gross = sum of the holes (filled in when
+    missing), player / course / tee ids checked against id sets loaded once
+    from users, x_course_names and x_course_tee_types
+  • rows that fail go to a side file (default <input>.rejects.csv) with the
+    source line and every reason
+  • good rows are copied into a temporary staging table with
+    COPY FROM STDIN and merged into player_cards in one INSERT ... SELECT,
+    skipping cards already present (same player, date, course and ext_id);
+    one transaction per chunk
+
+Card ids come from the player_cards sequence; score_differential and
+hole_scores are filled by the table's triggers.  The hole scores of the seed
+file are placeholders that do not add up to gross; load it with
+--no-gross-check.
+
+Usage:
+    python3 import_cards.py cards.csv [--chunk 50000] [--rejects bad.csv] [--dry-run]
+    python3 import_cards.py season.xlsx [--sheet Cards]
+    python3 import_cards.py ../backend/db/csv/200_player_cards.csv --no-gross-check
+
+Requires:  psycopg2, pandas, numpy (openpyxl for .xlsx)
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from card_data import HOLE_COLUMNS, copy_frame
+
+CHUNK_ROWS = 50_000
+NULL_TOKENS = ["", "None", "NULL", "null", "NaN", "nan"]
+DATE_FORMATS = ["%d/%m/%y", "%d/%m/%Y", "%Y-%m-%d"]
+TRUE_TOKENS = {"true", "t", "yes", "y", "1"}
+FALSE_TOKENS = {"false", "f", "no", "n", "0"}
+MIN_HOLE, MAX_HOLE = 1, 20
+# Assigned by the id sequence or the player_cards triggers
+SKIP_COLUMNS = {"id", "score_differential", "hole_scores"}
+# A card already in player_cards
+CARD_KEY = ["player_id", "play_date", "course_id", "ext_id"]
+INTEGER_TYPES = {"smallint", "integer", "bigint"}
+
+SCHEMA_QUERY = """
+SELECT column_name, data_type, is_nullable = 'NO', column_default
+FROM information_schema.columns
+WHERE table_name = 'player_cards' AND table_schema = current_schema()
+ORDER BY ordinal_position
+"""
+
+
+class Schema:
+    """Column types, NOT NULL flags and defaults of player_cards."""
+
+    def __init__(self, rows: List[tuple]) -> None:
+        self.types = {name: kind for name, kind, _, _ in rows}
+        self.required = {name for name, _, not_null, default in rows if not_null and default is None}
+        self.defaults = {name: default for name, _, _, default in rows if default is not None}
+
+
+def read_chunks(path: str, chunk_rows: int, sheet: Optional[str]) -> Iterator[pd.DataFrame]:
+    """Yield the file as text DataFrames of at most  chunk_rows  rows."""
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        try:
+            import openpyxl
+        except ImportError:
+            print("Reading .xlsx files requires openpyxl (pip install openpyxl)", file=sys.stderr)
+            sys.exit(1)
+        book = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        rows = (book[sheet] if sheet else book.active).iter_rows(values_only=True)
+        header = [str(c).strip() for c in next(rows)]
+        batch: List[tuple] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_rows:
+                yield _xlsx_frame(header, batch)
+                batch = []
+        if batch:
+            yield _xlsx_frame(header, batch)
+        book.close()
+        return
+    yield from pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_rows,
+                           skipinitialspace=True)
+
+
+def _xlsx_frame(header: List[str], rows: List[tuple]) -> pd.DataFrame:
+    """Cells as text, matching what read_csv(dtype=str) gives for a CSV."""
+    frame = pd.DataFrame(rows, columns=header, dtype=object)
+    for column in frame.columns:
+        values = frame[column]
+        dates = values.map(lambda v: hasattr(v, "strftime"))
+        frame[column] = values.where(~dates, values[dates].map(lambda v: v.strftime("%Y-%m-%d")))
+    return frame.fillna("").astype(str)
+
+
+def load_keys(cursor) -> Dict[str, pd.Index]:
+    """Preload the ids player_cards references."""
+    keys = {}
+    for column, query in [("player_id", "SELECT id FROM users"),
+                          ("course_id", "SELECT course_id FROM x_course_names"),
+                          ("tee_id", "SELECT tee_id FROM x_course_tee_types")]:
+        cursor.execute(query)
+        keys[column] = pd.Index([row[0] for row in cursor.fetchall()])
+    return keys
+
+
+def _parse_dates(text: pd.Series) -> pd.Series:
+    parsed = pd.Series(pd.NaT, index=text.index, dtype="datetime64[ns]")
+    for fmt in DATE_FORMATS:
+        todo = parsed.isna() & text.notna()
+        if not todo.any():
+            break
+        parsed[todo] = pd.to_datetime(text[todo], format=fmt, errors="coerce")
+    return parsed
+
+
+def validate(raw: pd.DataFrame, schema: Schema, keys: Dict[str, pd.Index],
+             check_gross: bool = True) -> Tuple[pd.DataFrame, pd.Series]:
+    """Coerce a text chunk to player_cards types.
+
+    Returns the typed frame and a Series of reject reasons ("" = good row).
+    """
+    text = raw.apply(lambda c: c.str.strip()).mask(raw.isin(NULL_TOKENS))
+    reasons = pd.Series("", index=raw.index, dtype=object)
+
+    def reject(mask: pd.Series, reason: str) -> None:
+        nonlocal reasons
+        reasons = reasons.mask(mask.fillna(False).astype(bool), reasons + reason + "; ")
+
+    columns = [c for c in text.columns if c in schema.types and c not in SKIP_COLUMNS]
+    cards = pd.DataFrame(index=raw.index)
+    for column in columns:
+        values, kind = text[column], schema.types[column]
+        given = values.notna()
+        if kind in INTEGER_TYPES or kind in ("numeric", "real", "double precision"):
+            number = pd.to_numeric(values, errors="coerce")
+            if kind in INTEGER_TYPES:
+                bad = given & (number.isna() | (number % 1 != 0))
+                cards[column] = number.mask(bad).astype("Int64")
+            else:
+                bad = given & number.isna()
+                cards[column] = number.mask(bad)
+            reject(bad, f"{column} is not a number")
+        elif kind == "boolean":
+            lowered = values.str.lower()
+            flag = pd.Series(None, index=raw.index, dtype=object)
+            flag[lowered.isin(TRUE_TOKENS)] = True
+            flag[lowered.isin(FALSE_TOKENS)] = False
+            reject(given & flag.isna(), f"{column} is not true/false")
+            cards[column] = flag
+        elif kind == "date":
+            parsed = _parse_dates(values)
+            reject(given & parsed.isna(), f"{column} is not a date")
+            reject(parsed > pd.Timestamp(date.today()), f"{column} is in the future")
+            cards[column] = parsed.dt.strftime("%Y-%m-%d")
+        elif kind.startswith("timestamp"):
+            parsed = pd.to_datetime(values, errors="coerce", dayfirst=True, format="mixed")
+            reject(given & parsed.isna(), f"{column} is not a timestamp")
+            cards[column] = parsed.dt.strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            cards[column] = values
+
+    for column in sorted(schema.required - SKIP_COLUMNS):
+        if column not in cards:
+            raise ValueError(f"required column {column} is missing from the file")
+        reject(text[column].isna(), f"{column} is missing")
+
+    holes = [h for h in HOLE_COLUMNS if h in cards]
+    if holes:
+        scores = cards[holes].to_numpy(dtype=float, na_value=np.nan)
+        reject(pd.Series(((scores < MIN_HOLE) | (scores > MAX_HOLE)).any(axis=1), index=raw.index),
+               f"hole score outside {MIN_HOLE}-{MAX_HOLE}")
+        if len(holes) == len(HOLE_COLUMNS) and "gross" in cards:
+            complete = pd.Series(~np.isnan(scores).any(axis=1), index=raw.index)
+            total = pd.Series(np.nansum(scores, axis=1), index=raw.index).astype("Int64")
+            if check_gross:
+                reject(complete & cards["gross"].notna() & (cards["gross"] != total),
+                       "gross is not the sum of the holes")
+            cards["gross"] = cards["gross"].fillna(total.where(complete))
+
+    for column, known in keys.items():
+        if column in cards:
+            reject(cards[column].notna() & ~cards[column].isin(known), f"unknown {column}")
+
+    key = [c for c in CARD_KEY if c in cards]
+    reject(cards.duplicated(subset=key, keep="first"), "duplicate of an earlier row")
+    return cards, reasons
+
+
+def merge(conn, cards: pd.DataFrame, schema: Schema) -> int:
+    """Stage  cards  with COPY and insert the ones not in player_cards yet."""
+    columns = list(cards.columns)
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE TEMP TABLE card_stage ON COMMIT DROP AS "
+                   f"SELECT {', '.join(columns)} FROM player_cards WITH NO DATA")
+    copy_frame(conn, cards, "card_stage")
+    select = ", ".join(f"COALESCE(s.{c}, {schema.defaults[c]})" if c in schema.defaults else f"s.{c}"
+                       for c in columns)
+    match = " AND ".join(
+        f"pc.{c} = COALESCE(s.{c}, {schema.defaults[c]})" if c in schema.defaults else f"pc.{c} = s.{c}"
+        for c in CARD_KEY if c in columns)
+    cursor.execute(f"""
+        INSERT INTO player_cards ({', '.join(columns)})
+        SELECT {select} FROM card_stage s
+        WHERE NOT EXISTS (SELECT 1 FROM player_cards pc WHERE {match})
+    """)
+    inserted = cursor.rowcount
+    cursor.close()
+    return inserted
+
+
+def run(path: str, chunk_rows: int, rejects_path: str, sheet: Optional[str], dry_run: bool,
+        check_gross: bool = True) -> bool:
+    from handicap_calculator import connect_to_db
+
+    conn = connect_to_db()
+    cursor = conn.cursor()
+    cursor.execute(SCHEMA_QUERY)
+    schema = Schema(cursor.fetchall())
+    keys = load_keys(cursor)
+    cursor.close()
+    conn.rollback()
+
+    read = rejected = inserted = 0
+    first_line = 2  # after the header
+    start = time.perf_counter()
+    if os.path.exists(rejects_path):
+        os.remove(rejects_path)
+    try:
+        for raw in read_chunks(path, chunk_rows, sheet):
+            raw.index = pd.RangeIndex(first_line, first_line + len(raw))
+            first_line += len(raw)
+            cards, reasons = validate(raw, schema, keys, check_gross)
+            bad = reasons != ""
+            if bad.any():
+                side = raw[bad].assign(source_line=raw.index[bad],
+                                       reject_reason=reasons[bad].str.rstrip("; "))
+                side.to_csv(rejects_path, mode="a", index=False,
+                            header=not os.path.exists(rejects_path))
+            good = cards[~bad]
+            if not dry_run and len(good):
+                inserted += merge(conn, good, schema)
+                conn.commit()
+            read += len(raw)
+            rejected += int(bad.sum())
+            elapsed = time.perf_counter() - start
+            print(f"  {read} rows, {rejected} rejected, {inserted} inserted "
+                  f"({read / elapsed * 60:,.0f} rows/min)", end="\r")
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    print()
+    skipped = read - rejected - inserted if not dry_run else 0
+    print(f"[OK] {read} rows in {elapsed:.1f}s: {inserted} inserted, "
+          f"{skipped} already present, {rejected} rejected"
+          + (" (dry run, nothing written)" if dry_run else ""))
+    if rejected:
+        print(f"[WARN] Rejected rows written to {rejects_path}")
+    return rejected == 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk import scorecards into player_cards")
+    parser.add_argument("file", help="CSV or XLSX file")
+    parser.add_argument("--chunk", type=int, default=CHUNK_ROWS,
+                        help=f"Rows per chunk and transaction (default: {CHUNK_ROWS})")
+    parser.add_argument("--rejects", type=str, help="Side file for rejected rows "
+                        "(default: <file>.rejects.csv)")
+    parser.add_argument("--sheet", type=str, help="XLSX sheet (default: the active one)")
+    parser.add_argument("--no-gross-check", action="store_true",
+                        help="Accept cards whose gross differs from the hole total")
+    parser.add_argument("--dry-run", action="store_true", help="Validate only")
+    args = parser.parse_args()
+
+    rejects = args.rejects or os.path.splitext(args.file)[0] + ".rejects.csv"
+    if not run(args.file, args.chunk, rejects, args.sheet, args.dry_run, not args.no_gross_check):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Tournament leaderboards (gross, net and Stableford) for club events.
+
+An event is every verified card played on one course on one date.  Hole
+scores come from  player_cards.h01..h18  and pars / stroke indexes from
+x_course_holes.  Each board keeps its entries in an incrementally updated
+sorted structure, so posting (or correcting) a card costs O(log n) instead of
+re-sorting the whole field.
+
+Ordering and ties:
+  • gross / net   lower is better, Stableford   higher is better
+  • equal totals are split by countback over the last 9, 6, 3 and 1 holes
+    (net and Stableford count back on net hole scores / points)
+  • players still level after countback share the position ("T3")
+  • a card with a missing hole only appears on the Stableford board
+
+Usage:
+    python3 leaderboard.py --course 2 --date 2024-10-30 [--board net] [--top 20]
+    python3 leaderboard.py --benchmark 10000
+
+Requires:  psycopg2 (for the database paths only)
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+HOLES = 18
+COUNTBACK_HOLES = (9, 6, 3, 1)
+BOARDS = ("gross", "net", "stableford")
+
+Key = Tuple[int, ...]
+
+
+class SortedKeys:
+    """Sorted multiset of tuples kept as a list of bounded buckets.
+
+    Lookups bisect the bucket maxima and then one bucket, and inserts or
+    removals only shift elements inside a single bucket, so updates stay
+    logarithmic in practice no matter how large the field grows.
+    """
+
+    LOAD = 256
+
+    def __init__(self) -> None:
+        self._buckets: List[List[Key]] = []
+        self._maxes: List[Key] = []
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[Key]:
+        for bucket in self._buckets:
+            yield from bucket
+
+    def add(self, key: Key) -> None:
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            self._len = 1
+            return
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            pos -= 1
+            self._buckets[pos].append(key)
+            self._maxes[pos] = key
+        else:
+            insort(self._buckets[pos], key)
+        self._len += 1
+        if len(self._buckets[pos]) > 2 * self.LOAD:
+            bucket = self._buckets[pos]
+            self._buckets[pos:pos + 1] = [bucket[:self.LOAD], bucket[self.LOAD:]]
+            self._maxes[pos:pos + 1] = [bucket[self.LOAD - 1], bucket[-1]]
+
+    def remove(self, key: Key) -> None:
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            raise KeyError(key)
+        bucket = self._buckets[pos]
+        idx = bisect_left(bucket, key)
+        if idx == len(bucket) or bucket[idx] != key:
+            raise KeyError(key)
+        del bucket[idx]
+        self._len -= 1
+        if bucket:
+            self._maxes[pos] = bucket[-1]
+        else:
+            del self._buckets[pos]
+            del self._maxes[pos]
+
+    def count_less(self, key: Key) -> int:
+        """Number of stored keys strictly less than  key."""
+        pos = bisect_left(self._maxes, key)
+        before = sum(len(b) for b in self._buckets[:pos])
+        if pos == len(self._buckets):
+            return before
+        return before + bisect_left(self._buckets[pos], key)
+
+    def neighbours(self, key: Key) -> Tuple[Optional[Key], Optional[Key]]:
+        """Return the stored keys immediately before and after  key."""
+        pos = bisect_left(self._maxes, key)
+        prev_key = next_key = None
+        if pos < len(self._buckets):
+            bucket = self._buckets[pos]
+            lo = bisect_left(bucket, key)
+            hi = bisect_right(bucket, key)
+            if lo > 0:
+                prev_key = bucket[lo - 1]
+            elif pos > 0:
+                prev_key = self._maxes[pos - 1]
+            if hi < len(bucket):
+                next_key = bucket[hi]
+            elif pos + 1 < len(self._buckets):
+                next_key = self._buckets[pos + 1][0]
+        elif self._maxes:
+            prev_key = self._maxes[-1]
+        return prev_key, next_key
+
+
+def strokes_received(handicap: int, stroke_index: int) -> int:
+    """Strokes a player receives on a hole (negative for plus handicaps)."""
+    if handicap >= 0:
+        return handicap // HOLES + (1 if stroke_index <= handicap % HOLES else 0)
+    plus = -handicap
+    return -(plus // HOLES + (1 if stroke_index > HOLES - plus % HOLES else 0))
+
+
+def course_handicap(handicap_index: float, slope_rating: float,
+                    course_rating: float, par: int) -> int:
+    """WHS course handicap: index × slope / 113 + (rating − par)."""
+    return round(handicap_index * slope_rating / 113 + (course_rating - par))
+
+
+def _countback(per_hole: Sequence[int]) -> List[int]:
+    return [sum(per_hole[HOLES - n:]) for n in COUNTBACK_HOLES]
+
+
+def score_card(scores: Sequence[Optional[int]], pars: Sequence[int],
+               stroke_indexes: Sequence[int], handicap: int) -> Dict[str, Optional[List[int]]]:
+    """Return the sort components for every board.
+
+    Each value is  [total, last9, last6, last3, last1]  arranged so that a
+    smaller list is a better result, or None when the card does not qualify.
+    """
+    strokes = [strokes_received(handicap, si) for si in stroke_indexes]
+    points = [
+        0 if s is None else max(0, 2 + p + k - s)
+        for s, p, k in zip(scores, pars, strokes)
+    ]
+    result: Dict[str, Optional[List[int]]] = {
+        "stableford": [-v for v in [sum(points)] + _countback(points)],
+        "gross": None,
+        "net": None,
+    }
+    if all(s is not None for s in scores):
+        net_holes = [s - k for s, k in zip(scores, strokes)]
+        result["gross"] = [sum(scores)] + _countback(scores)
+        result["net"] = [sum(net_holes)] + _countback(net_holes)
+    return result
+
+
+class Leaderboard:
+    """One ranked board (gross, net or Stableford) for a single event."""
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+        self._keys = SortedKeys()
+        self._by_player: Dict[int, Key] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def post(self, player_id: int, components: Optional[Sequence[int]]) -> None:
+        """Insert or replace a player's entry; None withdraws the player."""
+        old = self._by_player.pop(player_id, None)
+        if old is not None:
+            self._keys.remove(old)
+        if components is None:
+            return
+        key = tuple(components) + (player_id,)
+        self._keys.add(key)
+        self._by_player[player_id] = key
+
+    def total(self, key: Key) -> int:
+        return -key[0] if self.kind == "stableford" else key[0]
+
+    def position(self, player_id: int) -> Optional[Tuple[int, bool]]:
+        """Return (position, tied) for a player, or None if not on the board."""
+        key = self._by_player.get(player_id)
+        if key is None:
+            return None
+        score = key[:-1]
+        first = self._keys.count_less(score)
+        prev_key, next_key = self._keys.neighbours(key)
+        tied = (prev_key is not None and prev_key[:-1] == score) or \
+               (next_key is not None and next_key[:-1] == score)
+        return first + 1, tied
+
+    def standings(self, limit: Optional[int] = None) -> List[Dict[str, object]]:
+        """Return the top  limit  entries with positions and tie flags."""
+        rows: List[Dict[str, object]] = []
+        previous: Optional[Key] = None
+        position = 0
+        for idx, key in enumerate(self._keys):
+            if limit is not None and idx >= limit:
+                if previous is None or key[:-1] != previous[:-1]:
+                    break
+            if previous is None or key[:-1] != previous[:-1]:
+                position = idx + 1
+            elif rows:
+                rows[-1]["tied"] = True
+            rows.append({
+                "position": position,
+                "tied": previous is not None and key[:-1] == previous[:-1],
+                "player_id": key[-1],
+                "score": self.total(key),
+            })
+            previous = key
+        return rows
+
+
+class Event:
+    """Gross, net and Stableford boards for one course on one date."""
+
+    def __init__(self, pars: Sequence[int], stroke_indexes: Dict[str, Sequence[int]]) -> None:
+        self.pars = list(pars)
+        self.stroke_indexes = stroke_indexes
+        self.boards = {kind: Leaderboard(kind) for kind in BOARDS}
+        self.names: Dict[int, str] = {}
+
+    def post_card(self, player_id: int, scores: Sequence[Optional[int]],
+                  handicap: int, gender: Optional[str] = None,
+                  player_name: Optional[str] = None) -> None:
+        """Score a (new or corrected) card and update every board."""
+        si = self.stroke_indexes["women" if gender == "F" else "men"]
+        components = score_card(scores, self.pars, si, handicap)
+        for kind, board in self.boards.items():
+            board.post(player_id, components[kind])
+        if player_name:
+            self.names[player_id] = player_name
+
+
+EVENT_HOLES_QUERY = """
+SELECT hole_number, par, men_stroke_index, women_stroke_index
+FROM x_course_holes
+WHERE course_id = %s
+ORDER BY hole_number
+"""
+
+EVENT_CARDS_QUERY = """
+SELECT pc.player_id, u.username, u.gender, pc.hcp,
+       chi.handicap_index, cdt.slope_rating, cdt.course_rating, cdt.par,
+       pc.h01, pc.h02, pc.h03, pc.h04, pc.h05, pc.h06, pc.h07, pc.h08, pc.h09,
+       pc.h10, pc.h11, pc.h12, pc.h13, pc.h14, pc.h15, pc.h16, pc.h17, pc.h18
+FROM player_cards pc
+JOIN users u ON u.id = pc.player_id
+LEFT JOIN x_course_data_by_tee cdt
+       ON cdt.course_id = pc.course_id AND cdt.tee_id = pc.tee_id
+LEFT JOIN current_handicap_indexes chi ON chi.player_id = pc.player_id
+WHERE pc.course_id = %s AND pc.play_date = %s
+  AND pc.verified = true AND pc.tarj = 'OK'
+ORDER BY pc.created_at, pc.id
+"""
+
+
+def load_event(course_id: int, play_date: date) -> Event:
+    """Build an event from the database, posting cards in arrival order."""
+    from handicap_calculator import connect_to_db
+
+    conn = connect_to_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(EVENT_HOLES_QUERY, (course_id,))
+        holes = cursor.fetchall()
+        if len(holes) != HOLES:
+            print(f"[ERROR] Course {course_id} has {len(holes)} holes in x_course_holes",
+                  file=sys.stderr)
+            sys.exit(1)
+        event = Event(
+            [h[1] for h in holes],
+            {"men": [h[2] for h in holes], "women": [h[3] for h in holes]},
+        )
+        cursor.execute(EVENT_CARDS_QUERY, (course_id, play_date))
+        for row in cursor:
+            player_id, name, gender, hcp, index, slope, rating, par = row[:8]
+            if hcp is not None:
+                handicap = int(round(hcp))
+            elif None not in (index, slope, rating, par):
+                handicap = course_handicap(float(index), float(slope), float(rating), par)
+            else:
+                handicap = 0
+            event.post_card(player_id, list(row[8:]), handicap, gender, name)
+        return event
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def print_board(event: Event, kind: str, top: int) -> None:
+    board = event.boards[kind]
+    print(f"\n=== {kind.capitalize()} leaderboard ({len(board)} players) ===")
+    for row in board.standings(top):
+        pos = f"{'T' if row['tied'] else ''}{row['position']}"
+        name = event.names.get(row["player_id"], row["player_id"])
+        print(f"{pos:>5}  {name!s:<24} {row['score']:>4}")
+
+
+def run_benchmark(players: int, seed: int = 42) -> None:
+    """Fill a synthetic field, then time single-card updates against it."""
+    rng = random.Random(seed)
+    pars = [4, 5, 3, 4, 4, 3, 4, 5, 4, 4, 3, 5, 4, 4, 3, 4, 5, 4]
+    si = rng.sample(range(1, HOLES + 1), HOLES)
+    event = Event(pars, {"men": si, "women": si})
+
+    def random_card() -> Tuple[List[int], int]:
+        handicap = rng.randint(0, 36)
+        skill = handicap / HOLES
+        return [max(1, p + round(rng.gauss(skill, 1.0))) for p in pars], handicap
+
+    start = time.perf_counter()
+    for pid in range(players):
+        scores, handicap = random_card()
+        event.post_card(pid, scores, handicap)
+    fill = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(2000):
+        pid = rng.randrange(players)
+        scores, handicap = random_card()
+        t0 = time.perf_counter()
+        event.post_card(pid, scores, handicap)
+        latencies.append((time.perf_counter() - t0) * 1e6)
+    latencies.sort()
+
+    t0 = time.perf_counter()
+    for kind in BOARDS:
+        event.boards[kind].standings(20)
+    top_ms = (time.perf_counter() - t0) * 1e3
+
+    print(f"Field size:              {players}")
+    print(f"Initial fill:            {fill * 1e3:.1f} ms ({fill / players * 1e6:.1f} µs/card)")
+    print(f"Card update (3 boards):  mean {statistics.mean(latencies):.1f} µs, "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:.1f} µs")
+    print(f"Top-20 for all boards:   {top_ms:.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gross, net and Stableford event leaderboards")
+    parser.add_argument("-c", "--course", type=int, help="Course ID of the event")
+    parser.add_argument("-d", "--date", type=date.fromisoformat, help="Play date (YYYY-MM-DD)")
+    parser.add_argument("-b", "--board", choices=BOARDS + ("all",), default="all",
+                        help="Board to display (default: all)")
+    parser.add_argument("-t", "--top", type=int, default=20, help="Rows per board (default: 20)")
+    parser.add_argument("--benchmark", type=int, metavar="PLAYERS",
+                        help="Run the synthetic benchmark with this many players")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        run_benchmark(args.benchmark)
+        return
+    if args.course is None or args.date is None:
+        parser.error("--course and --date are required unless --benchmark is given")
+
+    event = load_event(args.course, args.date)
+    for kind in (BOARDS if args.board == "all" else (args.board,)):
+        print_board(event, kind, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Rotate, compress and search the backend debug log.
+
+The backend appends entries to /tmp/backend-debug.log as
+    [2025-05-16T10:00:00.123Z] message (possibly spanning several lines)
+(backend/src/utils/logger.ts, routes/logs.ts).  The timestamps are fixed
+width UTC, so they are compared as plain bytes.
+
+--rotate moves the live log aside (the backend re-creates it on the next
+append) and stores it as a segment in the store directory:
+
+  seg-<first>-<last>.blk   entries in blocks of about BLOCK_SIZE bytes, each
+                           zlib-compressed on its own
+  seg-<first>-<last>.idx   sparse index, one JSON row per block:
+                           [first ts, last ts, offset, compressed, raw, entries]
+
+A search skips segments by the time range in their name, memory-maps the
+others and decompresses only the blocks whose time range overlaps the
+query; with a substring, blocks that do not contain it are skipped after a
+single bytes.find.  The live log is searched in place by binary search on
+its timestamps.
+
+Usage:
+    python3 log_store.py --rotate [--min-size 0] [--keep-days 30]
+    python3 log_store.py --search [TEXT] [--since 7d] [--until 2025-05-16T12:00] [-i]
+                         [--limit 100] [--json] [--count]
+    python3 log_store.py --list
+
+LOG_FILE and the store (/tmp/backend-logs) can be changed with
+$VHS_LOG_FILE and $VHS_LOG_STORE.
+
+Requires:  nothing beyond the standard library
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import mmap
+import os
+import re
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Tuple
+
+LOG_FILE = os.environ.get("VHS_LOG_FILE", "/tmp/backend-debug.log")
+STORE_DIR = os.environ.get("VHS_LOG_STORE", "/tmp/backend-logs")
+BLOCK_SIZE = 256 * 1024
+ROTATE_SIZE = 16 * 1024 * 1024
+
+TS_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+ENTRY_START = re.compile(rb"^\[(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}Z)\]", re.M)
+SEGMENT_NAME = re.compile(r"seg-(\S+?)--(\S+?)\.blk$")
+RELATIVE = re.compile(r"^(\d+)([smhdw])$")
+UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+Entry = Tuple[bytes, bytes]  # timestamp, whole entry
+
+
+def timestamp(value: str) -> bytes:
+    """A --since/--until value (ISO date/time or 30m, 2h, 7d, 1w ago) as a log timestamp."""
+    match = RELATIVE.match(value)
+    if match:
+        moment = datetime.now(timezone.utc) - timedelta(**{UNITS[match[2]]: int(match[1])})
+    else:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if moment.tzinfo:
+            moment = moment.astimezone(timezone.utc)
+    return (moment.strftime(TS_FORMAT)[:-3] + "Z").encode()
+
+
+def split_entries(data) -> Iterator[Entry]:
+    """Entries of a buffer that starts at an entry; text before the first is skipped."""
+    starts = list(ENTRY_START.finditer(data))
+    for match, following in zip(starts, starts[1:] + [None]):
+        end = following.start() if following else len(data)
+        yield match[1], bytes(data[match.start():end])
+
+
+# ── rotation ────────────────────────────────────────────────────────────────
+
+def safe_ts(ts: bytes) -> str:
+    return ts.decode().replace(":", "")
+
+
+def write_segment(data: bytes, store: str) -> Optional[str]:
+    """Store the entries of  data  as one compressed, indexed segment."""
+    blocks, block, size = [], [], 0
+    for entry in split_entries(data):
+        block.append(entry)
+        size += len(entry[1])
+        if size >= BLOCK_SIZE:
+            blocks.append(block)
+            block, size = [], 0
+    if block:
+        blocks.append(block)
+    if not blocks:
+        return None
+
+    first, last = blocks[0][0][0], blocks[-1][-1][0]
+    base = os.path.join(store, f"seg-{safe_ts(first)}--{safe_ts(last)}")
+    index, offset = [], 0
+    with open(base + ".blk.tmp", "wb") as f:
+        for block in blocks:
+            raw = b"".join(entry for _, entry in block)
+            packed = zlib.compress(raw, 6)
+            f.write(packed)
+            index.append([block[0][0].decode(), block[-1][0].decode(), offset, len(packed),
+                          len(raw), len(block)])
+            offset += len(packed)
+    with open(base + ".idx.tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(base + ".idx.tmp", base + ".idx")
+    os.replace(base + ".blk.tmp", base + ".blk")
+    return base + ".blk"
+
+
+def rotate(log_file: str, store: str, min_size: int) -> None:
+    os.makedirs(store, exist_ok=True)
+    rotating = os.path.join(store, "rotating.log")
+    # a rotation that was interrupted is finished first
+    if not os.path.exists(rotating):
+        if not os.path.exists(log_file) or os.path.getsize(log_file) < min_size:
+            print(f"[OK] {log_file} is below {min_size} bytes; nothing to rotate")
+            return
+        os.replace(log_file, rotating)
+    with open(rotating, "rb") as f:
+        data = f.read()
+    path = write_segment(data, store)
+    os.remove(rotating)
+    if path:
+        print(f"[OK] {len(data)} bytes stored as {os.path.basename(path)} "
+              f"({os.path.getsize(path)} bytes)")
+
+
+def prune(store: str, keep_days: int) -> None:
+    cutoff = safe_ts(timestamp(f"{keep_days}d"))
+    for path, _, last in segments(store):
+        if last < cutoff:
+            os.remove(path)
+            os.remove(path[:-4] + ".idx")
+            print(f"[OK] Removed {os.path.basename(path)}")
+
+
+# ── search ──────────────────────────────────────────────────────────────────
+
+def segments(store: str) -> List[Tuple[str, str, str]]:
+    """(path, first, last) of every segment, oldest first; times as in file names."""
+    found = []
+    for path in glob.glob(os.path.join(store, "seg-*.blk")):
+        match = SEGMENT_NAME.search(os.path.basename(path))
+        if match:
+            found.append((path, match[1], match[2]))
+    return sorted(found, key=lambda segment: segment[1])
+
+
+def in_range(ts: bytes, since: Optional[bytes], until: Optional[bytes]) -> bool:
+    return (since is None or ts >= since) and (until is None or ts < until)
+
+
+def matching(data, since, until, needle, ignore_case) -> Iterator[Entry]:
+    for ts, entry in split_entries(data):
+        if not in_range(ts, since, until):
+            continue
+        if needle is None or needle in (entry.lower() if ignore_case else entry):
+            yield ts, entry
+
+
+def search_segment(path, since, until, needle, ignore_case) -> Iterator[Entry]:
+    with open(path[:-4] + ".idx", encoding="utf-8") as f:
+        index = json.load(f)
+    low, high = since.decode() if since else None, until.decode() if until else None
+    wanted = [row for row in index
+              if (low is None or row[1] >= low) and (high is None or row[0] < high)]
+    if not wanted:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for _, _, offset, packed, _, _ in wanted:
+            raw = zlib.decompress(mm[offset:offset + packed])
+            if needle is not None and (raw.lower() if ignore_case else raw).find(needle) < 0:
+                continue
+            yield from matching(raw, since, until, needle, ignore_case)
+
+
+def entry_at_or_after(mm, position: int) -> int:
+    """Offset of the first entry that starts at or after  position ."""
+    if position <= 0:
+        return 0
+    while True:
+        newline = mm.find(b"\n[", position - 1)
+        if newline < 0:
+            return len(mm)
+        if ENTRY_START.match(mm, newline + 1):
+            return newline + 1
+        position = newline + 2
+
+
+def bisect_live(mm, ts: Optional[bytes]) -> int:
+    """Offset of the first entry of the live log at or after  ts ."""
+    if ts is None:
+        return 0
+    low, high = 0, len(mm)
+    while low < high:
+        middle = entry_at_or_after(mm, (low + high) // 2)
+        match = ENTRY_START.match(mm, middle) if middle < len(mm) else None
+        if match is None or match[1] >= ts:
+            high = (low + high) // 2
+        else:
+            low = middle + 1
+    return entry_at_or_after(mm, low)
+
+
+def search_live(path, since, until, needle, ignore_case) -> Iterator[Entry]:
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = bisect_live(mm, since)
+        end = bisect_live(mm, until) if until else len(mm)
+        if start < end:
+            yield from matching(mm[start:end], since, until, needle, ignore_case)
+
+
+def search(store, log_file, since=None, until=None, text=None, ignore_case=False) -> Iterator[Entry]:
+    """Matching entries of the stored segments and the live log, oldest first."""
+    needle = None if text is None else text.encode()
+    if needle is not None and ignore_case:
+        needle = needle.lower()
+    low, high = since and safe_ts(since), until and safe_ts(until)
+    for path, first, last in segments(store):
+        if (low and last < low) or (high and first >= high):
+            continue
+        yield from search_segment(path, since, until, needle, ignore_case)
+    rotating = os.path.join(store, "rotating.log")
+    for live in (rotating, log_file):
+        yield from search_live(live, since, until, needle, ignore_case)
+
+
+def list_segments(store: str) -> None:
+    total_raw = total_packed = 0
+    for path, first, last in segments(store):
+        with open(path[:-4] + ".idx", encoding="utf-8") as f:
+            index = json.load(f)
+        raw, entries = sum(row[4] for row in index), sum(row[5] for row in index)
+        packed = os.path.getsize(path)
+        total_raw, total_packed = total_raw + raw, total_packed + packed
+        print(f"{os.path.basename(path)}  {entries:>8} entries {len(index):>5} blocks "
+              f"{raw / 1e6:8.1f} MB -> {packed / 1e6:7.1f} MB")
+    print(f"total {total_raw / 1e6:.1f} MB stored in {total_packed / 1e6:.1f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rotate, compress and search the backend log")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--rotate", action="store_true", help="Move the live log into the store")
+    action.add_argument("--search", nargs="?", const="", metavar="TEXT",
+                        help="Print entries (containing TEXT)")
+    action.add_argument("--list", action="store_true", help="List the stored segments")
+    parser.add_argument("--log", default=LOG_FILE, help=f"Live log (default: {LOG_FILE})")
+    parser.add_argument("--store", default=STORE_DIR, help=f"Segments (default: {STORE_DIR})")
+    parser.add_argument("--min-size", type=int, default=ROTATE_SIZE,
+                        help=f"Only rotate a live log of at least this many bytes "
+                             f"(default: {ROTATE_SIZE})")
+    parser.add_argument("--keep-days", type=int, help="With --rotate, drop older segments")
+    parser.add_argument("--since", help="ISO time or 30m / 2h / 7d / 1w ago")
+    parser.add_argument("--until", help="ISO time or 30m / 2h / 7d / 1w ago (exclusive)")
+    parser.add_argument("-i", "--ignore-case", action="store_true")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after this many entries")
+    parser.add_argument("--json", action="store_true", help="One JSON object per entry")
+    parser.add_argument("--count", action="store_true", help="Only print the number of entries")
+    args = parser.parse_args()
+
+    if args.rotate:
+        rotate(args.log, args.store, args.min_size)
+        if args.keep_days:
+            prune(args.store, args.keep_days)
+        return
+    if args.list:
+        list_segments(args.store)
+        return
+
+    start = time.perf_counter()
+    since = timestamp(args.since) if args.since else None
+    until = timestamp(args.until) if args.until else None
+    found = 0
+    for ts, entry in search(args.store, args.log, since, until, args.search or None,
+                            args.ignore_case):
+        found += 1
+        if args.json:
+            print(json.dumps({"timestamp": ts.decode(),
+                              "message": entry[len(ts) + 3:].decode(errors="replace").rstrip("\n")}))
+        elif not args.count:
+            sys.stdout.write(entry.decode(errors="replace"))
+        if found == args.limit:
+            break
+    if args.count:
+        print(found)
+    print(f"[{found} entries in {(time.perf_counter() - start) * 1000:.1f} ms]", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
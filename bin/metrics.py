@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Prometheus textfile metrics for batch jobs.
+
+    from metrics import job_metrics
+
+    with job_metrics("g_course_get") as metrics:
+        metrics.items.inc(status="ok")
+        metrics.bytes_fetched.inc(len(body))
+        with metrics.stage("fetch"):
+            ...
+
+Every tool shares the same metric names and tells itself apart with a "tool"
+label, so one node_exporter textfile collector can read them all:
+
+  vhs_batch_items_total{tool,status}          items processed, by outcome
+  vhs_batch_bytes_fetched_total{tool}         bytes downloaded or read
+  vhs_batch_retries_total{tool}               retried attempts
+  vhs_batch_stage_seconds{tool,stage}         histogram of stage latencies
+  vhs_batch_last_run_timestamp_seconds{tool}  when the run ended
+  vhs_batch_duration_seconds{tool}            how long it took
+  vhs_batch_success{tool}                     1 unless it raised or exited non-zero
+
+The file  <dir>/<tool>.prom  is rewritten atomically (temporary file +
+rename) every INTERVAL (15) seconds while the job runs and once at the end.
+<dir> is $VHS_METRICS_DIR, by default /tmp/vhs-metrics.
+
+Requires:  nothing beyond the standard library
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_DIR = os.environ.get("VHS_METRICS_DIR", "/tmp/vhs-metrics")
+PREFIX = "vhs_batch_"
+INTERVAL = 15.0
+# Seconds; from fast queries to slow page downloads
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+               for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, registry, name, help):
+        self.registry, self.name, self.help = registry, name, help
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self, common):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels({**common, **dict(key)})} {_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value, **labels):
+        with self.registry.lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+    def render(self, common):
+        lines = super().render(common)
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, registry, name, help, buckets=BUCKETS):
+        self.registry, self.name, self.help = registry, name, help
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.values = {}  # labels -> [bucket counts, sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.registry.lock:
+            counts, total, count = self.values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self, common):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self.values.items()):
+            labels = {**common, **dict(key)}
+            for bound, bucket in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': _number(bound)})} "
+                             f"{bucket}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(labels)} {count}")
+        return lines
+
+
+class Metrics:
+    """The metrics of one run of one tool."""
+
+    def __init__(self, tool, directory=METRICS_DIR):
+        self.tool = tool
+        self.path = os.path.join(directory, f"{tool}.prom")
+        self.lock = threading.RLock()
+        self.metrics = []
+        self.items = self.counter("items_total", "Items processed, by outcome")
+        self.bytes_fetched = self.counter("bytes_fetched_total", "Bytes downloaded or read")
+        self.retries = self.counter("retries_total", "Retried attempts")
+        self.stage_seconds = self.histogram("stage_seconds", "Latency of a stage of the job")
+        self.last_run = self.gauge("last_run_timestamp_seconds", "Unix time the run ended")
+        self.duration = self.gauge("duration_seconds", "Duration of the run")
+        self.success = self.gauge("success", "1 if the run succeeded")
+
+    def counter(self, name, help):
+        return self._add(Counter(self, PREFIX + name, help))
+
+    def gauge(self, name, help):
+        return self._add(Gauge(self, PREFIX + name, help))
+
+    def histogram(self, name, help, buckets=BUCKETS):
+        return self._add(Histogram(self, PREFIX + name, help, buckets))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def stage(self, stage):
+        """Context manager timing one stage into vhs_batch_stage_seconds."""
+        return self.stage_seconds.time(stage=stage)
+
+    def render(self):
+        common = {"tool": self.tool}
+        with self.lock:
+            lines = [line for metric in self.metrics if metric.values
+                     for line in metric.render(common)]
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """Replace the .prom file atomically; never fails the job."""
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temporary, "w", encoding="utf-8") as f:
+                f.write(self.render())
+            os.replace(temporary, self.path)
+        except OSError:
+            pass
+
+
+@contextmanager
+def job_metrics(tool, interval=INTERVAL, directory=None):
+    """Collect metrics for a run, writing them periodically and at the end."""
+    metrics = Metrics(tool, directory or METRICS_DIR)
+    done = threading.Event()
+
+    def flush_periodically():
+        while not done.wait(interval):
+            metrics.write()
+
+    writer = threading.Thread(target=flush_periodically, name="metrics-writer", daemon=True)
+    writer.start()
+    start = time.time()
+    success = 0
+    try:
+        yield metrics
+        success = 1
+    except SystemExit as e:
+        success = int(e.code in (None, 0))
+        raise
+    finally:
+        done.set()
+        writer.join()
+        metrics.success.set(success)
+        metrics.duration.set(time.time() - start)
+        metrics.last_run.set(time.time())
+        metrics.write()
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Move player_cards to a table range-partitioned by play_date, one partition
+per calendar year.
+
+Handicap queries only need a player's last 20 rounds, but on a single heap
+every query walks indexes sized by all the years of history.  With yearly
+partitions the recent-rounds lookup in handicap_calculator.py
+(recent_rounds_cutoff + PLAYER_ROUNDS_QUERY) passes a constant play_date
+bound and the planner prunes the older years.
+
+The migration runs online, in steps:
+
+  --prepare   create player_cards_part (same columns, PRIMARY KEY (id, play_date)),
+              one partition per year of data up to next year and a
+              default partition (player_cards_default), the indexes
+              and foreign keys, and a trigger that mirrors every write on
+              player_cards into it
+  --copy      copy rows over in id batches, one short transaction each;
+              progress is kept in card_scan_state so it can be resumed
+  --swap      under a brief exclusive lock: copy the rows added since the
+              last batch, swap the table names, move the id sequence and
+              recreate the triggers and views that point at player_cards
+  --drop-old  drop the old table (player_cards_unpartitioned) once satisfied
+
+Foreign keys to player_cards(id) (card_review_flags, player_card_stats)
+cannot point at the partitioned table, which is only unique on
+(id, play_date): --swap drops them and keeps their ON DELETE CASCADE as a
+trigger (card_data.cascade_card_deletes).
+
+The partitioned table gets the indexes of 200_create_player_cards_table.sql
+and 230_add_handicap_notify.sql except four: player_id and verified alone
+are the leading columns of player_date and verified_tarj, and no query
+filters on the hole columns that holes_front / holes_back cover.
+
+--status prints the row counts per partition, --add-years N creates the
+partitions for the next N years.  Cards dated outside every yearly
+partition land in player_cards_default, which is not pruned; --add-years
+moves them into the year's new partition, so run it before each season.
+
+Usage:
+    python3 partition_cards.py --prepare
+    python3 partition_cards.py --copy [--batch 50000]
+    python3 partition_cards.py --swap
+    python3 partition_cards.py --status
+
+Requires:  psycopg2
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+from card_data import cascade_card_deletes, get_watermark, set_watermark
+from handicap_calculator import connect_to_db
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.environ.get("ROOT_DIR", os.path.dirname(SCRIPT_DIR))
+VIEW_SQL = os.path.join(ROOT_DIR, "backend", "db", "sql", "500_create_handicap_VIEW.sql")
+
+SOURCE = "player_cards"
+TARGET = "player_cards_part"
+OLD = "player_cards_unpartitioned"
+DEFAULT_PARTITION = "player_cards_default"
+SCANNER = "partition_migration"
+BATCH_SIZE = 50_000
+LOCK_TIMEOUT = "5s"
+
+INDEXES = [
+    ("player_date", "(player_id, play_date DESC)"),
+    ("handicap_calc", "(player_id, verified, tarj, play_date DESC)"),
+    ("verified_tarj", "(verified, tarj)"),
+    ("play_date", "(play_date DESC)"),
+    ("course_id", "(course_id)"),
+    ("course_tee", "(course_id, tee_id, player_id)"),
+    ("tee_id", "(tee_id)"),
+    ("tarj", "(tarj)"),
+    ("g_differential", "(g_differential)"),
+]
+
+FOREIGN_KEYS = [
+    ("course_id", "x_course_names(course_id)", "ON UPDATE CASCADE ON DELETE RESTRICT"),
+    ("tee_id", "x_course_tee_types(tee_id)", "ON UPDATE CASCADE ON DELETE RESTRICT"),
+    ("player_id", "users(id)", "ON UPDATE CASCADE ON DELETE CASCADE"),
+]
+
+# Row triggers from 210_add_player_cards_differential.sql, 220_add_player_cards_hole_scores.sql
+# and 230_add_handicap_notify.sql
+ROW_TRIGGERS = [
+    ("player_cards_differential", "player_cards_set_differential",
+     "BEFORE INSERT OR UPDATE OF gross, course_id, tee_id"),
+    ("player_cards_hole_scores", "player_cards_pack_hole_scores",
+     "BEFORE INSERT OR UPDATE OF " + ", ".join(f"h{n:02d}" for n in range(1, 19))),
+    ("player_cards_notify", "player_cards_notify_handicap",
+     "AFTER INSERT OR UPDATE OR DELETE"),
+]
+
+MIRROR_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION player_cards_mirror_to_part()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM {TARGET} WHERE id = OLD.id AND play_date = OLD.play_date;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {TARGET} SELECT NEW.*;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+REFERENCING_QUERY = """
+SELECT con.conname, con.conrelid::regclass::text, a.attname, con.confdeltype
+FROM pg_constraint con
+JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = con.conkey[1]
+WHERE con.contype = 'f' AND con.confrelid = %s::regclass AND con.conrelid <> con.confrelid
+"""
+
+COPY_QUERY = f"""
+INSERT INTO {TARGET}
+SELECT * FROM {SOURCE} WHERE id > %s AND id <= %s FOR SHARE
+ON CONFLICT DO NOTHING
+"""
+
+
+def is_partitioned(cursor, table: str) -> bool:
+    cursor.execute("""
+        SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p
+                       JOIN pg_class c ON c.oid = p.partrelid
+                       WHERE c.relname = %s AND pg_table_is_visible(c.oid))
+    """, (table,))
+    return cursor.fetchone()[0]
+
+
+def table_exists(cursor, table: str) -> bool:
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+    return cursor.fetchone()[0]
+
+
+def ensure_partitions(cursor, parent: str, first_year: int, last_year: int) -> int:
+    """Create the yearly partitions of  parent  for first_year..last_year and
+    the default partition, moving rows of a new year out of the default."""
+    created = 0
+    has_default = table_exists(cursor, DEFAULT_PARTITION)
+    for year in range(first_year, last_year + 1):
+        name = f"player_cards_y{year}"
+        if table_exists(cursor, name):
+            continue
+        span = (f"{year}-01-01", f"{year + 1}-01-01")
+        in_default = False
+        if has_default:
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} "
+                           f"WHERE play_date >= %s AND play_date < %s)", span)
+            in_default = cursor.fetchone()[0]
+        if in_default:
+            # A partition cannot be added while the default holds rows for it.
+            # Detached, the default loses its cloned triggers, so the DELETE
+            # below does not cascade to the moved cards' flags and stats.
+            cursor.execute(f"ALTER TABLE {parent} DETACH PARTITION {DEFAULT_PARTITION}")
+        cursor.execute(f"CREATE TABLE {name} PARTITION OF {parent} "
+                       f"FOR VALUES FROM ('{span[0]}') TO ('{span[1]}')")
+        if in_default:
+            cursor.execute(f"INSERT INTO {parent} SELECT * FROM {DEFAULT_PARTITION} "
+                           f"WHERE play_date >= %s AND play_date < %s", span)
+            cursor.execute(f"DELETE FROM {DEFAULT_PARTITION} "
+                           f"WHERE play_date >= %s AND play_date < %s", span)
+            cursor.execute(f"ALTER TABLE {parent} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+        created += 1
+    if not has_default:
+        cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {parent} DEFAULT")
+    return created
+
+
+def prepare(conn) -> None:
+    cursor = conn.cursor()
+    if is_partitioned(cursor, SOURCE):
+        print(f"[OK] {SOURCE} is already partitioned")
+        return
+    if table_exists(cursor, TARGET):
+        print(f"[ERROR] {TARGET} already exists; --swap or drop it first", file=sys.stderr)
+        sys.exit(1)
+
+    cursor.execute(f"SELECT EXTRACT(YEAR FROM MIN(play_date))::int, "
+                   f"EXTRACT(YEAR FROM MAX(play_date))::int FROM {SOURCE}")
+    first, last = cursor.fetchone()
+    this_year = date.today().year
+    first, last = first or this_year, max(last or this_year, this_year + 1)
+
+    cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    cursor.execute(f"""
+        CREATE TABLE {TARGET} (LIKE {SOURCE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+        PARTITION BY RANGE (play_date)
+    """)
+    cursor.execute(f"ALTER TABLE {TARGET} ADD PRIMARY KEY (id, play_date)")
+    partitions = ensure_partitions(cursor, TARGET, first, last)
+    for suffix, columns in INDEXES:
+        cursor.execute(f"CREATE INDEX idx_{TARGET}_{suffix} ON {TARGET} {columns}")
+    for column, reference, actions in FOREIGN_KEYS:
+        cursor.execute(f"ALTER TABLE {TARGET} ADD CONSTRAINT {TARGET}_{column}_fkey "
+                       f"FOREIGN KEY ({column}) REFERENCES {reference} {actions}")
+    get_watermark(conn, SCANNER)  # creates card_scan_state if needed
+    cursor.execute(MIRROR_FUNCTION)
+    cursor.execute(f"""
+        CREATE TRIGGER player_cards_mirror AFTER INSERT OR UPDATE OR DELETE ON {SOURCE}
+        FOR EACH ROW EXECUTE FUNCTION player_cards_mirror_to_part()
+    """)
+    set_watermark(cursor, SCANNER, 0)
+    conn.commit()
+    cursor.close()
+    print(f"[OK] Created {TARGET} with {partitions} yearly partitions ({first}-{last}) "
+          f"and {DEFAULT_PARTITION}; "
+          f"writes to {SOURCE} are now mirrored")
+
+
+def copy_rows(conn, batch: int) -> None:
+    cursor = conn.cursor()
+    if not table_exists(cursor, TARGET):
+        print("[ERROR] run --prepare first", file=sys.stderr)
+        sys.exit(1)
+    done = get_watermark(conn, SCANNER)
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {SOURCE}")
+    high = cursor.fetchone()[0]
+    conn.commit()
+
+    copied = 0
+    start = time.perf_counter()
+    while done < high:
+        upto = min(done + batch, high)
+        cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        cursor.execute(COPY_QUERY, (done, upto))
+        copied += cursor.rowcount
+        set_watermark(cursor, SCANNER, upto)
+        conn.commit()
+        done = upto
+        print(f"  copied ids up to {done} of {high}", end="\r")
+    cursor.close()
+    print()
+    print(f"[OK] Copied {copied} cards in {time.perf_counter() - start:.1f}s")
+
+
+def swap(conn) -> None:
+    cursor = conn.cursor()
+    if not table_exists(cursor, TARGET):
+        print("[ERROR] nothing to swap; run --prepare and --copy first", file=sys.stderr)
+        sys.exit(1)
+    done = get_watermark(conn, SCANNER)
+
+    start = time.perf_counter()
+    cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    cursor.execute(f"LOCK TABLE {SOURCE} IN ACCESS EXCLUSIVE MODE")
+    cursor.execute(COPY_QUERY.replace(" AND id <= %s", ""), (done,))
+    remaining = cursor.rowcount
+    cursor.execute(REFERENCING_QUERY, (SOURCE,))
+    references = cursor.fetchall()
+    for constraint, table, _, _ in references:
+        cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT {constraint}")
+    cursor.execute(f"DROP TRIGGER player_cards_mirror ON {SOURCE}")
+    cursor.execute("DROP FUNCTION player_cards_mirror_to_part()")
+    cursor.execute(f"ALTER TABLE {SOURCE} RENAME TO {OLD}")
+    cursor.execute(f"ALTER TABLE {TARGET} RENAME TO {SOURCE}")
+    cursor.execute(f"ALTER SEQUENCE player_cards_id_seq OWNED BY {SOURCE}.id")
+    for trigger, function, events in ROW_TRIGGERS:
+        cursor.execute("SELECT to_regproc(%s) IS NOT NULL", (function,))
+        if cursor.fetchone()[0]:
+            cursor.execute(f"CREATE TRIGGER {trigger} {events} ON {SOURCE} "
+                           f"FOR EACH ROW EXECUTE FUNCTION {function}()")
+    for constraint, table, column, on_delete in references:
+        if on_delete == "c":
+            cascade_card_deletes(cursor, table, column)
+        else:
+            print(f"[WARN] Dropped {table}.{constraint}; its cards are no longer checked")
+    with open(VIEW_SQL, "r", encoding="utf-8") as f:
+        cursor.execute(f.read())
+    cursor.execute("DELETE FROM card_scan_state WHERE scanner = %s", (SCANNER,))
+    conn.commit()
+    cursor.close()
+    print(f"[OK] Swapped in the partitioned table ({remaining} late rows copied, "
+          f"{len(references)} foreign keys to it dropped) "
+          f"in {time.perf_counter() - start:.2f}s; old table kept as {OLD}")
+
+
+def status(conn) -> None:
+    cursor = conn.cursor()
+    parent = SOURCE if is_partitioned(cursor, SOURCE) else TARGET
+    if not table_exists(cursor, parent):
+        print(f"{SOURCE} is not partitioned and no migration is in progress")
+        return
+    cursor.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), s.n_live_tup
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE i.inhparent = %s::regclass
+        ORDER BY c.relname
+    """, (parent,))
+    print(f"Partitions of {parent}:")
+    for name, bound, rows in cursor.fetchall():
+        print(f"  {name:<22} {rows or 0:>10} rows  {bound}")
+    if parent == TARGET:
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {SOURCE}")
+        print(f"Copy progress: ids up to {get_watermark(conn, SCANNER)} of {cursor.fetchone()[0]}")
+    cursor.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Partition player_cards by play_date year")
+    parser.add_argument("--prepare", action="store_true", help="Create the partitioned table")
+    parser.add_argument("--copy", action="store_true", help="Copy rows over in batches")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE,
+                        help=f"Card ids per transaction (default: {BATCH_SIZE})")
+    parser.add_argument("--swap", action="store_true", help="Swap the partitioned table in")
+    parser.add_argument("--drop-old", action="store_true", help=f"Drop {OLD}")
+    parser.add_argument("--add-years", type=int, metavar="N",
+                        help="Create partitions for the next N years")
+    parser.add_argument("--status", action="store_true", help="Show partitions and progress")
+    args = parser.parse_args()
+    if not (args.prepare or args.copy or args.swap or args.drop_old or args.add_years
+            or args.status):
+        parser.error("nothing to do")
+
+    conn = connect_to_db()
+    try:
+        if args.prepare:
+            prepare(conn)
+        if args.copy:
+            copy_rows(conn, args.batch)
+        if args.swap:
+            swap(conn)
+        if args.add_years:
+            cursor = conn.cursor()
+            parent = SOURCE if is_partitioned(cursor, SOURCE) else TARGET
+            this_year = date.today().year
+            created = ensure_partitions(cursor, parent, this_year, this_year + args.add_years)
+            conn.commit()
+            print(f"[OK] Created {created} partitions of {parent}")
+        if args.drop_old:
+            cursor = conn.cursor()
+            cursor.execute(f"DROP TABLE IF EXISTS {OLD}")
+            conn.commit()
+            print(f"[OK] Dropped {OLD}")
+        if args.status:
+            status(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
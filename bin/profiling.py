@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Lightweight phase timers for the CLI and batch jobs.
+
+    from profiling import add_profile_arguments, phase, profile_run
+
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with profile_run(args):
+        with phase("load"):
+            ...
+
+While profiling is off  phase()  costs one attribute check.  When it is on,
+each phase records its call count, total time and self time (total minus
+nested phases), and with --tracemalloc the memory it allocated.  A psycopg2
+connection passed to  instrument()  times every execute / copy as its own
+"query: <sql>" phase and every fetch as "fetch" (connect_to_db() in
+handicap_calculator.py does this when profiling is on).
+
+Callables in  profiler.observers  are called with (phase, seconds) for every
+phase even while profiling is off (metrics.py histograms use this).
+
+--profile [text|json]  prints the breakdown to stderr (or --profile-out FILE)
+--cprofile FILE        also runs cProfile and saves the pstats to FILE
+--tracemalloc          also traces allocations per phase and the top sites
+
+Requires:  nothing beyond the standard library
+"""
+from __future__ import annotations
+
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+TOP = 15
+LABEL_LENGTH = 60
+
+
+class Profiler:
+    """Phase timings of one run; see the module docstring."""
+
+    def __init__(self):
+        self.enabled = False
+        self.observers = []
+        self.memory = False
+        self.cprofile = None
+        self.phases = {}
+        self.stack = []
+        self.started = 0.0
+        self.elapsed = 0.0
+
+    def start(self, cprofile=False, memory=False):
+        self.enabled = True
+        self.phases = {}
+        self.stack = []
+        self.memory = memory
+        if memory:
+            import tracemalloc
+            tracemalloc.start()
+        if cprofile:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.elapsed = time.perf_counter() - self.started
+        if self.cprofile:
+            self.cprofile.disable()
+        self.enabled = False
+
+    @property
+    def active(self):
+        """Whether phases are being timed (for profiling or observers)."""
+        return self.enabled or bool(self.observers)
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            if not self.observers:
+                yield
+                return
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                for observer in self.observers:
+                    observer(name, time.perf_counter() - start)
+            return
+        frame = [name, 0.0]  # name, time spent in nested phases
+        self.stack.append(frame)
+        memory = self._allocated() if self.memory else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stack.pop()
+            if self.stack:
+                self.stack[-1][1] += elapsed
+            stats = self.phases.setdefault(name, {"calls": 0, "seconds": 0.0, "self_seconds": 0.0,
+                                                  "allocated_bytes": 0})
+            stats["calls"] += 1
+            stats["seconds"] += elapsed
+            stats["self_seconds"] += elapsed - frame[1]
+            if self.memory:
+                stats["allocated_bytes"] += self._allocated() - memory
+            for observer in self.observers:
+                observer(name, elapsed)
+
+    def _allocated(self):
+        import tracemalloc
+        return tracemalloc.get_traced_memory()[0]
+
+    def report(self):
+        """The breakdown as a JSON-ready dict (call after stop())."""
+        phases = dict(sorted(self.phases.items(), key=lambda item: -item[1]["self_seconds"]))
+        covered = sum(stats["self_seconds"] for stats in phases.values())
+        result = {"total_seconds": self.elapsed, "unaccounted_seconds": self.elapsed - covered,
+                  "phases": phases}
+
+        if self.memory:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            sites = tracemalloc.take_snapshot().statistics("lineno")[:TOP]
+            tracemalloc.stop()
+            result["memory"] = {"current_bytes": current, "peak_bytes": peak, "top_sites": [
+                {"site": str(stat.traceback[0]), "bytes": stat.size, "blocks": stat.count}
+                for stat in sites]}
+        else:
+            for stats in phases.values():
+                del stats["allocated_bytes"]
+
+        if self.cprofile:
+            import pstats
+            stats = pstats.Stats(self.cprofile)
+            functions = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:TOP]
+            result["functions"] = [
+                {"function": f"{file}:{line}({name})", "calls": calls,
+                 "seconds": cumulative, "self_seconds": own}
+                for (file, line, name), (_, calls, own, cumulative, _) in functions]
+        return result
+
+
+def format_text(report):
+    lines = [f"total {report['total_seconds'] * 1000:.1f} ms "
+             f"({report['unaccounted_seconds'] * 1000:.1f} ms outside any phase)",
+             f"{'self ms':>10} {'total ms':>10} {'calls':>6}  phase"]
+    for name, stats in report["phases"].items():
+        memory = f"  {stats['allocated_bytes'] / 1e6:+.1f} MB" if "allocated_bytes" in stats else ""
+        lines.append(f"{stats['self_seconds'] * 1000:10.1f} {stats['seconds'] * 1000:10.1f} "
+                     f"{stats['calls']:6d}  {name}{memory}")
+    if "memory" in report:
+        memory = report["memory"]
+        lines.append(f"memory: {memory['current_bytes'] / 1e6:.1f} MB traced now, "
+                     f"{memory['peak_bytes'] / 1e6:.1f} MB peak; top sites:")
+        lines += [f"  {site['bytes'] / 1e6:8.2f} MB  {site['site']}" for site in memory["top_sites"]]
+    if "functions" in report:
+        lines.append("cProfile, by cumulative time:")
+        lines += [f"  {f['seconds'] * 1000:10.1f} ms {f['calls']:8d}  {f['function']}"
+                  for f in report["functions"]]
+    return "\n".join(lines)
+
+
+profiler = Profiler()
+phase = profiler.phase
+
+
+def query_label(query):
+    text = query.decode() if isinstance(query, bytes) else str(query)
+    return "query: " + " ".join(text.split())[:LABEL_LENGTH]
+
+
+_cursor_class = None
+
+
+def instrument(conn):
+    """Time every execute/copy/fetch of cursors opened on a psycopg2 connection."""
+    global _cursor_class
+    if _cursor_class is None:
+        import psycopg2.extensions
+
+        class ProfiledCursor(psycopg2.extensions.cursor):
+            def execute(self, query, vars=None):
+                with phase(query_label(query)):
+                    return super().execute(query, vars)
+
+            def executemany(self, query, vars_list):
+                with phase(query_label(query)):
+                    return super().executemany(query, vars_list)
+
+            def copy_expert(self, sql, file, size=8192):
+                with phase(query_label(sql)):
+                    return super().copy_expert(sql, file, size)
+
+            def fetchone(self):
+                with phase("fetch"):
+                    return super().fetchone()
+
+            def fetchmany(self, size=None):
+                with phase("fetch"):
+                    return super().fetchmany(self.arraysize if size is None else size)
+
+            def fetchall(self):
+                with phase("fetch"):
+                    return super().fetchall()
+
+        _cursor_class = ProfiledCursor
+    conn.cursor_factory = _cursor_class
+    return conn
+
+
+def add_profile_arguments(parser):
+    group = parser.add_argument_group("profiling")
+    group.add_argument("--profile", nargs="?", const="text", choices=["text", "json"],
+                       help="Print a per-phase timing breakdown (default: text)")
+    group.add_argument("--profile-out", metavar="FILE",
+                       help="Write the breakdown to FILE instead of stderr")
+    group.add_argument("--cprofile", metavar="FILE",
+                       help="Also run cProfile and save its stats to FILE")
+    group.add_argument("--tracemalloc", action="store_true",
+                       help="Also trace memory allocated per phase")
+
+
+@contextmanager
+def profile_run(args):
+    """Profile the block if any profiling option of add_profile_arguments was given."""
+    fmt = args.profile or ("text" if args.cprofile or args.tracemalloc else None)
+    if fmt is None:
+        yield
+        return
+    profiler.start(cprofile=bool(args.cprofile), memory=args.tracemalloc)
+    try:
+        yield
+    finally:
+        profiler.stop()
+        if args.cprofile:
+            profiler.cprofile.dump_stats(args.cprofile)
+        report = profiler.report()
+        text = json.dumps(report, indent=2) if fmt == "json" else format_text(report)
+        if args.profile_out:
+            with open(args.profile_out, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+        else:
+            print(text, file=sys.stderr)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Report which statements dominate database time, from pg_stat_statements.
+
+Take a snapshot of pg_stat_statements before and after a workload (a load
+test, a batch job, a day of traffic), then diff them: counters are
+subtracted per statement, statements whose text differs only in literals,
+IN-lists or VALUES rows are grouped, and the groups are ranked by total time
+(or mean time, calls, rows, shared buffer hits or reads).  The ranking is
+printed as a table and can be written as JSON.
+
+  --snapshot FILE          save the current counters
+  --diff BEFORE AFTER      report the difference of two snapshots
+  --run "COMMAND"          snapshot, run COMMAND, snapshot and report
+  --reset                  zero the counters (pg_stat_statements_reset)
+
+Only statements of the current database are included (--all-databases for
+every one).  pg_stat_statements needs
+    shared_preload_libraries = 'pg_stat_statements'
+(set for the db service in docker-compose.yml); the extension itself is
+created on first use.
+
+Usage:
+    python3 query_report.py --snapshot before.json
+    python3 query_report.py --diff before.json after.json [--sort mean] [--top 20] [--json out.json]
+    python3 query_report.py --run "python3 bench_handicap.py --sizes 10000 --skip-load"
+
+Requires:  psycopg2
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import psycopg2
+
+from handicap_calculator import connect_to_db
+
+# Counters summed per group; name in the report -> column(s) in pg_stat_statements
+# (first one present wins: PG 13 renamed total_time to total_exec_time)
+COUNTERS = {
+    "calls": ["calls"],
+    "total_ms": ["total_exec_time", "total_time"],
+    "rows": ["rows"],
+    "shared_hit": ["shared_blks_hit"],
+    "shared_read": ["shared_blks_read"],
+    "temp_written": ["temp_blks_written"],
+}
+SORT_KEYS = {
+    "total": "total_ms",
+    "mean": "mean_ms",
+    "calls": "calls",
+    "rows": "rows",
+    "hits": "shared_hit",
+    "reads": "shared_read",
+}
+QUERY_WIDTH = 70
+
+
+def ensure_extension(conn) -> None:
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT to_regclass('pg_stat_statements') IS NOT NULL")
+        if not cursor.fetchone()[0]:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_stat_statements")
+        cursor.execute("SELECT 1 FROM pg_stat_statements LIMIT 1")
+        conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"[ERROR] pg_stat_statements is not available: {e}".rstrip(), file=sys.stderr)
+        print("        add shared_preload_libraries = 'pg_stat_statements' and restart",
+              file=sys.stderr)
+        sys.exit(1)
+    finally:
+        cursor.close()
+
+
+def take_snapshot(conn, all_databases: bool = False) -> dict:
+    """The counters of every statement, keyed by userid:dbid:queryid."""
+    ensure_extension(conn)
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM pg_stat_statements LIMIT 0")
+    present = {column.name for column in cursor.description}
+    columns = {name: next(c for c in choices if c in present)
+               for name, choices in COUNTERS.items() if any(c in present for c in choices)}
+    select = ", ".join(f"{column} AS {name}" for name, column in columns.items())
+    where = "" if all_databases else \
+        " WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())"
+    cursor.execute(f"SELECT userid, dbid, queryid, query, {select} FROM pg_stat_statements{where}")
+    statements = {}
+    for userid, dbid, queryid, query, *values in cursor.fetchall():
+        key = f"{userid}:{dbid}:{queryid}"
+        counters = {name: float(value or 0) for name, value in zip(columns, values)}
+        if key in statements:  # same statement at top level and nested
+            for name, value in counters.items():
+                statements[key][name] += value
+        else:
+            statements[key] = {"query": query or "", **counters}
+    cursor.close()
+    return {"taken_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "statements": statements}
+
+
+def normalize(query: str) -> str:
+    """Group key of a statement: literals, IN-lists and VALUES rows collapsed."""
+    text = re.sub(r"--[^\n]*", " ", query)
+    text = " ".join(text.split())
+    text = re.sub(r"'(?:[^']|'')*'", "?", text)
+    text = re.sub(r"\$\d+|\b\d+(?:\.\d+)?\b", "?", text)
+    text = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(...)", text)
+    text = re.sub(r"(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+", r"\1", text, flags=re.I)
+    return text
+
+
+def diff(before: dict, after: dict) -> List[dict]:
+    """Grouped counter deltas between two snapshots, unsorted."""
+    groups: Dict[str, dict] = {}
+    old = before["statements"]
+    for key, stats in after["statements"].items():
+        previous = old.get(key)
+        # a statement evicted and re-added, or a reset, starts from zero again
+        if previous and previous.get("calls", 0) <= stats.get("calls", 0):
+            delta = {name: stats[name] - previous.get(name, 0) for name in COUNTERS if name in stats}
+        else:
+            delta = {name: stats[name] for name in COUNTERS if name in stats}
+        if not delta.get("calls"):
+            continue
+        group = groups.setdefault(normalize(stats["query"]), {
+            "query": normalize(stats["query"]), "example": stats["query"], "statements": 0,
+            **{name: 0.0 for name in delta}})
+        group["statements"] += 1
+        for name, value in delta.items():
+            group[name] = group.get(name, 0.0) + value
+
+    total_ms = sum(group.get("total_ms", 0) for group in groups.values()) or 1.0
+    for group in groups.values():
+        group["calls"] = int(group["calls"])
+        group["mean_ms"] = group.get("total_ms", 0) / group["calls"]
+        group["share"] = group.get("total_ms", 0) / total_ms
+        hits, reads = group.get("shared_hit", 0), group.get("shared_read", 0)
+        group["hit_ratio"] = hits / (hits + reads) if hits + reads else None
+    return list(groups.values())
+
+
+def print_table(groups: List[dict], top: int) -> None:
+    print(f"{'total ms':>11} {'share':>6} {'calls':>8} {'mean ms':>9} {'rows':>9} "
+          f"{'hit %':>6}  query")
+    for group in groups[:top]:
+        hit = "" if group["hit_ratio"] is None else f"{group['hit_ratio'] * 100:.1f}"
+        query = group["query"]
+        if len(query) > QUERY_WIDTH:
+            query = query[:QUERY_WIDTH - 3] + "..."
+        print(f"{group.get('total_ms', 0):11.1f} {group['share'] * 100:5.1f}% {group['calls']:8d} "
+              f"{group['mean_ms']:9.3f} {int(group.get('rows', 0)):9d} {hit:>6}  {query}")
+    rest = groups[top:]
+    if rest:
+        print(f"... {len(rest)} more groups, {sum(g['share'] for g in rest) * 100:.1f}% of the time")
+
+
+def report(before: dict, after: dict, sort: str, top: int, json_path: str | None) -> None:
+    groups = sorted(diff(before, after), key=lambda g: g.get(SORT_KEYS[sort], 0), reverse=True)
+    print(f"pg_stat_statements from {before['taken_at']} to {after['taken_at']}, "
+          f"{len(groups)} statement groups by {sort}")
+    print_table(groups, top)
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"from": before["taken_at"], "to": after["taken_at"], "sort": sort,
+                       "groups": groups}, f, indent=2)
+        print(f"[OK] Wrote {json_path}")
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rank statements by database time")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--snapshot", metavar="FILE", help="Save the current counters to FILE")
+    action.add_argument("--diff", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two snapshots")
+    action.add_argument("--run", metavar="COMMAND", help="Report on the statements COMMAND runs")
+    action.add_argument("--reset", action="store_true", help="Zero the counters")
+    parser.add_argument("--sort", choices=list(SORT_KEYS), default="total",
+                        help="Rank by (default: total)")
+    parser.add_argument("--top", type=int, default=20, help="Groups to show (default: 20)")
+    parser.add_argument("--json", metavar="FILE", help="Also write the report as JSON")
+    parser.add_argument("--all-databases", action="store_true",
+                        help="Include statements of every database")
+    args = parser.parse_args()
+
+    if args.diff:
+        report(load(args.diff[0]), load(args.diff[1]), args.sort, args.top, args.json)
+        return
+
+    conn = connect_to_db()
+    try:
+        if args.reset:
+            ensure_extension(conn)
+            cursor = conn.cursor()
+            cursor.execute("SELECT pg_stat_statements_reset()")
+            conn.commit()
+            print("[OK] pg_stat_statements reset")
+        elif args.snapshot:
+            snapshot = take_snapshot(conn, args.all_databases)
+            with open(args.snapshot, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            print(f"[OK] {len(snapshot['statements'])} statements saved to {args.snapshot}")
+        else:
+            before = take_snapshot(conn, args.all_databases)
+            start = time.perf_counter()
+            result = subprocess.run(args.run, shell=True)
+            print(f"[OK] Workload exited with {result.returncode} "
+                  f"after {time.perf_counter() - start:.1f}s")
+            report(before, take_snapshot(conn, args.all_databases), args.sort, args.top, args.json)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
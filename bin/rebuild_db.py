@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Parallel database rebuild.
+
+utils/REBUILD_TABLES runs the backend/db/*.sh scripts one after the other;
+each drops and creates its table, builds its indexes and foreign keys, and
+only then  \\copy's  its CSV, so every row pays for index maintenance and
+FK checks and nothing overlaps.  This tool reads the same SQL files (in the
+order REBUILD_TABLES lists their scripts) and runs them as a plan:
+
+  1. scripts without tables of their own that come before the first table
+     file (grants, roles), as they are
+  2. schema: DROP / CREATE TABLE of every table file, without secondary
+     indexes and foreign keys, in FK dependency order
+  3. load: one worker and connection per table file, up to --jobs at once;
+     INSERTs and  COPY FROM STDIN  of the CSV the \\copy names, the
+     statements that follow the \\copy, then the file's CREATE INDEXes
+  4. foreign keys (inline REFERENCES, FOREIGN KEY clauses and ALTER TABLE
+     ... ADD CONSTRAINT ... FOREIGN KEY), in dependency order
+  5. the remaining scripts (triggers, caches, views) in their listed order
+  6. ANALYZE
+
+The FK graph comes from the REFERENCES clauses of the files; a cycle is an
+error.  Primary keys and UNIQUE constraints stay inline because the
+foreign keys need them.
+
+Run it on an empty database (REBUILD_TABLES --parallel wipes first).
+
+Usage:
+    python3 rebuild_db.py [--jobs 8] [--plan]
+
+Requires:  psycopg2
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Set, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.environ.get("ROOT_DIR", os.path.dirname(SCRIPT_DIR))
+DB_DIR = os.path.join(ROOT_DIR, "backend", "db")
+REBUILD_SCRIPT = os.path.join(ROOT_DIR, "utils", "REBUILD_TABLES")
+# Scripts REBUILD_TABLES runs that are not SQL files
+SKIP_SCRIPTS = {"wipe.sh"}
+
+SCRIPT_RE = re.compile(r"^\s*\$\{ROOT_DIR\}/backend/db/(\S+\.sh)", re.MULTILINE)
+SQL_REF_RE = re.compile(r"backend/db/sql/(\S+?\.sql)")
+CREATE_TABLE_RE = re.compile(r"^CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s*\((.*)\)\s*$",
+                             re.IGNORECASE | re.DOTALL)
+REFERENCES_RE = re.compile(r"\bREFERENCES\s+(\w+)\s*(\([^)]*\))?(.*)$", re.IGNORECASE | re.DOTALL)
+TABLE_FK_RE = re.compile(r"^(?:CONSTRAINT\s+\w+\s+)?FOREIGN\s+KEY\s*\(([^)]*)\)\s*(REFERENCES\b.*)$",
+                         re.IGNORECASE | re.DOTALL)
+ALTER_FK_RE = re.compile(r"^ALTER\s+TABLE\s+(\w+)\s+ADD\s+CONSTRAINT\s+\w+\s+FOREIGN\s+KEY\b.*"
+                         r"\bREFERENCES\s+(\w+)", re.IGNORECASE | re.DOTALL)
+COPY_RE = re.compile(r"^\\copy\s+(\w+)\s*(\([^)]*\))?\s+FROM\s+'([^']+)'\s*(.*?);?\s*$",
+                     re.IGNORECASE | re.DOTALL)
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split a psql script into statements; psql meta-commands are one line each."""
+    statements: List[str] = []
+    current: List[str] = []
+    i, n = 0, len(sql)
+    at_line_start = True
+    while i < n:
+        ch = sql[i]
+        if at_line_start and ch == "\\" and not "".join(current).strip():
+            end = sql.find("\n", i)
+            end = n if end < 0 else end
+            statements.append(sql[i:end].strip())
+            current, i = [], end
+            continue
+        if ch == "-" and sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        if ch == "/" and sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            continue
+        if ch in ("'", '"'):
+            end = i + 1
+            while end < n:
+                if sql[end] == ch:
+                    if end + 1 < n and sql[end + 1] == ch:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            current.append(sql[i:end + 1])
+            i = end + 1
+            continue
+        if ch == "$":
+            tag = re.match(r"\$\w*\$", sql[i:])
+            if tag:
+                end = sql.find(tag.group(0), i + len(tag.group(0)))
+                end = n if end < 0 else end + len(tag.group(0))
+                current.append(sql[i:end])
+                i = end
+                continue
+        if ch == ";":
+            statement = "".join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+            i += 1
+            at_line_start = False
+            continue
+        current.append(ch)
+        if ch == "\n":
+            at_line_start = True
+        elif not ch.isspace():
+            at_line_start = False
+        i += 1
+    statement = "".join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def _split_top_level(body: str) -> List[str]:
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(body):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(body[start:i].strip())
+            start = i + 1
+    parts.append(body[start:].strip())
+    return [p for p in parts if p]
+
+
+class TableFile:
+    """One SQL file that creates and loads tables, split into phases."""
+
+    def __init__(self, path: str, csv_dir: str) -> None:
+        self.path = path
+        self.name = os.path.basename(path)
+        self.session: List[str] = []     # SET ...
+        self.schema: List[str] = []      # DROP / CREATE TABLE / extensions
+        self.load: List[tuple] = []      # ("sql", stmt) or ("copy", table, columns, csv, options)
+        self.indexes: List[str] = []
+        self.foreign_keys: List[Tuple[str, str, str]] = []  # (table, referenced, statement)
+        self.tables: List[str] = []
+        copied = False
+        with open(path, "r", encoding="utf-8") as f:
+            statements = split_statements(f.read())
+        for stmt in statements:
+            head = stmt.split(None, 2)[:2]
+            keyword = " ".join(head).upper()
+            copy = COPY_RE.match(stmt)
+            if copy:
+                table, columns, source, options = copy.groups()
+                csv_path = os.path.join(csv_dir, os.path.basename(source))
+                self.load.append(("copy", table, columns or "", csv_path, options.strip()))
+                copied = True
+            elif keyword.startswith("SET "):
+                self.session.append(stmt)
+            elif keyword.startswith("CREATE TABLE"):
+                self.schema.append(self._strip_foreign_keys(stmt))
+            elif keyword.startswith("CREATE INDEX") or keyword.startswith("CREATE UNIQUE"):
+                self.indexes.append(stmt)
+            elif ALTER_FK_RE.match(stmt):
+                table, referenced = ALTER_FK_RE.match(stmt).groups()
+                self.foreign_keys.append((table, referenced, stmt))
+            elif keyword.startswith(("DROP ", "CREATE EXTENSION", "GRANT", "ALTER DEFAULT")) \
+                    and not copied:
+                self.schema.append(stmt)
+            else:
+                self.load.append(("sql", stmt))
+
+    def _strip_foreign_keys(self, stmt: str) -> str:
+        """Move inline REFERENCES of a CREATE TABLE into deferred ALTER TABLEs."""
+        match = CREATE_TABLE_RE.match(stmt)
+        if not match:
+            return stmt
+        table, body = match.groups()
+        self.tables.append(table)
+        kept = []
+        for part in _split_top_level(body):
+            fk = TABLE_FK_RE.match(part)
+            if fk:
+                columns, reference = fk.groups()
+                referenced = REFERENCES_RE.search(reference).group(1)
+                self.foreign_keys.append((table, referenced, f"ALTER TABLE {table} ADD "
+                                          f"FOREIGN KEY ({columns}) {reference}"))
+                continue
+            ref = REFERENCES_RE.search(part)
+            if ref:
+                column = part.split()[0]
+                self.foreign_keys.append((table, ref.group(1), f"ALTER TABLE {table} ADD "
+                                          f"FOREIGN KEY ({column}) {ref.group(0)}"))
+                part = part[:ref.start()].rstrip()
+            kept.append(part)
+        prefix = stmt[:stmt.index("(")]
+        return prefix + "(\n    " + ",\n    ".join(kept) + "\n)"
+
+    @property
+    def depends_on(self) -> Set[str]:
+        return {ref for table, ref, _ in self.foreign_keys if ref not in self.tables}
+
+
+def listed_sql_files(rebuild_script: str) -> List[str]:
+    """SQL files in the order REBUILD_TABLES runs their scripts (no repeats)."""
+    with open(rebuild_script, "r", encoding="utf-8") as f:
+        scripts = [s for s in SCRIPT_RE.findall(f.read()) if s not in SKIP_SCRIPTS]
+    files: List[str] = []
+    for script in scripts:
+        with open(os.path.join(DB_DIR, script), "r", encoding="utf-8") as f:
+            ref = SQL_REF_RE.search(f.read())
+        if ref and ref.group(1) not in files:
+            files.append(ref.group(1))
+    return files
+
+
+def dependency_levels(table_files: List[TableFile]) -> List[List[TableFile]]:
+    """Group table files so each only references tables of earlier levels."""
+    owner = {table: tf for tf in table_files for table in tf.tables}
+    pending = list(table_files)
+    done: Set[str] = set()
+    levels = []
+    while pending:
+        ready = [tf for tf in pending
+                 if all(dep in done or dep not in owner for dep in tf.depends_on)]
+        if not ready:
+            names = ", ".join(tf.name for tf in pending)
+            raise ValueError(f"foreign key cycle between {names}")
+        levels.append(ready)
+        for tf in ready:
+            done.update(tf.tables)
+            pending.remove(tf)
+    return levels
+
+
+def build_plan(csv_dir: str) -> dict:
+    sql_dir = os.path.join(DB_DIR, "sql")
+    before, table_files, after = [], [], []
+    for name in listed_sql_files(REBUILD_SCRIPT):
+        path = os.path.join(sql_dir, name)
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        is_table_file = re.search(r"^\s*CREATE\s+TABLE", text, re.IGNORECASE | re.MULTILINE) and \
+            not re.search(r"CREATE\s+(OR\s+REPLACE\s+)?(FUNCTION|TRIGGER|VIEW)", text, re.IGNORECASE)
+        if is_table_file:
+            table_files.append(TableFile(path, csv_dir))
+        elif table_files:
+            after.append(path)
+        else:
+            before.append(path)
+    return {"before": before, "levels": dependency_levels(table_files), "after": after}
+
+
+def _connect():
+    from handicap_calculator import connect_to_db
+    return connect_to_db()
+
+
+def _run_script(conn, path: str) -> None:
+    with open(path, "r", encoding="utf-8") as f:
+        statements = split_statements(f.read())
+    cursor = conn.cursor()
+    for stmt in statements:
+        if stmt.startswith("\\"):
+            raise ValueError(f"{path}: psql meta-command outside a table file: {stmt}")
+        cursor.execute(stmt)
+    conn.commit()
+    cursor.close()
+
+
+def load_table_file(tf: TableFile) -> Tuple[str, float, int]:
+    """Worker: load one file's data, then build its indexes."""
+    start = time.perf_counter()
+    rows = 0
+    conn = _connect()
+    try:
+        cursor = conn.cursor()
+        for stmt in tf.session:
+            cursor.execute(stmt)
+        for step in tf.load:
+            if step[0] == "copy":
+                _, table, columns, csv_path, options = step
+                with open(csv_path, "r", encoding="utf-8") as f:
+                    cursor.copy_expert(f"COPY {table} {columns} FROM STDIN {options}", f)
+                rows += cursor.rowcount
+            else:
+                cursor.execute(step[1])
+        for stmt in tf.indexes:
+            cursor.execute(stmt)
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    return tf.name, time.perf_counter() - start, rows
+
+
+def print_plan(plan: dict) -> None:
+    for path in plan["before"]:
+        print(f"before   {os.path.basename(path)}")
+    for depth, level in enumerate(plan["levels"]):
+        for tf in level:
+            print(f"level {depth}  {tf.name}: tables {', '.join(tf.tables)}; "
+                  f"{sum(1 for s in tf.load if s[0] == 'copy')} COPY, {len(tf.indexes)} indexes, "
+                  f"{len(tf.foreign_keys)} FKs"
+                  + (f"; references {', '.join(sorted(tf.depends_on))}" if tf.depends_on else ""))
+    for path in plan["after"]:
+        print(f"after    {os.path.basename(path)}")
+
+
+def rebuild(plan: dict, jobs: int) -> None:
+    timings = []
+    total = time.perf_counter()
+    conn = _connect()
+    try:
+        start = time.perf_counter()
+        for path in plan["before"]:
+            _run_script(conn, path)
+        cursor = conn.cursor()
+        for level in plan["levels"]:
+            for tf in level:
+                for stmt in tf.session + tf.schema:
+                    cursor.execute(stmt)
+        conn.commit()
+        timings.append(("schema", time.perf_counter() - start))
+
+        start = time.perf_counter()
+        table_files = [tf for level in plan["levels"] for tf in level]
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(load_table_file, tf) for tf in table_files]
+            for future in as_completed(futures):
+                name, seconds, rows = future.result()
+                print(f"  loaded {name}: {rows} rows in {seconds:.2f}s")
+        timings.append(("load + indexes", time.perf_counter() - start))
+
+        start = time.perf_counter()
+        for level in plan["levels"]:
+            for tf in level:
+                for _, _, stmt in tf.foreign_keys:
+                    cursor.execute(stmt)
+        conn.commit()
+        timings.append(("foreign keys", time.perf_counter() - start))
+
+        start = time.perf_counter()
+        for path in plan["after"]:
+            _run_script(conn, path)
+        timings.append(("triggers, caches, views", time.perf_counter() - start))
+
+        start = time.perf_counter()
+        conn.autocommit = True
+        cursor.execute("ANALYZE")
+        timings.append(("analyze", time.perf_counter() - start))
+        cursor.close()
+    finally:
+        conn.close()
+
+    for step, seconds in timings:
+        print(f"{step:<26} {seconds:>8.2f}s")
+    print(f"[OK] Database rebuilt in {time.perf_counter() - total:.2f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the database tables in parallel")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 4,
+                        help="Tables loaded at once (default: CPU count)")
+    parser.add_argument("--csv-dir", type=str, default=os.path.join(DB_DIR, "csv"),
+                        help="Directory of the seed CSV files")
+    parser.add_argument("--plan", action="store_true", help="Print the plan and exit")
+    args = parser.parse_args()
+
+    try:
+        plan = build_plan(args.csv_dir)
+    except ValueError as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        sys.exit(1)
+    if args.plan:
+        print_plan(plan)
+        return
+    rebuild(plan, args.jobs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Record and replay HTTP traffic against a local stack.
+
+A capture is JSONL, one request per line:
+
+    {"timestamp": "2026-10-19T08:00:00.123Z", "method": "GET",
+     "path": "/api/player-cards?page=2", "body": null,
+     "status": 200, "latency_ms": 12.5}
+
+timestamp is ISO 8601 or Unix seconds; body (JSON or text), status and
+latency_ms are optional -- status and latency_ms are the recording the
+replay is compared with.  endpoints.csv from utils/crawl.py (URL, Response
+Code) is read as a capture of GETs without timing.
+
+The requests are sent from an asyncio aiohttp client pool at the recorded
+pace (--speed 1), N times faster (--speed N) or as fast as the pool allows
+(--speed 0).  Latency is measured from when a request was due, so a stack
+that falls behind is not hidden by the client waiting for it; "lag" is how
+late requests were sent.  The report groups requests by method and path
+(numbers replaced by :id) and compares status codes and latency percentiles
+with the recording.
+
+--save FILE writes the replay itself as a capture (a baseline for the next
+run); --from-log turns the backend's request log (the
+"<ISO time> - GET /api/..." lines of  docker compose logs backend ) into a
+capture without status or latency.
+
+Usage:
+    python3 replay_traffic.py CAPTURE.jsonl [--base http://localhost:4000] [--speed 2]
+                              [--concurrency 64] [--header "Authorization: Bearer ..."]
+                              [--limit N] [--save replay.jsonl] [--json report.json]
+    python3 replay_traffic.py endpoints.csv --base https://libronico.com --speed 0
+    python3 replay_traffic.py --from-log backend.log capture.jsonl
+
+Requires:  aiohttp
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import json
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+BASE_URL = "http://localhost:4000"
+TIMEOUT = 30.0
+PATH_WIDTH = 50
+LOG_LINE = re.compile(r"(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?Z) - ([A-Z]+) (\S+)")
+NUMBER = re.compile(r"(?<=/)\d+(?=/|$|\?)")
+
+
+def parse_time(value) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def relative_path(url: str) -> str:
+    parts = urlsplit(url)
+    return (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+
+def load_capture(path: str) -> List[dict]:
+    """Requests of a JSONL capture or an endpoints.csv, in timestamp order."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(f):
+                code = row.get("Response Code", "")
+                records.append({"method": "GET", "path": relative_path(row["URL"]),
+                                "status": int(code) if code.isdigit() else None})
+        else:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"[WARN] {path}:{number}: {e}", file=sys.stderr)
+                    continue
+                if "path" not in record and "url" not in record:
+                    print(f"[WARN] {path}:{number}: no path", file=sys.stderr)
+                    continue
+                record["path"] = relative_path(record.get("path") or record["url"])
+                record["method"] = record.get("method", "GET").upper()
+                records.append(record)
+    for record in records:
+        record["at"] = parse_time(record.get("timestamp"))
+    if all(record["at"] is not None for record in records):
+        records.sort(key=lambda record: record["at"])
+    return records
+
+
+def from_log(log_path: str, capture_path: str) -> None:
+    count = 0
+    with open(log_path, encoding="utf-8", errors="replace") as f, \
+            open(capture_path, "w", encoding="utf-8") as out:
+        for line in f:
+            match = LOG_LINE.search(line)
+            if match:
+                out.write(json.dumps({"timestamp": match[1], "method": match[2],
+                                      "path": match[3]}) + "\n")
+                count += 1
+    print(f"[OK] {count} requests written to {capture_path}")
+
+
+def endpoint(record: dict) -> str:
+    return f"{record['method']} {NUMBER.sub(':id', record['path'].split('?')[0])}"
+
+
+async def send(session, base: str, record: dict, due: float, timeout: float) -> dict:
+    body = record.get("body")
+    kwargs = {"json": body} if isinstance(body, (dict, list)) else {"data": body}
+    sent = time.perf_counter()
+    try:
+        async with session.request(record["method"], base + record["path"],
+                                   timeout=aiohttp.ClientTimeout(total=timeout), **kwargs) as response:
+            await response.read()
+            status = response.status
+    except asyncio.TimeoutError:
+        status = "timeout"
+    except aiohttp.ClientError as e:
+        status = type(e).__name__
+    done = time.perf_counter()
+    return {"latency_ms": (done - due) * 1000, "lag_ms": (sent - due) * 1000, "status": status}
+
+
+async def replay(records: List[dict], base: str, speed: float, concurrency: int,
+                 headers: Dict[str, str], timeout: float) -> List[dict]:
+    """Send every record on its schedule; the results in the same order."""
+    first = next((record["at"] for record in records if record["at"] is not None), None)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, headers=headers) as session:
+        limit = asyncio.Semaphore(concurrency)
+        start = time.perf_counter()
+
+        async def scheduled(record):
+            if speed and first is not None and record["at"] is not None:
+                due = start + (record["at"] - first) / speed
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            else:
+                due = time.perf_counter()
+            async with limit:
+                return await send(session, base, record, due, timeout)
+
+        results = await asyncio.gather(*(scheduled(record) for record in records))
+    elapsed = time.perf_counter() - start
+    print(f"[OK] {len(records)} requests replayed in {elapsed:.1f}s "
+          f"({len(records) / elapsed if elapsed else 0:.1f}/s)")
+    return results
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(records: List[dict], results: List[dict]) -> dict:
+    groups: Dict[str, dict] = {}
+    for record, result in zip(records, results):
+        group = groups.setdefault(endpoint(record), {
+            "requests": 0, "status_mismatches": 0, "statuses": Counter(),
+            "recorded_ms": [], "replayed_ms": [], "lag_ms": []})
+        group["requests"] += 1
+        group["statuses"][str(result["status"])] += 1
+        if record.get("status") is not None and record["status"] != result["status"]:
+            group["status_mismatches"] += 1
+        if record.get("latency_ms") is not None:
+            group["recorded_ms"].append(float(record["latency_ms"]))
+        group["replayed_ms"].append(result["latency_ms"])
+        group["lag_ms"].append(result["lag_ms"])
+
+    report = {}
+    for name, group in sorted(groups.items(), key=lambda item: -item[1]["requests"]):
+        entry = {"requests": group["requests"], "status_mismatches": group["status_mismatches"],
+                 "statuses": dict(group["statuses"])}
+        for series in ("recorded_ms", "replayed_ms", "lag_ms"):
+            entry[series] = {f"p{int(q * 100)}": percentile(group[series], q)
+                             for q in (0.5, 0.9, 0.99)}
+        report[name] = entry
+    return report
+
+
+def milliseconds(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def print_report(report: dict) -> None:
+    print(f"{'requests':>8} {'mismatch':>8} {'rec p50':>8} {'p50':>8} {'rec p99':>8} "
+          f"{'p99':>8} {'lag p99':>8}  endpoint (statuses)")
+    for name, entry in report.items():
+        recorded, replayed = entry["recorded_ms"], entry["replayed_ms"]
+        statuses = ", ".join(f"{status}: {count}" for status, count in sorted(entry["statuses"].items()))
+        if len(name) > PATH_WIDTH:
+            name = name[:PATH_WIDTH - 3] + "..."
+        print(f"{entry['requests']:8d} {entry['status_mismatches']:8d} "
+              f"{milliseconds(recorded['p50']):>8} {milliseconds(replayed['p50']):>8} "
+              f"{milliseconds(recorded['p99']):>8} {milliseconds(replayed['p99']):>8} "
+              f"{milliseconds(entry['lag_ms']['p99']):>8}  {name} ({statuses})")
+    mismatches = sum(entry["status_mismatches"] for entry in report.values())
+    if mismatches:
+        print(f"[WARN] {mismatches} responses differ in status from the recording")
+
+
+def save(records: List[dict], results: List[dict], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for record, result in zip(records, results):
+            f.write(json.dumps({
+                "timestamp": record.get("timestamp"), "method": record["method"],
+                "path": record["path"], "body": record.get("body"),
+                "status": result["status"], "latency_ms": round(result["latency_ms"], 3)}) + "\n")
+    print(f"[OK] Replay saved to {path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a traffic capture and compare it")
+    parser.add_argument("capture", help="JSONL capture or endpoints.csv (with --from-log: output)")
+    parser.add_argument("--from-log", metavar="LOG",
+                        help="Write a capture from the backend request log LOG instead")
+    parser.add_argument("--base", default=BASE_URL, help=f"Stack to replay against (default: {BASE_URL})")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Times the recorded pace; 0 sends as fast as possible (default: 1)")
+    parser.add_argument("--concurrency", type=int, default=64,
+                        help="Requests in flight at most (default: 64)")
+    parser.add_argument("--header", action="append", default=[], metavar="'NAME: VALUE'",
+                        help="Extra request header, e.g. an Authorization token")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT,
+                        help=f"Seconds per request (default: {TIMEOUT:.0f})")
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    parser.add_argument("--save", metavar="FILE", help="Write the replay as a capture")
+    parser.add_argument("--json", metavar="FILE", help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    if args.from_log:
+        from_log(args.from_log, args.capture)
+        return
+
+    headers = {}
+    for header in args.header:
+        name, _, value = header.partition(":")
+        headers[name.strip()] = value.strip()
+    records = load_capture(args.capture)[:args.limit]
+    if not records:
+        print(f"[ERROR] No requests in {args.capture}", file=sys.stderr)
+        sys.exit(1)
+    if args.speed and any(record["at"] is None for record in records):
+        print("[WARN] Capture has requests without timestamps; sending them immediately")
+
+    results = asyncio.run(replay(records, args.base.rstrip("/"), args.speed, args.concurrency,
+                                 headers, args.timeout))
+    report = summarize(records, results)
+    print_report(report)
+    if args.save:
+        save(records, results, args.save)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[OK] Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Derive per-round scoring statistics from hole scores.
+
+The hand-entered  bir / par / bog / bg2 / bg3g / plus_bg3  columns of
+player_cards are mixed TEXT / INTEGER and often empty.  This job recomputes
+them from  h01..h18  minus the hole pars in x_course_holes for a whole batch
+of cards in one NumPy operation and stores them, properly typed, in:
+
+  player_card_stats    one row per card
+      eagles (−2 or better), birdies (−1), pars, bogeys, double_bogeys,
+      triple_bogeys, worse (+4 or more), holes_played, to_par
+  player_stats_rollup  one row per player with totals and per-round averages
+
+Legacy column mapping: bir = eagles + birdies, par = pars, bog = bogeys,
+bg2 = double_bogeys, bg3g = triple_bogeys, plus_bg3 = worse.
+
+Putts cannot be derived from hole scores and are left to the card.
+Stats dashboards should read these tables instead of re-deriving per request.
+
+By default only cards without a stats row are processed; --full recomputes
+everything (e.g. after cards were edited).
+
+Usage:
+    python3 round_stats.py [--full] [--dry-run] [--profile [json]]
+
+Requires:  psycopg2, pandas, numpy
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from card_data import (BUCKETS, HOLE_COLUMNS, card_reference, copy_frame, course_pars, hole_matrix,
+                       par_matrix, read_frame)
+from profiling import add_profile_arguments, phase, profile_run
+
+STAT_COLUMNS = [name for name, _, _ in BUCKETS] + ["holes_played", "to_par"]
+
+CREATE_TABLES = """
+CREATE TABLE IF NOT EXISTS player_card_stats (
+    card_id INTEGER PRIMARY KEY {card_reference},
+    player_id INTEGER NOT NULL,
+    eagles SMALLINT NOT NULL,
+    birdies SMALLINT NOT NULL,
+    pars SMALLINT NOT NULL,
+    bogeys SMALLINT NOT NULL,
+    double_bogeys SMALLINT NOT NULL,
+    triple_bogeys SMALLINT NOT NULL,
+    worse SMALLINT NOT NULL,
+    holes_played SMALLINT NOT NULL,
+    to_par SMALLINT,
+    computed_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_player_card_stats_player_id ON player_card_stats(player_id);
+
+CREATE TABLE IF NOT EXISTS player_stats_rollup (
+    player_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    rounds INTEGER NOT NULL,
+    holes_played INTEGER NOT NULL,
+    eagles INTEGER NOT NULL,
+    birdies INTEGER NOT NULL,
+    pars INTEGER NOT NULL,
+    bogeys INTEGER NOT NULL,
+    double_bogeys INTEGER NOT NULL,
+    triple_bogeys INTEGER NOT NULL,
+    worse INTEGER NOT NULL,
+    avg_to_par NUMERIC(5,2),
+    birdies_per_round NUMERIC(5,2),
+    pars_per_round NUMERIC(5,2),
+    bogeys_per_round NUMERIC(5,2),
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+CARDS_QUERY = """
+SELECT pc.id AS card_id, pc.player_id, pc.course_id, {holes}
+FROM player_cards pc
+""".format(holes=", ".join(f"pc.{h}" for h in HOLE_COLUMNS))
+
+ROLLUP_SQL = """
+INSERT INTO player_stats_rollup AS r (
+    player_id, rounds, holes_played, eagles, birdies, pars, bogeys,
+    double_bogeys, triple_bogeys, worse,
+    avg_to_par, birdies_per_round, pars_per_round, bogeys_per_round)
+SELECT player_id, COUNT(*), SUM(holes_played), SUM(eagles), SUM(birdies), SUM(pars),
+       SUM(bogeys), SUM(double_bogeys), SUM(triple_bogeys), SUM(worse),
+       ROUND(AVG(to_par), 2),
+       ROUND(AVG(eagles + birdies), 2), ROUND(AVG(pars), 2), ROUND(AVG(bogeys), 2)
+FROM player_card_stats
+WHERE player_id = ANY(%s)
+GROUP BY player_id
+ON CONFLICT (player_id) DO UPDATE SET
+    rounds = EXCLUDED.rounds, holes_played = EXCLUDED.holes_played,
+    eagles = EXCLUDED.eagles, birdies = EXCLUDED.birdies, pars = EXCLUDED.pars,
+    bogeys = EXCLUDED.bogeys, double_bogeys = EXCLUDED.double_bogeys,
+    triple_bogeys = EXCLUDED.triple_bogeys, worse = EXCLUDED.worse,
+    avg_to_par = EXCLUDED.avg_to_par, birdies_per_round = EXCLUDED.birdies_per_round,
+    pars_per_round = EXCLUDED.pars_per_round, bogeys_per_round = EXCLUDED.bogeys_per_round,
+    updated_at = CURRENT_TIMESTAMP
+"""
+
+
+def derive_stats(holes: np.ndarray, pars: np.ndarray) -> pd.DataFrame:
+    """Count score types per card from (n × 18) hole scores and pars.
+
+    Holes with no score or no known par are ignored; to_par is only set for
+    cards where all 18 holes could be scored against a par.
+    """
+    to_par = holes - pars
+    valid = ~np.isnan(to_par)
+    stats = {
+        name: ((to_par >= lo) & (to_par <= hi)).sum(axis=1)
+        for name, lo, hi in BUCKETS
+    }
+    stats["holes_played"] = valid.sum(axis=1)
+    total = np.where(valid, to_par, 0).sum(axis=1)
+    stats["to_par"] = pd.array(np.where(stats["holes_played"] == 18, total, np.nan), dtype="Int64")
+    return pd.DataFrame(stats, columns=STAT_COLUMNS)
+
+
+def run(full: bool, dry_run: bool) -> None:
+    from handicap_calculator import connect_to_db
+
+    conn = connect_to_db()
+    try:
+        cursor = conn.cursor()
+        # A dry run still needs player_card_stats to read; the DDL (and any
+        # cascade trigger) is rolled back with the rest of the transaction.
+        cursor.execute(CREATE_TABLES.format(
+            card_reference=card_reference(cursor, "player_card_stats")))
+        if not dry_run:
+            conn.commit()
+
+        start = time.perf_counter()
+        query = CARDS_QUERY if full else CARDS_QUERY + \
+            "WHERE NOT EXISTS (SELECT 1 FROM player_card_stats s WHERE s.card_id = pc.id)"
+        cards = read_frame(conn, query)
+        if cards.empty:
+            print("[OK] All cards already have statistics")
+            return
+
+        pars = par_matrix(cards["course_id"], course_pars(conn, cards["course_id"].unique().tolist()))
+        with phase("derive"):
+            stats = derive_stats(hole_matrix(cards), pars)
+        stats.insert(0, "card_id", cards["card_id"].to_numpy())
+        stats.insert(1, "player_id", cards["player_id"].to_numpy())
+        elapsed = time.perf_counter() - start
+        print(f"[OK] Derived statistics for {len(stats)} cards in {elapsed:.2f}s")
+
+        if dry_run:
+            print(stats.head(20).to_string(index=False))
+            return
+
+        players: List[int] = [int(p) for p in stats["player_id"].unique()]
+        cursor.execute("CREATE TEMP TABLE stats_stage (LIKE player_card_stats) ON COMMIT DROP")
+        copy_frame(conn, stats, "stats_stage")
+        columns = ", ".join(["card_id", "player_id"] + STAT_COLUMNS)
+        updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in ["player_id"] + STAT_COLUMNS)
+        cursor.execute(f"""
+            INSERT INTO player_card_stats ({columns})
+            SELECT {columns} FROM stats_stage
+            ON CONFLICT (card_id) DO UPDATE SET {updates}, computed_at = CURRENT_TIMESTAMP
+        """)
+        cursor.execute(ROLLUP_SQL, (players,))
+        conn.commit()
+        cursor.close()
+        print(f"[OK] Stored {len(stats)} card rows and {len(players)} player rollups "
+              f"in {time.perf_counter() - start:.2f}s")
+    finally:
+        if dry_run:
+            conn.rollback()
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Derive round statistics from hole scores")
+    parser.add_argument("--full", action="store_true", help="Recompute every card")
+    parser.add_argument("--dry-run", action="store_true", help="Show derived rows without writing")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with profile_run(args):
+        run(args.full, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
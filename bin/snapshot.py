@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Columnar analytics snapshot of the scorecard and course tables.
+
+--export reads, in one read-only REPEATABLE READ transaction,
+
+  player_cards          partitioned by year of play_date; h01..h18 become one
+                        hole_scores column of 18 uint8 (0 = no score), read
+                        packed with card_data.read_hole_scores()
+  x_course_data_by_tee  tee ratings
+  x_course_holes        pars and stroke indexes
+  x_course_names        course names
+  players               users.id / username
+
+and writes them under DIR in Hive layout (player_cards/year=2024/data.arrow)
+as Arrow IPC files (default) or Parquet, with every text column
+dictionary-encoded, plus a manifest.json.  Each table is COPied as CSV and
+parsed with pyarrow.csv using the column types from information_schema, so
+no Python object is built per row.
+
+load_table() memory-maps the files: Arrow IPC tables are zero-copy views of
+the page cache and load in milliseconds; Parquet is smaller on disk but has
+to be decoded.  Batch jobs can run off a snapshot instead of the live
+database (e.g.  calccap.py --snapshot DIR ).
+
+Usage:
+    python3 snapshot.py --export DIR [--format arrow|parquet] [--force]
+    python3 snapshot.py --info DIR
+
+Requires:  psycopg2, numpy, pyarrow
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from card_data import HOLE_COLUMNS, HOLES, read_hole_scores
+
+FORMATS = {"arrow": "data.arrow", "parquet": "data.parquet"}
+
+# Snapshot name -> (query, partitioned by year of play_date)
+TABLES = {
+    "x_course_data_by_tee": ("SELECT * FROM x_course_data_by_tee ORDER BY course_id, tee_id", False),
+    "x_course_holes": ("SELECT * FROM x_course_holes ORDER BY course_id, hole_number", False),
+    "x_course_names": ("SELECT * FROM x_course_names ORDER BY course_id", False),
+    "players": ("SELECT id, username FROM users ORDER BY id", False),
+    "player_cards": ("SELECT {columns} FROM player_cards "
+                     "WHERE play_date >= %s AND play_date < %s ORDER BY id", True),
+}
+# Replaced by the hole_scores list column
+CARD_SKIP_COLUMNS = set(HOLE_COLUMNS) | {"hole_scores"}
+
+COLUMNS_QUERY = """
+SELECT column_name, data_type FROM information_schema.columns
+WHERE table_name = %s AND table_schema = current_schema()
+ORDER BY ordinal_position
+"""
+
+TEXT = pa.dictionary(pa.int32(), pa.string())
+ARROW_TYPES = {
+    "smallint": pa.int16(),
+    "integer": pa.int32(),
+    "bigint": pa.int64(),
+    "numeric": pa.float64(),
+    "real": pa.float32(),
+    "double precision": pa.float64(),
+    "boolean": pa.bool_(),
+    "date": pa.date32(),
+    "timestamp without time zone": pa.timestamp("us"),
+    "timestamp with time zone": pa.timestamp("us", tz="UTC"),
+}
+
+
+def column_types(cursor, table: str) -> Dict[str, pa.DataType]:
+    cursor.execute(COLUMNS_QUERY, (table,))
+    return {name: ARROW_TYPES.get(kind, TEXT) for name, kind in cursor.fetchall()}
+
+
+def read_arrow(conn, query: str, params: Optional[Sequence], types: Dict[str, pa.DataType]) -> pa.Table:
+    """Run  query  through COPY and parse the CSV straight into an Arrow table."""
+    cursor = conn.cursor()
+    try:
+        sql = cursor.mogrify(query, params).decode() if params else query
+        buf = io.BytesIO()
+        cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)", buf)
+    finally:
+        cursor.close()
+    buf.seek(0)
+    return pacsv.read_csv(buf, convert_options=pacsv.ConvertOptions(
+        column_types=types, true_values=["t"], false_values=["f"],
+        strings_can_be_null=True, quoted_strings_can_be_null=False))
+
+
+def with_hole_scores(conn, cards: pa.Table, first: str, last: str) -> pa.Table:
+    ids, scores = read_hole_scores(conn, "play_date >= %s AND play_date < %s", (first, last))
+    if not np.array_equal(ids, cards.column("id").to_numpy()):
+        raise RuntimeError(f"hole scores and cards differ between {first} and {last}")
+    holes = pa.FixedSizeListArray.from_arrays(pa.array(scores.ravel(), pa.uint8()), HOLES)
+    return cards.append_column("hole_scores", holes)
+
+
+def card_years(conn, query: str, types: Dict[str, pa.DataType]):
+    """Yield (year, cards of that year with hole_scores) for every year with cards."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT EXTRACT(YEAR FROM play_date)::int FROM player_cards ORDER BY 1")
+    years = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    for year in years:
+        bounds = (f"{year}-01-01", f"{year + 1}-01-01")
+        yield year, with_hole_scores(conn, read_arrow(conn, query, bounds, types), *bounds)
+
+
+def write_table(table: pa.Table, path: str, fmt: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == "parquet":
+        pq.write_table(table, path, compression="zstd")
+    else:
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def export(conn, target: str, fmt: str) -> dict:
+    conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+    cursor = conn.cursor()
+    manifest = {"created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "format": fmt, "tables": {}}
+    cursor.execute("SET TimeZone = 'UTC'")
+
+    for name, (query, by_year) in TABLES.items():
+        start = time.perf_counter()
+        types = column_types(cursor, "users" if name == "players" else name)
+        entry = {"rows": 0, "files": [], "partitioned_by": "year" if by_year else None}
+        if by_year:
+            types = {c: t for c, t in types.items() if c not in CARD_SKIP_COLUMNS}
+            parts = card_years(conn, query.format(columns=", ".join(types)), types)
+        else:
+            parts = [(None, read_arrow(conn, query, None, types))]
+        for year, table in parts:
+            relative = os.path.join(name, f"year={year}" if year else "", FORMATS[fmt])
+            write_table(table, os.path.join(target, relative), fmt)
+            entry["rows"] += table.num_rows
+            entry["files"].append(relative)
+        manifest["tables"][name] = entry
+        print(f"  {name}: {entry['rows']} rows, {len(entry['files'])} files "
+              f"in {time.perf_counter() - start:.2f}s")
+
+    conn.rollback()
+    cursor.close()
+    with open(os.path.join(target, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(snapshot: str) -> dict:
+    with open(os.path.join(snapshot, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_table(snapshot: str, table: str, columns: Optional[List[str]] = None,
+               years: Optional[Sequence[int]] = None) -> pa.Table:
+    """Memory-map one table of a snapshot (only the given years of player_cards)."""
+    manifest = read_manifest(snapshot)
+    entry = manifest["tables"][table]
+    files = entry["files"]
+    if years is not None and entry["partitioned_by"] == "year":
+        wanted = {f"year={year}" for year in years}
+        files = [f for f in files if os.path.basename(os.path.dirname(f)) in wanted]
+
+    parts = []
+    for relative in files:
+        path = os.path.join(snapshot, relative)
+        if manifest["format"] == "parquet":
+            parts.append(pq.read_table(path, columns=columns, memory_map=True))
+        else:
+            part = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+            parts.append(part.select(columns) if columns else part)
+    if not parts:
+        raise FileNotFoundError(f"no {table} files in {snapshot} for years {years}")
+    return pa.concat_tables(parts)
+
+
+def hole_scores(cards: pa.Table) -> np.ndarray:
+    """The hole_scores column of a player_cards snapshot as n × 18 uint8 (0 = no score)."""
+    chunks = [chunk.flatten().to_numpy().reshape(-1, HOLES)
+              for chunk in cards.column("hole_scores").chunks]
+    return np.concatenate(chunks) if chunks else np.zeros((0, HOLES), np.uint8)
+
+
+def info(snapshot: str) -> None:
+    manifest = read_manifest(snapshot)
+    print(f"{snapshot}: {manifest['format']} snapshot of {manifest['created_at']}")
+    for name, entry in manifest["tables"].items():
+        size = sum(os.path.getsize(os.path.join(snapshot, f)) for f in entry["files"])
+        start = time.perf_counter()
+        load_table(snapshot, name)
+        elapsed = time.perf_counter() - start
+        print(f"  {name:22} {entry['rows']:>10} rows {len(entry['files']):>4} files "
+              f"{size / 1e6:>9.1f} MB  loaded in {elapsed * 1000:.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export or inspect a columnar snapshot")
+    parser.add_argument("--export", metavar="DIR", help="Write a new snapshot to DIR")
+    parser.add_argument("--format", choices=list(FORMATS), default="arrow",
+                        help="File format (default: arrow)")
+    parser.add_argument("--force", action="store_true", help="Replace an existing DIR")
+    parser.add_argument("--info", metavar="DIR", help="List the tables of a snapshot")
+    args = parser.parse_args()
+    if not (args.export or args.info):
+        parser.error("give --export DIR or --info DIR")
+
+    if args.export:
+        from handicap_calculator import connect_to_db
+
+        if os.path.exists(args.export) and not args.force:
+            print(f"[ERROR] {args.export} exists; use --force to replace it", file=sys.stderr)
+            sys.exit(1)
+        partial = args.export.rstrip("/") + ".partial"
+        shutil.rmtree(partial, ignore_errors=True)
+        conn = connect_to_db()
+        start = time.perf_counter()
+        try:
+            export(conn, partial, args.format)
+        finally:
+            conn.close()
+        shutil.rmtree(args.export, ignore_errors=True)
+        os.replace(partial, args.export)
+        print(f"[OK] Snapshot written to {args.export} in {time.perf_counter() - start:.1f}s")
+    if args.info:
+        info(args.info)
+
+
+if __name__ == "__main__":
+    main()
@@ -29,12 +29,20 @@ Output:
 Note:
     This script is configured to crawl up to 5 levels deep from the starting point
     and will only follow links within the initial domain (--no-parent option).
+
+Metrics:
+    Endpoints found per response code class and the wget / parse latency of
+    each URL are written as Prometheus textfile metrics (see bin/metrics.py).
 """
 import argparse
 import csv
 import re
 import subprocess
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin"))
+from metrics import job_metrics
 
 def run_wget(url, output_file="wget_output.txt"):
     # Define the wget command and its arguments
@@ -119,22 +127,27 @@ def main():
     
     all_endpoints = []
     
-    # Process each URL
-    for i, url in enumerate(urls):
-        # Create a unique output file for each URL
-        temp_output = f"wget_output_{i}.txt"
-        
-        # Execute the wget command for this URL
-        run_wget(url, temp_output)
+    with job_metrics("crawl") as metrics:
+        # Process each URL
+        for i, url in enumerate(urls):
+            # Create a unique output file for each URL
+            temp_output = f"wget_output_{i}.txt"
+            
+            # Execute the wget command for this URL
+            with metrics.stage("wget"):
+                run_wget(url, temp_output)
+            
+            # Parse wget output to extract endpoints and response codes
+            with metrics.stage("parse"):
+                endpoints = parse_wget_output(temp_output)
+            all_endpoints.extend(endpoints)
+            for _, code in endpoints:
+                metrics.items.inc(status=f"{code[0]}xx")
+            
+            print(f"Processed {url}: found {len(endpoints)} endpoints")
         
-        # Parse wget output to extract endpoints and response codes
-        endpoints = parse_wget_output(temp_output)
-        all_endpoints.extend(endpoints)
-        
-        print(f"Processed {url}: found {len(endpoints)} endpoints")
-    
-    # Write all results to the CSV file
-    write_csv(all_endpoints, args.output)
+        # Write all results to the CSV file
+        write_csv(all_endpoints, args.output)
     
     # Clean up temporary files
     for i in range(len(urls)):